@@ -16,35 +16,109 @@ __author__    =  ('Felix Croes'
 
 # Import all modules containing rules into the package namespace,
 # so that they become visible to iRODS.
+#
+# Modules are imported lazily, as the ruleset is loaded by every agent while
+# most agents call only a few rules: the package gets a stub for each rule a
+# module exports (its __all__, or its public functions), which imports the
+# module, and with it dependencies such as jsonschema and jinja2, when one of
+# its rules is first called.
 
-from browse                 import *
-from folder                 import *
-from group                  import *
-from integrity              import *
-from json_datacite41        import *
-from json_landing_page      import *
-from mail                   import *
-from meta                   import *
-from meta_form              import *
-from provenance             import *
-from research               import *
-from resources              import *
-from schema                 import *
-from schema_transformation  import *
-from schema_transformations import *
-from vault                  import *
-from vault_xml_to_json      import *
-from datacite               import *
-from epic                   import *
-from publication            import *
-from policies               import *
-from revisions              import *
+import ast
+import importlib
+import os
+import re
 
-# Import certain modules only when enabled.
+from .util import api as _api
 from .util.config import config
 
+_modules = ['batch',
+            'browse',
+            'folder',
+            'group',
+            'integrity',
+            'json_datacite41',
+            'json_landing_page',
+            'mail',
+            'meta',
+            'meta_form',
+            'provenance',
+            'research',
+            'resources',
+            'schema',
+            'schema_transformation',
+            'schema_transformations',
+            'vault',
+            'vault_xml_to_json',
+            'datacite',
+            'epic',
+            'publication',
+            'policies',
+            'revisions']
+
+# Import certain modules only when enabled.
 if config.enable_intake:
-    from intake import *
+    _modules.append('intake')
 
 if config.enable_datarequest:
-    from datarequest import *
+    _modules.append('datarequest')
+
+# Module names by the names of the rules they export.
+_index = {}
+
+
+def _exports(module):
+    """Get the names of the rules a module exports, without importing it.
+
+    :param module: Name of a module in this package
+
+    :returns: List of rule names
+    """
+    with open(os.path.join(os.path.dirname(__file__), module + '.py')) as f:
+        source = f.read()
+
+    m = re.search(r'^__all__\s*=\s*(\[[^\]]*\])', source, re.M)
+    if m:
+        return ast.literal_eval(m.group(1))
+    return re.findall(r'^def ([a-zA-Z]\w*)', source, re.M)
+
+
+def _import(module):
+    """Import a module, replacing the stubs of its rules with the actual rules.
+
+    :param module: Name of a module in this package
+    """
+    m = importlib.import_module('.' + module, __name__)
+    for name, mod in _index.items():
+        if mod == module:
+            globals()[name] = getattr(m, name)
+
+
+def _stub(module, name):
+    def rule(*args, **kwargs):
+        _import(module)
+        return globals()[name](*args, **kwargs)
+    rule.__name__ = name
+    return rule
+
+
+def _import_all():
+    """Import all modules containing rules, e.g. for tools that inspect the ruleset."""
+    for module in _modules:
+        _import(module)
+
+
+def _import_api(name):
+    """Import the module of an API that is not loaded yet (see util.api.api_batch)."""
+    if name in _index:
+        _import(_index[name])
+
+
+for _module in _modules:
+    for _name in _exports(_module):
+        _index[_name] = _module
+        globals()[_name] = _stub(_module, _name)
+
+_api.loader = _import_api
+
+# Runs calls of the API rules above in one request.
+from .util.api import api_batch  # noqa: E402
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Functions for batch jobs implemented in the rule language."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import time
+
+from util import *
+
+__all__ = ['rule_batch_metrics']
+
+
+@rule.make(inputs=range(4), outputs=[])
+def rule_batch_metrics(ctx, job, start, items, errors):
+    """Write the metrics event of a finished batch job (see util.metrics).
+
+    :param ctx:    Combined type of a callback and rei struct
+    :param job:    Name of the batch job
+    :param start:  Start time of the job, in seconds since epoch (as by msiGetIcatTime 'unix')
+    :param items:  Number of items processed
+    :param errors: Number of items that failed
+    """
+    if not metrics.enabled():
+        return
+
+    metrics.emit(ctx, 'job',
+                 job=job,
+                 items=int(items),
+                 errors=int(errors),
+                 duration=round(time.time() - int(start), 3),
+                 status='ok')
+    metrics.flush(ctx)
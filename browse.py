@@ -4,7 +4,6 @@
 __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import re
 from collections import OrderedDict
 
 from util import *
@@ -22,9 +21,16 @@ def api_browse_folder(ctx,
                       sort_order='asc',
                       offset=0,
                       limit=10,
-                      space=pathutil.Space.OTHER.value):
+                      space=pathutil.Space.OTHER.value,
+                      cursor=None):
     """Get paginated collection contents, including size/modify date information.
 
+    When a cursor is given, pages are retrieved using keyset pagination
+    instead of an offset, which keeps deep pages cheap. Pass an empty cursor
+    to get the first page. The result then contains the cursor for the next
+    page (null on the last page) and the amount of remaining items, instead of
+    the total.
+
     :param ctx:        Combined type of a callback and rei struct
     :param coll:       Collection to get paginated contents of
     :param sort_on:    Column to sort on ('name', 'modified' or size)
@@ -32,22 +38,21 @@ def api_browse_folder(ctx,
     :param offset:     Offset to start browsing from
     :param limit:      Limit number of results
     :param space:      Space the collection is in
+    :param cursor:     Cursor to continue browsing from (only when sorting on name)
 
     :returns: Dict with paginated collection contents
     """
     def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        if 'DATA_NAME' in x:
-            return {'name':        x['DATA_NAME'],
+        # (ORDER_BY etc. wrappers are not part of the field names of the row)
+        if 'DATA_NAME' in row._fields:
+            return {'name':        row.DATA_NAME,
                     'type':        'data',
-                    'size':        int(x['DATA_SIZE']),
-                    'modify_time': int(x['DATA_MODIFY_TIME'])}
+                    'size':        int(row.DATA_SIZE),
+                    'modify_time': int(row.DATA_MODIFY_TIME)}
         else:
-            return {'name':        x['COLL_NAME'].split('/')[-1],
+            return {'name':        row.COLL_NAME.split('/')[-1],
                     'type':        'coll',
-                    'modify_time': int(x['COLL_MODIFY_TIME'])}
+                    'modify_time': int(row.COLL_MODIFY_TIME)}
 
     if sort_on == 'modified':
         # FIXME: Sorting on modify date is borked: There appears to be no
@@ -72,23 +77,40 @@ def api_browse_folder(ctx,
 
     zone = user.zone(ctx)
 
-    # We make offset/limit act on two queries at once, placing qdata right after qcoll.
     if space == str(pathutil.Space.RESEARCH):
-        qcoll = Query(ctx, ccols,
-                      "COLL_PARENT_NAME = '{}' AND COLL_NAME not like '/{}/home/vault-%' AND COLL_NAME not like '/{}/home/grp-vault-%'".format(coll, zone, zone),
-                      offset=offset, limit=limit, output=query.AS_DICT)
+        ccond = "COLL_PARENT_NAME = '{}' AND COLL_NAME not like '/{}/home/vault-%' AND COLL_NAME not like '/{}/home/grp-vault-%'".format(coll, zone, zone)
     elif space == str(pathutil.Space.VAULT):
-        qcoll = Query(ctx, ccols,
-                      "COLL_PARENT_NAME = '{}' AND COLL_NAME like '/{}/home/%vault-%'".format(coll, zone),
-                      offset=offset, limit=limit, output=query.AS_DICT)
+        ccond = "COLL_PARENT_NAME = '{}' AND COLL_NAME like '/{}/home/%vault-%'".format(coll, zone)
     else:
-        qcoll = Query(ctx, ccols, "COLL_PARENT_NAME = '{}'".format(coll),
-                      offset=offset, limit=limit, output=query.AS_DICT)
+        ccond = "COLL_PARENT_NAME = '{}'".format(coll)
+
+    dcond = "COLL_NAME = '{}'".format(coll)
+
+    if cursor is not None:
+        if sort_on != 'name':
+            return api.Error('badrequest', 'Cursor pagination is only supported when sorting on name')
+
+        page = keyset_page([lambda after, n: Query(ctx, ccols, ccond, after=after, limit=n, output=query.AS_NAMEDTUPLE),
+                            lambda after, n: Query(ctx, dcols, dcond, after=after, limit=n, output=query.AS_NAMEDTUPLE)],
+                           cursor, limit)
+        if page is None:
+            return api.Error('badrequest', 'Invalid cursor')
+
+        rows, remaining, next_cursor = page
 
+        if len(rows) == 0 and not collection.exists(ctx, coll):
+            return api.Error('nonexistent', 'The given path does not exist')
+
+        return OrderedDict([('remaining', remaining),
+                            ('items',     map(transform, rows)),
+                            ('cursor',    next_cursor)])
+
+    # We make offset/limit act on two queries at once, placing qdata right after qcoll.
+    qcoll = Query(ctx, ccols, ccond, offset=offset, limit=limit, output=query.AS_NAMEDTUPLE)
     colls = map(transform, list(qcoll))
 
-    qdata = Query(ctx, dcols, "COLL_NAME = '{}'".format(coll),
-                  offset=max(0, offset - qcoll.total_rows()), limit=limit - len(colls), output=query.AS_DICT)
+    qdata = Query(ctx, dcols, dcond,
+                  offset=max(0, offset - qcoll.total_rows()), limit=limit - len(colls), output=query.AS_NAMEDTUPLE)
     datas = map(transform, list(qdata))
 
     if len(colls) + len(datas) == 0:
@@ -126,18 +148,16 @@ def api_browse_collections(ctx,
     :returns: Dict with paginated collection contents
     """
     def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        if 'DATA_NAME' in x:
-            return {'name':        x['DATA_NAME'],
+        # (ORDER_BY etc. wrappers are not part of the field names of the row)
+        if 'DATA_NAME' in row._fields:
+            return {'name':        row.DATA_NAME,
                     'type':        'data',
-                    'size':        int(x['DATA_SIZE']),
-                    'modify_time': int(x['DATA_MODIFY_TIME'])}
+                    'size':        int(row.DATA_SIZE),
+                    'modify_time': int(row.DATA_MODIFY_TIME)}
         else:
-            return {'name':        x['COLL_NAME'].split('/')[-1],
+            return {'name':        row.COLL_NAME.split('/')[-1],
                     'type':        'coll',
-                    'modify_time': int(x['COLL_MODIFY_TIME'])}
+                    'modify_time': int(row.COLL_MODIFY_TIME)}
 
     if sort_on == 'modified':
         # FIXME: Sorting on modify date is borked: There appears to be no
@@ -162,14 +182,14 @@ def api_browse_collections(ctx,
     if space == str(pathutil.Space.RESEARCH):
         qcoll = Query(ctx, ccols,
                       "COLL_PARENT_NAME = '{}' AND COLL_NAME not like '/{}/home/vault-%' AND COLL_NAME not like '/{}/home/grp-vault-%'".format(coll, zone, zone),
-                      offset=offset, limit=limit, output=query.AS_DICT)
+                      offset=offset, limit=limit, output=query.AS_NAMEDTUPLE)
     elif space == str(pathutil.Space.VAULT):
         qcoll = Query(ctx, ccols,
                       "COLL_PARENT_NAME = '{}' AND COLL_NAME like '/{}/home/%vault-%'".format(coll, zone),
-                      offset=offset, limit=limit, output=query.AS_DICT)
+                      offset=offset, limit=limit, output=query.AS_NAMEDTUPLE)
     else:
         qcoll = Query(ctx, ccols, "COLL_PARENT_NAME = '{}'".format(coll),
-                      offset=offset, limit=limit, output=query.AS_DICT)
+                      offset=offset, limit=limit, output=query.AS_NAMEDTUPLE)
 
     colls = map(transform, list(qcoll))
 
@@ -205,27 +225,25 @@ def api_search(ctx,
     :returns: Dict with paginated search results
     """
     def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        if 'DATA_NAME' in x:
-            _, _, path, subpath = pathutil.info(x['COLL_NAME'])
+        # (ORDER_BY etc. wrappers are not part of the field names of the row)
+        if 'DATA_NAME' in row._fields:
+            _, _, path, subpath = pathutil.info(row.COLL_NAME)
             if subpath != '':
                 path = path + "/" + subpath
 
-            return {'name':        "/{}/{}".format(path, x['DATA_NAME']),
+            return {'name':        "/{}/{}".format(path, row.DATA_NAME),
                     'type':        'data',
-                    'size':        int(x['DATA_SIZE']),
-                    'modify_time': int(x['DATA_MODIFY_TIME'])}
+                    'size':        int(row.DATA_SIZE),
+                    'modify_time': int(row.DATA_MODIFY_TIME)}
 
-        if 'COLL_NAME' in x:
-            _, _, path, subpath = pathutil.info(x['COLL_NAME'])
+        if 'COLL_NAME' in row._fields:
+            _, _, path, subpath = pathutil.info(row.COLL_NAME)
             if subpath != '':
                 path = path + "/" + subpath
 
             return {'name':        "/{}".format(path),
                     'type':        'coll',
-                    'modify_time': int(x['COLL_MODIFY_TIME'])}
+                    'modify_time': int(row.COLL_MODIFY_TIME)}
 
     # Replace, %, _ and \ since iRODS does not handle those correctly.
     # HdR this can only be done in a situation where search_type is NOT status!
@@ -265,9 +283,54 @@ def api_search(ctx,
         cols = [x.replace('ORDER(', 'ORDER_DESC(') for x in cols]
 
     qdata = Query(ctx, cols, where, offset=max(0, int(offset)),
-                  limit=int(limit), case_sensitive=False, output=query.AS_DICT)
+                  limit=int(limit), case_sensitive=False, output=query.AS_NAMEDTUPLE)
 
     datas = map(transform, list(qdata))
 
     return OrderedDict([('total', qdata.total_rows()),
                         ('items', datas)])
+
+
+def keyset_page(queries, cursor, limit):
+    """Get a page of results from consecutive queries, using keyset pagination.
+
+    The results of the queries are treated as one list, where the results of
+    each query are placed right after those of the previous query.
+    The cursors used have the form '<query index>:<query cursor>'.
+
+    :param queries: List of functions creating a Query, given a query cursor (or None) and a limit
+    :param cursor:  Cursor to continue from, or an empty string to start at the first result
+    :param limit:   Limit number of results
+
+    :returns: Tuple of rows, the amount of remaining rows (including this page) and the
+              cursor for the next page (None if this is the last page), or None if the cursor is invalid
+    """
+    try:
+        i, after = cursor.split(':', 1) if cursor else (0, '')
+        i = int(i)
+        if not 0 <= i < len(queries):
+            return None
+    except (ValueError, AttributeError):
+        return None
+
+    rows        = []
+    remaining   = 0
+    next_cursor = None
+
+    for i, make_query in enumerate(queries[i:], i):
+        n = limit - len(rows)
+        try:
+            q = make_query(after or None, n)
+        except (ValueError, error.UUQueryParameterError):
+            return None
+        after = None
+
+        page = list(q)
+        rows += page
+        remaining += q.total_rows()
+
+        if n > 0 and len(page) == n:
+            # This page is full, continue after its last row next time.
+            next_cursor = '{}:{}'.format(i, q.cursor())
+
+    return rows, remaining, next_cursor
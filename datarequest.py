@@ -6,7 +6,6 @@ __license__   = 'GPLv3, see LICENSE'
 __author__    = ('Lazlo Westerhof, Jelmer Zondergeld')
 
 import json
-import re
 from collections import OrderedDict
 from datetime import datetime
 from enum import Enum
@@ -412,20 +411,15 @@ def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limi
     coll = "/{}/{}".format(user.zone(ctx), DRCOLLECTION)
 
     def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        return {'id':          x['COLL_NAME'].split('/')[-1],
-                'name':        x['COLL_OWNER_NAME'],
-                'create_time': int(x['COLL_CREATE_TIME']),
-                'status':      x['META_DATA_ATTR_VALUE']}
+        # (ORDER_BY etc. wrappers are not part of the field names of the row)
+        return {'id':          row.COLL_NAME.split('/')[-1],
+                'name':        row.COLL_OWNER_NAME,
+                'create_time': int(row.COLL_CREATE_TIME),
+                'status':      row.META_DATA_ATTR_VALUE}
 
     def transform_title(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        return {'id':          x['COLL_NAME'].split('/')[-1],
-                'title':       x['META_DATA_ATTR_VALUE']}
+        return {'id':          row.COLL_NAME.split('/')[-1],
+                'title':       row.META_DATA_ATTR_VALUE}
 
     if sort_on == 'modified':
         # FIXME: Sorting on modify date is borked: There appears to be no
@@ -443,11 +437,11 @@ def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limi
         ccols = [x.replace('ORDER(', 'ORDER_DESC(') for x in ccols]
 
     qcoll = Query(ctx, ccols, "COLL_PARENT_NAME = '{}' AND DATA_NAME = '{}' AND META_DATA_ATTR_NAME = 'status'".format(coll, DATAREQUEST + JSON_EXT),
-                  offset=offset, limit=limit, output=query.AS_DICT)
+                  offset=offset, limit=limit, output=query.AS_NAMEDTUPLE)
 
     ccols_title = ['COLL_NAME', "META_DATA_ATTR_VALUE"]
     qcoll_title = Query(ctx, ccols_title, "COLL_PARENT_NAME = '{}' AND DATA_NAME = '{}' AND META_DATA_ATTR_NAME = 'title'".format(coll, DATAREQUEST + JSON_EXT),
-                        offset=offset, limit=limit, output=query.AS_DICT)
+                        offset=offset, limit=limit, output=query.AS_NAMEDTUPLE)
 
     colls = map(transform, list(qcoll))
     colls_title = map(transform_title, list(qcoll_title))
@@ -434,7 +434,8 @@ def get_org_metadata(ctx, path, object_type=pathutil.ObjectType.COLL):
                      "META_{}_ATTR_NAME like '{}%'".format(typ, constants.UUORGMETADATAPREFIX)
                      + (" AND COLL_NAME = '{}' AND DATA_NAME = '{}'".format(*pathutil.chop(path))
                         if object_type is pathutil.ObjectType.DATA
-                        else " AND COLL_NAME = '{}'".format(path)))]
+                        else " AND COLL_NAME = '{}'".format(path)),
+                     cache=True)]
 
 
 def get_locks(ctx, path, org_metadata=None, object_type=pathutil.ObjectType.COLL):
@@ -64,6 +64,7 @@ iiRevisionCreateAsynchronously(*resource, *path, *maxSize) {
 #
 uuRevisionBatch() {
     writeLine("serverLog", "Batch revision job started");
+    msiGetIcatTime(*start, "unix");
     *count        = 0;
     *countOk      = 0;
     *countIgnored = 0;
@@ -132,6 +133,7 @@ uuRevisionBatch() {
     }
 
     writeLine("serverLog", "Batch revision job finished. " ++ str(*countOk+*countIgnored) ++ "/*count successfully processed, of which *countOk resulted in new revisions");
+    rule_batch_metrics("revision_batch", *start, str(*count), str(*count - *countOk - *countIgnored));
 }
 
 # \brief Create a revision of a dataobject in a revision folder.  ## BLIJFT ##
@@ -127,7 +127,7 @@ def api_intake_list_unrecognized_files(ctx, coll):
 
     :param ctx:  Combined type of a callback and rei struct
     :param coll: Collection from which to list all unrecognized files
-    :returns: List of unrecognized files
+    :returns: List of unrecognized files (streamed)
     """
     # check permissions
     parts = coll.split('/')
@@ -142,6 +142,11 @@ def api_intake_list_unrecognized_files(ctx, coll):
         log.write(ctx, "NO PERMISSION")
         return {}
 
+    return _list_unrecognized_files(ctx, coll)
+
+
+def _list_unrecognized_files(ctx, coll):
+    """Generate the unrecognized files for given path, see api_intake_list_unrecognized_files."""
     # Include coll name as equal names do occur and genquery delivers distinct results.
     iter = genquery.row_iterator(
         "COLL_NAME, DATA_NAME, COLL_CREATE_TIME, DATA_OWNER_NAME",
@@ -149,7 +154,6 @@ def api_intake_list_unrecognized_files(ctx, coll):
         genquery.AS_LIST, ctx
     )
 
-    files = []
     for row in iter:
         # Check whether object type is within exclusion pattern
         exclusion_matched = any(fnmatch.fnmatch(row[1], p) for p in INTAKE_FILE_EXCLUSION_PATTERNS)
@@ -174,9 +178,7 @@ def api_intake_list_unrecognized_files(ctx, coll):
             for row2 in iter2:
                 file_data[row2[0]] = row2[1]
 
-            files.append(file_data)
-
-    return files
+            yield file_data
 
 
 @api.make()
@@ -189,10 +191,8 @@ def api_intake_list_datasets(ctx, coll):
     :param ctx:  Combined type of a callback and rei struct
     :param coll: Collection from which to list all datasets
 
-    :returns: list of datasets
+    :returns: list of datasets (streamed)
     """
-    datasets = []
-
     # 1) Query for datasets distinguished by collections
     iter = genquery.row_iterator(
         "META_COLL_ATTR_VALUE, COLL_NAME",
@@ -201,8 +201,7 @@ def api_intake_list_datasets(ctx, coll):
     )
     for row in iter:
         log.write(ctx, 'DATASET COLL: ' + row[1])
-        dataset = get_dataset_details(ctx, row[0], row[1])
-        datasets.append(dataset)
+        yield get_dataset_details(ctx, row[0], row[1])
 
     # 2) Query for datasets distinguished dataobjects
     iter = genquery.row_iterator(
@@ -212,8 +211,7 @@ def api_intake_list_datasets(ctx, coll):
     )
     for row in iter:
         log.write(ctx, 'DATASET DATA: ' + row[1])
-        dataset = get_dataset_details(ctx, row[0], row[1])
-        datasets.append(dataset)
+        yield get_dataset_details(ctx, row[0], row[1])
 
     # 3) extra query for datasets that fall out of above query due to 'like' in query
     iter = genquery.row_iterator(
@@ -222,10 +220,7 @@ def api_intake_list_datasets(ctx, coll):
         genquery.AS_LIST, ctx
     )
     for row in iter:
-        dataset = get_dataset_details(ctx, row[0], row[1])
-        datasets.append(dataset)
-
-    return datasets
+        yield get_dataset_details(ctx, row[0], row[1])
 
 
 def get_dataset_details(ctx, dataset_id, path):
@@ -623,12 +618,18 @@ def coll_objects(ctx, level, coll):
     files = {}
 
     # COLLECTIONS
-    iter = genquery.row_iterator(
+    rows = list(genquery.row_iterator(
         "COLL_NAME, COLL_ID",
         "COLL_PARENT_NAME = '{}'".format(coll),
         genquery.AS_LIST, ctx
-    )
-    for row in iter:
+    ))
+
+    # Get errors/warnings from scan process for all collections at once.
+    coll_messages = query.batch(ctx, "COLL_ID", [row[1] for row in rows],
+                                "META_COLL_ATTR_VALUE, META_COLL_ATTR_NAME",
+                                "META_COLL_ATTR_NAME in ('warning', 'error')")
+
+    for row in rows:
         # files(pathutil.basename(row[0]))
         node = {}
         node['name'] = pathutil.basename(row[0])
@@ -637,13 +638,8 @@ def coll_objects(ctx, level, coll):
         warnings = []
         errors = []
         # Per collection add errors/warnings from scan process
-        iter2 = genquery.row_iterator(
-            "META_COLL_ATTR_VALUE, META_COLL_ATTR_NAME",
-            "META_COLL_ATTR_NAME in ('warning', 'error') AND COLL_ID = '{}'".format(row[1]),
-            genquery.AS_LIST, ctx
-        )
-        for row2 in iter2:
-            if row[1] == 'error':
+        for row2 in coll_messages[row[1]]:
+            if row2[1] == 'error':
                 errors.append(row2[0])
             else:
                 warnings.append(row2[0])
@@ -657,25 +653,26 @@ def coll_objects(ctx, level, coll):
         counter += 1
 
     # DATA OBJECTS
-    iter = genquery.row_iterator(
+    rows = list(genquery.row_iterator(
         "DATA_NAME, DATA_ID",
         "COLL_NAME = '{}'".format(coll),
         genquery.AS_LIST, ctx
-    )
-    for row in iter:
+    ))
+
+    # Get errors/warnings from scan process for all data objects at once.
+    data_messages = query.batch(ctx, "DATA_ID", [row[1] for row in rows],
+                                "META_DATA_ATTR_VALUE, META_DATA_ATTR_NAME",
+                                "META_DATA_ATTR_NAME in ('warning', 'error')")
+
+    for row in rows:
         node = {}
         node['name'] = row[0]
         node['isFolder'] = False
         node['parent_id'] = level
         # Per data object add errors/warnings from scan process
-        iter2 = genquery.row_iterator(
-            "META_DATA_ATTR_VALUE, META_DATA_ATTR_NAME",
-            "META_DATA_ATTR_NAME in ('warning', 'error') AND DATA_ID = '{}'".format(row[1]),
-            genquery.AS_LIST, ctx
-        )
         warnings = []
         errors = []
-        for row2 in iter2:
+        for row2 in data_messages[row[1]]:
             if row2[1] == 'error':
                 errors.append(row2[0])
             else:
@@ -4,10 +4,6 @@
 __copyright__ = 'Copyright (c) 2019-2021, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import itertools
-
-import genquery
-
 from util import *
 
 
@@ -35,19 +31,14 @@ def intake_generate_dataset_checksums(ctx, dataset_path, checksum_file):
     :param dataset_path:  Root collection of dataset to be indexed
     :param checksum_file: Data object to write checksums to
     """
-    q_root = genquery.row_iterator("COLL_NAME, DATA_NAME, DATA_CHECKSUM, DATA_SIZE",
-                                   "COLL_NAME = '{}'".format(dataset_path),
-                                   genquery.AS_LIST, ctx)
-
-    q_sub = genquery.row_iterator("COLL_NAME, DATA_NAME, DATA_CHECKSUM, DATA_SIZE",
-                                  "COLL_NAME like '{}/%'".format(dataset_path),
-                                  genquery.AS_LIST, ctx)
-
     # Create checksums file.
-    checksums = ""
-    for row in itertools.chain(q_root, q_sub):
-        type, checksum = chop_checksum(row[2])
-        checksums += "{} {} {} {}/{}\n".format(type, checksum, row[3], row[0], row[1])
+    lines = []
+    for colls, names, checksums, sizes in collection.subtree(ctx, dataset_path,
+                                                             "COLL_NAME, DATA_NAME, DATA_CHECKSUM, DATA_SIZE",
+                                                             output=query.AS_COLUMNS):
+        for coll, name, checksum, size in zip(colls, names, checksums, sizes):
+            type, checksum = chop_checksum(checksum)
+            lines.append("{} {} {} {}/{}\n".format(type, checksum, size, coll, name))
 
     # Write checksums file.
-    data_object.write(ctx, checksum_file, checksums)
+    data_object.write(ctx, checksum_file, ''.join(lines))
@@ -47,13 +47,11 @@ def intake_report_export_study_data(ctx, study_id):
             real_datasets[set_path]['totalFileSize'] = 0
             real_datasets[set_path]['totalFiles'] = 0
 
-            # get the filesize and file count
-            result = genquery.row_iterator("count(DATA_ID), sum(DATA_SIZE)",
-                                           "COLL_NAME like '{}%'".format(set_path),
-                                           genquery.AS_LIST, ctx)
-            for row in result:
-                real_datasets[set_path]['totalFiles'] = int(row[0]) / 2
-                real_datasets[set_path]['totalFileSize'] = int(row[1]) / 2
+            # get the filesize and file count, each object counted once
+            # (the catalog cannot aggregate these per object, see collection.logical_stats)
+            objects, size = collection.logical_stats(ctx, set_path)
+            real_datasets[set_path]['totalFiles'] = objects
+            real_datasets[set_path]['totalFileSize'] = size
 
     return real_datasets
 
@@ -363,20 +363,13 @@ def apply_dataset_metadata(ctx, path, scope, is_collection, is_top_level):
     subscope["dataset_id"] = dataset_make_id(subscope)
 
     # add all keys to this to this level
-
-    for key in subscope:
-        if subscope[key]:
-            if is_collection:
-                avu.set_on_coll(ctx, path, key, subscope[key])
-            else:
-                avu.set_on_data(ctx, path, key, subscope[key])
+    avus = [(key, subscope[key]) for key in subscope if subscope[key]]
 
     if is_top_level:
         # Add dataset_id to dataset_toplevel
-        if is_collection:
-            avu.set_on_coll(ctx, path, 'dataset_toplevel', subscope["dataset_id"])
-        else:
-            avu.set_on_data(ctx, path, 'dataset_toplevel', subscope["dataset_id"])
+        avus.append(('dataset_toplevel', subscope["dataset_id"]))
+
+    avu.set_many(ctx, path, '-C' if is_collection else '-d', avus)
 
 
 def apply_partial_metadata(ctx, scope, path, is_collection):
@@ -391,13 +384,9 @@ def apply_partial_metadata(ctx, scope, path, is_collection):
     :param is_collection: Whether the object is a collection
     """
     keys = ['wave', 'experiment_type', 'pseudocode', 'version']
-    for key in keys:
-        if key in scope:
-            if scope[key]:
-                if is_collection:
-                    avu.set_on_coll(ctx, path, key, scope[key])
-                else:
-                    avu.set_on_data(ctx, path, key, scope[key])
+    avus = [(key, scope[key]) for key in keys if key in scope and scope[key]]
+    if avus:
+        avu.set_many(ctx, path, '-C' if is_collection else '-d', avus)
 
 
 def dataset_add_warning(ctx, top_levels, is_collection_toplevel, text):
@@ -497,24 +486,10 @@ def intake_check_dataset(ctx, root, dataset_id):
 
     for tl in tl_objects:
         # Save the aggregated counts of #objects, #warnings, #errors on object level
-
-        count = get_aggregated_object_count(ctx, dataset_id, tl)
-        if is_collection:
-            avu.set_on_coll(ctx, tl, "object_count", str(count))
-        else:
-            avu.set_on_data(ctx, tl, "object_count", str(count))
-
-        count = get_aggregated_object_error_count(ctx, dataset_id, tl)
-        if is_collection:
-            avu.set_on_coll(ctx, tl, "object_errors", str(count))
-        else:
-            avu.set_on_data(ctx, tl, "object_errors", str(count))
-
-        count = get_aggregated_object_warning_count(ctx, dataset_id, tl)
-        if is_collection:
-            avu.set_on_coll(ctx, tl, "object_warnings", str(count))
-        else:
-            avu.set_on_data(ctx, tl, "object_warnings", str(count))
+        avu.set_many(ctx, tl, '-C' if is_collection else '-d',
+                     [("object_count",    str(get_aggregated_object_count(ctx, dataset_id, tl))),
+                      ("object_errors",   str(get_aggregated_object_error_count(ctx, dataset_id, tl))),
+                      ("object_warnings", str(get_aggregated_object_warning_count(ctx, dataset_id, tl)))])
 
 
 def intake_check_generic(ctx, root, dataset_id, toplevels, is_collection):
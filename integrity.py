@@ -95,6 +95,9 @@ def checkDataObjectRemote(rule_args, callback, rei):
 
 
 def checkDataObjectIntegrity(callback, data_id):
+    """Check integrity of all replicas of a data object, and return their total size."""
+    size = 0
+
     # Obtain all replicas of a data object.
     iter = genquery.row_iterator(
         "DATA_ID, DATA_NAME, DATA_SIZE, DATA_CHECKSUM, COLL_NAME, RESC_VAULT_PATH, RESC_LOC",
@@ -111,6 +114,7 @@ def checkDataObjectIntegrity(callback, data_id):
         # Build file path to data object.
         coll_name = os.path.join(*(data_object.coll_name.split(os.path.sep)[2:]))
         file_path = data_object.resc_path + "/" + coll_name + "/" + data_object.name
+        size += int(data_object.size)
 
         # Check integrity on the resource.
         remote_rule = "checkDataObjectRemote('%s', '%s', '%s')" % \
@@ -122,8 +126,10 @@ def checkDataObjectIntegrity(callback, data_id):
             ""
         )
 
+    return size
+
 
-def checkVaultIntegrityBatch(callback, rods_zone, data_id, batch, pause):
+def checkVaultIntegrityBatch(callback, rods_zone, data_id, batch, pause, job):
     """Check integrity of one batch of data objects in the vault."""
     # Go through data in the vault, ordered by DATA_ID.
     iter = genquery.row_iterator(
@@ -135,7 +141,8 @@ def checkVaultIntegrityBatch(callback, rods_zone, data_id, batch, pause):
     # Check each data object in batch.
     for row in iter:
         data_id = int(row[0])
-        checkDataObjectIntegrity(callback, data_id)
+        job.bytes += checkDataObjectIntegrity(callback, data_id)
+        job.items += 1
 
         # Sleep briefly between checks.
         time.sleep(pause)
@@ -166,7 +173,8 @@ def rule_integrity_check_vault(rule_args, callback, rei):
     rods_zone = session_vars.get_map(rei)["client_user"]["irods_zone"]
 
     # Check one batch of vault data.
-    data_id = checkVaultIntegrityBatch(callback, rods_zone, data_id, batch, pause)
+    with metrics.job(callback, 'integrity_check_vault', first_data_id=data_id) as job:
+        data_id = checkVaultIntegrityBatch(callback, rods_zone, data_id, batch, pause, job)
 
     if data_id != 0:
         # Check the next batch after a delay.
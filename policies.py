@@ -6,8 +6,6 @@ __license__   = 'GPLv3, see LICENSE'
 
 import re
 
-import session_vars
-
 import datarequest
 import folder
 import policies_datapackage_status
@@ -32,7 +30,7 @@ from util import *
 
 def can_coll_create(ctx, actor, coll):
     """Disallow creating collections in locked folders."""
-    log.debug(ctx, 'check coll create <{}>'.format(coll))
+    log.debug(ctx, 'check coll create <{}>', coll)
 
     if pathutil.info(coll).space is pathutil.Space.RESEARCH:
         if folder.is_locked(ctx, pathutil.dirname(coll)) and not user.is_admin(ctx, actor):
@@ -47,7 +45,7 @@ def can_coll_create(ctx, actor, coll):
 
 def can_coll_delete(ctx, actor, coll):
     """Disallow deleting collections in locked folders and collections containing locked folders."""
-    log.debug(ctx, 'check coll delete <{}>'.format(coll))
+    log.debug(ctx, 'check coll delete <{}>', coll)
 
     if re.match(r'^/[^/]+/home/[^/]+$', coll) and not user.is_admin(ctx, actor):
         return policy.fail('Cannot delete or move collections directly under /home')
@@ -64,14 +62,14 @@ def can_coll_delete(ctx, actor, coll):
 
 
 def can_coll_move(ctx, actor, src, dst):
-    log.debug(ctx, 'check coll move <{}> -> <{}>'.format(src, dst))
+    log.debug(ctx, 'check coll move <{}> -> <{}>', src, dst)
 
     return policy.all(can_coll_delete(ctx, actor, src),
                       can_coll_create(ctx, actor, dst))
 
 
 def can_data_create(ctx, actor, path):
-    log.debug(ctx, 'check data create <{}>'.format(path))
+    log.debug(ctx, 'check data create <{}>', path)
 
     if pathutil.info(path).space is pathutil.Space.RESEARCH:
         if folder.is_locked(ctx, pathutil.dirname(path)):
@@ -93,7 +91,7 @@ def can_data_create(ctx, actor, path):
 
 
 def can_data_write(ctx, actor, path):
-    log.debug(ctx, 'check data write <{}>'.format(path))
+    log.debug(ctx, 'check data write <{}>', path)
 
     # Disallow writing to locked objects in research folders.
     if pathutil.info(path).space is pathutil.Space.RESEARCH:
@@ -124,12 +122,12 @@ def can_data_delete(ctx, actor, path):
 
 
 def can_data_copy(ctx, actor, src, dst):
-    log.debug(ctx, 'check data copy <{}> -> <{}>'.format(src, dst))
+    log.debug(ctx, 'check data copy <{}> -> <{}>', src, dst)
     return can_data_create(ctx, actor, dst)
 
 
 def can_data_move(ctx, actor, src, dst):
-    log.debug(ctx, 'check data move <{}> -> <{}>'.format(src, dst))
+    log.debug(ctx, 'check data move <{}> -> <{}>', src, dst)
     return policy.all(can_data_delete(ctx, actor, src),
                       can_data_create(ctx, actor, dst))
 
@@ -150,17 +148,17 @@ def can_data_move(ctx, actor, src, dst):
 @policy.require()
 def py_acPreprocForCollCreate(ctx):
     log._debug(ctx, 'py_acPreprocForCollCreate')
-    # print(jsonutil.dump(session_vars.get_map(ctx.rei)))
+    # print(jsonutil.dump(ctx.session_map()))
     return can_coll_create(ctx, user.user_and_zone(ctx),
-                           str(session_vars.get_map(ctx.rei)['collection']['name']))
+                           str(ctx.session_map()['collection']['name']))
 
 
 @policy.require()
 def py_acPreprocForRmColl(ctx):
     log._debug(ctx, 'py_acPreprocForRmColl')
-    # print(jsonutil.dump(session_vars.get_map(ctx.rei)))
+    # print(jsonutil.dump(ctx.session_map()))
     return can_coll_delete(ctx, user.user_and_zone(ctx),
-                           str(session_vars.get_map(ctx.rei)['collection']['name']))
+                           str(ctx.session_map()['collection']['name']))
 
 
 @policy.require()
@@ -168,9 +166,9 @@ def py_acPreprocForDataObjOpen(ctx):
     log._debug(ctx, 'py_acPreprocForDataObjOpen')
     # data object reads are always allowed.
     # writes are blocked e.g. when the object is locked (unless actor is a rodsadmin).
-    if session_vars.get_map(ctx.rei)['data_object']['write_flag'] == 1:
+    if ctx.session_map()['data_object']['write_flag'] == 1:
         return can_data_write(ctx, user.user_and_zone(ctx),
-                              str(session_vars.get_map(ctx.rei)['data_object']['object_path']))
+                              str(ctx.session_map()['data_object']['object_path']))
     else:
         return policy.succeed()
 
@@ -180,7 +178,7 @@ def py_acDataDeletePolicy(ctx):
     log._debug(ctx, 'py_acDataDeletePolicy')
     return (policy.succeed()
             if can_data_delete(ctx, user.user_and_zone(ctx),
-                               str(session_vars.get_map(ctx.rei)['data_object']['object_path']))
+                               str(ctx.session_map()['data_object']['object_path']))
             else ctx.msiDeleteDisallowed())
 
 
@@ -192,9 +190,9 @@ def py_acPreProcForObjRename(ctx, src, dst):
     RENAME_DATA_OBJ = 11
     RENAME_COLL     = 12
 
-    if session_vars.get_map(ctx.rei)['operation_type'] == RENAME_DATA_OBJ:
+    if ctx.session_map()['operation_type'] == RENAME_DATA_OBJ:
         return can_data_move(ctx, user.user_and_zone(ctx), src, dst)
-    elif session_vars.get_map(ctx.rei)['operation_type'] == RENAME_COLL:
+    elif ctx.session_map()['operation_type'] == RENAME_COLL:
         return can_coll_move(ctx, user.user_and_zone(ctx), src, dst)
 
     # if ($objPath like regex "/[^/]+/home/" ++ IIGROUPPREFIX ++ ".[^/]*/.*") {
@@ -205,7 +203,7 @@ def py_acPostProcForPut(ctx):
     log._debug(ctx, 'py_acPostProcForPut')
     # Data object creation cannot be prevented by API dynpeps and static PEPs,
     # due to how MSIs work. Thus, this ugly workaround specifically for MSIs.
-    path = str(session_vars.get_map(ctx.rei)['data_object']['object_path'])
+    path = str(ctx.session_map()['data_object']['object_path'])
     x = can_data_create(ctx, user.user_and_zone(ctx), path)
 
     if not x:
@@ -219,7 +217,7 @@ def py_acPostProcForCopy(ctx):
     # See py_acPostProcForPut.
     log._debug(ctx, 'py_acPostProcForCopy')
 
-    path = str(session_vars.get_map(ctx.rei)['data_object']['object_path'])
+    path = str(ctx.session_map()['data_object']['object_path'])
     x = can_data_create(ctx, user.user_and_zone(ctx), path)
 
     if not x:
@@ -398,6 +396,9 @@ def py_acPreProcForModifyAVUMetadata(ctx, option, obj_type, obj_name, attr, valu
 # imeta mod
 @policy.require()
 def py_acPreProcForModifyAVUMetadata_mod(ctx, *args):
+    # There is no post PEP for imeta mod (see uuPolicies.r).
+    cache.invalidate(args[2], args[3])
+
     actor = user.user_and_zone(ctx)
     if user.is_admin(ctx, actor):
         return policy.succeed()
@@ -412,6 +413,9 @@ def py_acPreProcForModifyAVUMetadata_mod(ctx, *args):
 # imeta cp
 @policy.require()
 def py_acPreProcForModifyAVUMetadata_cp(ctx, _, t_src, t_dst, src, dst):
+    # There is no post PEP for imeta cp (see uuPolicies.r).
+    cache.invalidate(dst)
+
     actor = user.user_and_zone(ctx)
     if user.is_admin(ctx, actor):
         return policy.succeed()
@@ -435,6 +439,8 @@ def py_acPreProcForModifyAVUMetadata_cp(ctx, _, t_src, t_dst, src, dst):
 # are called here.
 @rule.make()
 def py_acPostProcForModifyAVUMetadata(ctx, option, obj_type, obj_name, attr, value, unit):
+    cache.invalidate(obj_name, attr)
+
     info = pathutil.info(obj_name)
 
     if attr == constants.IISTATUSATTRNAME and info.space is pathutil.Space.RESEARCH:
@@ -481,6 +487,8 @@ def py_acPreProcForExecCmd(ctx, cmd, args, addr, hint):
 
 @rule.make()
 def pep_resource_modified_post(ctx, instance_name, _ctx, out):
+    cache.invalidate(_ctx.map()['logical_path'])
+
     if instance_name not in config.resource_primary or not config.resource_replica:
         return
 
@@ -518,6 +526,8 @@ def pep_resource_modified_post(ctx, instance_name, _ctx, out):
 
 @rule.make()
 def py_acPostProcForObjRename(ctx, src, dst):
+    cache.invalidate(src, dst)
+
     # Update ACLs to give correct group ownership when an object is moved into
     # a different research- or grp- collection.
     info = pathutil.info(dst)
@@ -525,5 +535,21 @@ def py_acPostProcForObjRename(ctx, src, dst):
         if len(info.subpath) and info.group != pathutil.info(src).group:
             ctx.uuEnforceGroupAcl(dst)
 
+# }}}
+# Cache invalidation {{{
+
+# Cached lookups (see util/cache.py) are invalidated by the AVU, data object
+# and rename PEPs above, and by the following PEPs for ACL and group changes.
+
+
+@rule.make()
+def py_acPostProcForModifyAccessControl(ctx, recursive, access_level, user_name, zone, path):
+    cache.invalidate(path)
+
+
+@rule.make()
+def py_acPostProcForModifyUserGroup(ctx, group_name, option, user_name, zone):
+    cache.invalidate(group_name, user_name)
+
 # }}}
 # }}}
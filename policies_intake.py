@@ -8,6 +8,15 @@ __license__   = 'GPLv3, see LICENSE'
 import intake_scan
 
 from util import *
+from util.query import Query
+
+# Conditions for the dataset lock checks below, see util.query.render.
+DATA_DATASET_ID = "DATA_NAME = {name} AND META_DATA_ATTR_NAME = 'dataset_id' AND COLL_NAME = {coll}"
+COLL_DATASET_ID = "COLL_NAME = {coll} AND META_COLL_ATTR_NAME = 'dataset_id'"
+COLL_TOPLEVEL   = "META_COLL_ATTR_VALUE = {dataset_id} AND META_COLL_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME like {intake}"
+DATA_TOPLEVEL   = "META_DATA_ATTR_VALUE = {dataset_id} AND META_DATA_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME like {intake}"
+COLL_LOCKS      = "COLL_NAME like {coll} AND META_COLL_ATTR_NAME in ('to_vault_lock', 'to_vault_freeze')"
+DATA_LOCKS      = "COLL_NAME like {coll} AND META_DATA_ATTR_NAME in ('to_vault_lock', 'to_vault_freeze')"
 
 
 def is_data_in_locked_dataset(ctx, actor, path):
@@ -16,21 +25,23 @@ def is_data_in_locked_dataset(ctx, actor, path):
     coll = pathutil.chop(path)[0]
     data_name = pathutil.chop(path)[1]
 
-    iter = genquery.row_iterator(
-        "META_DATA_ATTR_VALUE",
-        "DATA_NAME = '" + data_name + "' AND META_DATA_ATTR_NAME = 'dataset_id' AND COLL_NAME = '" + coll + "' ",
-        genquery.AS_LIST, ctx
+    iter = Query(
+        ctx, "META_DATA_ATTR_VALUE",
+        DATA_DATASET_ID,
+        params={'name': data_name, 'coll': coll},
+        output=query.AS_LIST
     )
     for row in iter:
         dataset_id = row[0]
-        log.debug(ctx, 'dataset found: ' + dataset_id)
+        log.debug(ctx, 'dataset found: {}', dataset_id)
 
         # now check whether a lock exists
         # Find the toplevel and get the collection check whether is locked
-        iter = genquery.row_iterator(
-            "COLL_NAME",
-            "META_COLL_ATTR_VALUE = '" + dataset_id + "' AND META_COLL_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME like '/" + user.zone(ctx) + "/home/grp-intake-%'",
-            genquery.AS_LIST, ctx
+        iter = Query(
+            ctx, "COLL_NAME",
+            COLL_TOPLEVEL,
+            params={'dataset_id': dataset_id, 'intake': '/' + user.zone(ctx) + '/home/grp-intake-%'},
+            output=query.AS_LIST
         )
         toplevel_collection = ''
         toplevel_is_collection = False
@@ -40,10 +51,11 @@ def is_data_in_locked_dataset(ctx, actor, path):
 
         if not toplevel_collection:
             # dataset is based on a data object
-            iter = genquery.row_iterator(
-                "COLL_NAME, DATA_NAME",
-                "META_DATA_ATTR_VALUE = '" + dataset_id + "' AND  META_DATA_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME like '/" + user.zone(ctx) + "/home/grp-intake-%'",
-                genquery.AS_LIST, ctx
+            iter = Query(
+                ctx, "COLL_NAME, DATA_NAME",
+                DATA_TOPLEVEL,
+                params={'dataset_id': dataset_id, 'intake': '/' + user.zone(ctx) + '/home/grp-intake-%'},
+                output=query.AS_LIST
             )
             for row in iter:
                 toplevel_collection = row[0] + '/' + row[1]
@@ -54,7 +66,7 @@ def is_data_in_locked_dataset(ctx, actor, path):
             log.debug(ctx, locked_state)
             return (locked_state['locked'] or locked_state['frozen']) and not user.is_admin(ctx, actor)
         else:
-            log.debug(ctx, "Could not determine lock state of data object " + path)
+            log.debug(ctx, 'Could not determine lock state of data object {}', path)
             # Pretend presence of a lock so no unwanted data gets deleted
             return True
 
@@ -65,23 +77,25 @@ def is_data_in_locked_dataset(ctx, actor, path):
 def is_coll_in_locked_dataset(ctx, actor, coll):
     """ Check whether given collection is within a locked dataset """
     dataset_id = ''
-    iter = genquery.row_iterator(
-        "META_COLL_ATTR_VALUE",
-        "COLL_NAME = '" + coll + "' AND META_COLL_ATTR_NAME = 'dataset_id' ",
-        genquery.AS_LIST, ctx
+    iter = Query(
+        ctx, "META_COLL_ATTR_VALUE",
+        COLL_DATASET_ID,
+        params={'coll': coll},
+        output=query.AS_LIST
     )
     for row in iter:
         dataset_id = row[0]
-        log.debug(ctx, 'dataset found: ' + dataset_id)
+        log.debug(ctx, 'dataset found: {}', dataset_id)
 
         # now check whether a lock exists
         # return True
 
         # Find the toplevel and get the collection check whether is locked
-        iter = genquery.row_iterator(
-            "COLL_NAME",
-            "META_COLL_ATTR_VALUE = '" + dataset_id + "' AND META_COLL_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME like '/" + user.zone(ctx) + "/home/grp-intake-%'",
-            genquery.AS_LIST, ctx
+        iter = Query(
+            ctx, "COLL_NAME",
+            COLL_TOPLEVEL,
+            params={'dataset_id': dataset_id, 'intake': '/' + user.zone(ctx) + '/home/grp-intake-%'},
+            output=query.AS_LIST
         )
         toplevel_collection = ''
         toplevel_is_collection = False
@@ -91,10 +105,11 @@ def is_coll_in_locked_dataset(ctx, actor, coll):
 
         if not toplevel_collection:
             # dataset is based on a data object
-            iter = genquery.row_iterator(
-                "COLL_NAME",
-                "META_DATA_ATTR_VALUE = '" + dataset_id + "' AND  META_DATA_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME like '/" + user.zone(ctx) + "/home/grp-intake-%'",
-                genquery.AS_LIST, ctx
+            iter = Query(
+                ctx, "COLL_NAME",
+                DATA_TOPLEVEL,
+                params={'dataset_id': dataset_id, 'intake': '/' + user.zone(ctx) + '/home/grp-intake-%'},
+                output=query.AS_LIST
             )
             for row in iter:
                 toplevel_collection = row[0]
@@ -105,7 +120,7 @@ def is_coll_in_locked_dataset(ctx, actor, coll):
             log.debug(ctx, locked_state)
             return (locked_state['locked'] or locked_state['frozen']) and not user.is_admin(ctx, actor)
         else:
-            log.debug(ctx, "Could not determine lock state of data object " + path)
+            log.debug(ctx, 'Could not determine lock state of data object {}', path)
             # Pretend presence of a lock so no unwanted data gets deleted
             return True
 
@@ -116,22 +131,24 @@ def is_coll_in_locked_dataset(ctx, actor, coll):
 def coll_in_path_of_locked_dataset(ctx, actor, coll):
     """ If collection is part of a locked dataset, or holds one on a deeper level, then deletion is not allowed """
     dataset_id = ''
-    iter = genquery.row_iterator(
-        "META_COLL_ATTR_VALUE",
-        "COLL_NAME = '" + coll + "' AND META_COLL_ATTR_NAME = 'dataset_id' ",
-        genquery.AS_LIST, ctx
+    iter = Query(
+        ctx, "META_COLL_ATTR_VALUE",
+        COLL_DATASET_ID,
+        params={'coll': coll},
+        output=query.AS_LIST
     )
 
     for row in iter:
         dataset_id = row[0]
-        log.debug(ctx, 'dataset found: ' + dataset_id)
+        log.debug(ctx, 'dataset found: {}', dataset_id)
 
     if dataset_id:
         # Now find the toplevel and get the collection check whether is locked
-        iter = genquery.row_iterator(
-            "COLL_NAME",
-            "META_COLL_ATTR_VALUE = '" + dataset_id + "' AND META_COLL_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME like '/" + user.zone(ctx) + "/home/grp-intake-%'",
-            genquery.AS_LIST, ctx
+        iter = Query(
+            ctx, "COLL_NAME",
+            COLL_TOPLEVEL,
+            params={'dataset_id': dataset_id, 'intake': '/' + user.zone(ctx) + '/home/grp-intake-%'},
+            output=query.AS_LIST
         )
         toplevel_collection = ''
         toplevel_is_collection = False
@@ -141,10 +158,11 @@ def coll_in_path_of_locked_dataset(ctx, actor, coll):
 
         if not toplevel_collection:
             # dataset is based on a data object
-            iter = genquery.row_iterator(
-                "COLL_NAME",
-                "META_DATA_ATTR_VALUE = '" + dataset_id + "' AND  META_DATA_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME like '/" + user.zone(ctx) + "/home/grp-intake-%'",
-                genquery.AS_LIST, ctx
+            iter = Query(
+                ctx, "COLL_NAME",
+                DATA_TOPLEVEL,
+                params={'dataset_id': dataset_id, 'intake': '/' + user.zone(ctx) + '/home/grp-intake-%'},
+                output=query.AS_LIST
             )
             for row in iter:
                 toplevel_collection = row[0]
@@ -155,16 +173,17 @@ def coll_in_path_of_locked_dataset(ctx, actor, coll):
             log.debug(ctx, locked_state)
             return (locked_state['locked'] or locked_state['frozen']) and not user.is_admin(ctx, actor)
         else:
-            log.debug(ctx, "Could not determine lock state of data object " + path)
+            log.debug(ctx, 'Could not determine lock state of data object {}', path)
             # Pretend presence of a lock so no unwanted data gets deleted
             return True
     else:
         # No dataset found on indicated collection. Possibly in deeper collections.
         # Can be dataset based upon collection or data object
-        iter = genquery.row_iterator(
-            "META_COLL_ATTR_VALUE",
-            "COLL_NAME like '" + coll + "%' AND META_COLL_ATTR_NAME in ('to_vault_lock','to_vault_freeze') ",
-            genquery.AS_LIST, ctx
+        iter = Query(
+            ctx, "META_COLL_ATTR_VALUE",
+            COLL_LOCKS,
+            params={'coll': coll + '%'},
+            output=query.AS_LIST
         )
         for _row in iter:
             log.debug(ctx, 'Found deeper LOCK')
@@ -172,10 +191,11 @@ def coll_in_path_of_locked_dataset(ctx, actor, coll):
             return not user.is_admin(ctx, actor)
 
         # Could be a dataset based on a data object
-        iter = genquery.row_iterator(
-            "META_DATA_ATTR_VALUE",
-            "COLL_NAME like '" + coll + "%' AND META_DATA_ATTR_NAME in ('to_vault_lock','to_vault_freeze') ",
-            genquery.AS_LIST, ctx
+        iter = Query(
+            ctx, "META_DATA_ATTR_VALUE",
+            DATA_LOCKS,
+            params={'coll': coll + '%'},
+            output=query.AS_LIST
         )
         for _row in iter:
             log.debug(ctx, 'Found deeper LOCK')
@@ -22,7 +22,12 @@ __all__ = ['rule_process_publication',
 
 def get_publication_config(ctx):
     """Get all publication config keys and their values and report any missing keys."""
-    zone = user.zone(ctx)
+    return _get_publication_config(ctx, user.zone(ctx))
+
+
+@cache.cached('publication_config', size=1,
+              tags=lambda zone: ['/' + zone + constants.UUSYSTEMCOLLECTION])
+def _get_publication_config(ctx, zone):
     system_coll = "/" + zone + constants.UUSYSTEMCOLLECTION
 
     attr2keys = {"public_host": "publicHost",
@@ -195,9 +200,9 @@ def save_publication_state(ctx, vault_package, publication_state):
     :param publication_state: Dict with state of the publication process
     """
     ret_val = ctx.msi_rmw_avu("-C", vault_package, constants.UUORGMETADATAPREFIX + 'publication_%', "%", "%")
-    for key in publication_state.keys():
-        if publication_state[key] != "":
-            avu.set_on_coll(ctx, vault_package, constants.UUORGMETADATAPREFIX + 'publication_' + key, publication_state[key])
+    avu.set_many(ctx, vault_package, '-C',
+                 [(constants.UUORGMETADATAPREFIX + 'publication_' + key, value)
+                  for key, value in publication_state.items() if value != ""])
 
 
 def set_update_publication_state(ctx, vault_package):
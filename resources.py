@@ -176,10 +176,13 @@ def api_resource_resource_and_tier_data(ctx):
         genquery.AS_LIST, ctx
     )
 
-    for row in iter:
+    rows = list(iter)
+    tiers = get_tiers_by_resource_names(ctx, [row[1] for row in rows])
+
+    for row in rows:
         resourceId = row[0]
         resourceName = row[1]
-        tierName = get_tier_by_resource_name(ctx, resourceName)
+        tierName = tiers[resourceName]
         resourceList.append({'name': resourceName,
                              'id': resourceId,
                              'tier': tierName})
@@ -375,21 +378,20 @@ def get_groups_on_categories(ctx, categories):
             genquery.AS_LIST, ctx
         )
 
-        for row in iter:
-            groupName = row[0]
-            if groupName.startswith('research-'):
-                iter2 = genquery.row_iterator(
-                    "META_USER_ATTR_VALUE, USER_NAME, USER_GROUP_NAME",
-                    "META_USER_ATTR_NAME = '" + metadataAttrNameRefMonth + "' AND USER_NAME = '" + groupName + "'",
-                    genquery.AS_LIST, ctx
-                )
-
-                data_size = 0
-                for row in iter2:
-                    data = row[0]
-                    temp = jsonutil.parse(data)
-                    data_size = data_size + int(float(temp[2]))  # no construction for summation required in this case
-                groups.append([groupName, data_size])
+        research_groups = [row[0] for row in iter if row[0].startswith('research-')]
+
+        # Get storage data of all groups in this category at once.
+        storage = query.batch(ctx, "USER_NAME", research_groups,
+                              "META_USER_ATTR_VALUE, USER_GROUP_NAME",
+                              "META_USER_ATTR_NAME = '" + metadataAttrNameRefMonth + "'")
+
+        for groupName in research_groups:
+            data_size = 0
+            for row in storage[groupName]:
+                data = row[0]
+                temp = jsonutil.parse(data)
+                data_size = data_size + int(float(temp[2]))  # no construction for summation required in this case
+            groups.append([groupName, data_size])
 
     return groups
 
@@ -421,6 +423,8 @@ def get_categories_datamanager(ctx, datamanagerName):
     return categories
 
 
+@cache.cached('resource_tier', size=100,
+              tags=lambda res_name: [res_name, constants.UURESOURCETIERATTRNAME])
 def get_tier_by_resource_name(ctx, res_name):
     """Get Tiername, if present, for given resource.
 
@@ -447,6 +451,25 @@ def get_tier_by_resource_name(ctx, res_name):
     return tier
 
 
+def get_tiers_by_resource_names(ctx, res_names):
+    """Get Tiernames for a list of resources, with a single lookup.
+
+    Resources without a tier fall back to the default tier name.
+
+    :param ctx:       Combined type of a callback and rei struct
+    :param res_names: Names of the resources to get the tier names for
+
+    :returns: Dict of resource name => tier name
+    """
+    tiers = query.batch(ctx, "RESC_NAME", res_names,
+                        "META_RESC_ATTR_VALUE",
+                        "META_RESC_ATTR_NAME = '{}'".format(constants.UURESOURCETIERATTRNAME))
+
+    # Like get_tier_by_resource_name, the last tier found wins.
+    return {name: values[-1] if len(values) else constants.UUDEFAULTRESOURCETIER
+            for name, values in tiers.items()}
+
+
 @rule.make()
 def rule_resource_store_monthly_storage_statistics(ctx):
     """For all categories known store all found storage data for each group belonging to those category.
@@ -466,97 +489,88 @@ def rule_resource_store_monthly_storage_statistics(ctx):
     dt = datetime.today()
     md_storage_month = constants.UUMETADATASTORAGEMONTH + dt.strftime("%m")
 
-    # Delete previous data for that month. Could be one year ago as this is circular buffer containing max 1 year
-    iter = genquery.row_iterator(
-        "META_USER_ATTR_VALUE, USER_GROUP_NAME",
-        "META_USER_ATTR_NAME = '" + md_storage_month + "'",
-        genquery.AS_LIST, ctx
-    )
-    for row in iter:
-        avu.rm_from_group(ctx, row[1], md_storage_month, row[0])
-
-    # Get all categories
-    categories = []
-    iter = genquery.row_iterator(
-        "META_USER_ATTR_VALUE",
-        "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME = 'category'",
-        genquery.AS_LIST, ctx
-    )
-    for row in iter:
-        categories.append(row[0])
-
-    # Get all tiers - Standard must be present
-    tiers = get_all_tiers(ctx)
-
-    # List of resources and their corresponding tiers (for easy access further)
-    resource_tiers = {}
-    for resource in get_resources(ctx):
-        resource_tiers[resource] = get_tier_by_resource_name(ctx, resource)
-
-    # Steps to be taken per group
-    steps = ['research', 'vault']
-
-    # Loop through all categories
-    for category in categories:
-        groups = get_groups_on_category(ctx, category)
-
-        for group in groups:
-            # Per group collect totals for category and tier
-
-            # Loop though all tiers and set storage to 0
-            tier_storage = {}
-            for tier in tiers:
-                tier_storage[tier] = 0
-
-            # per group handle research and vault
-            for step in steps:
-                if step == 'research':
-                    path = '/' + zone + '/home/' + group
-                else:
-                    path = '/' + zone + '/home/vault/' + group.replace('research-', 'vault-', 1)
-
-                # Per group two statements are required to gather all data
-                # 1) data in folder itself
-                # 2) data in all subfolders of the folder
-
-                for folder in ['self', 'subfolders']:
-                    if folder == 'self':
-                        whereClause = "COLL_NAME = '" + path + "'"
-                    else:
-                        whereClause = "COLL_NAME like '" + path + "%'"
+    with metrics.job(ctx, 'resource_monthly_storage_statistics') as job:
+        with job.phase('clear'):
+            # Delete previous data for that month. Could be one year ago as this is circular buffer containing max 1 year
+            iter = genquery.row_iterator(
+                "META_USER_ATTR_VALUE, USER_GROUP_NAME",
+                "META_USER_ATTR_NAME = '" + md_storage_month + "'",
+                genquery.AS_LIST, ctx
+            )
+            for row in iter:
+                avu.rm_from_group(ctx, row[1], md_storage_month, row[0])
+                job.items += 1
 
+        # Get all categories
+        categories = []
+        iter = genquery.row_iterator(
+            "META_USER_ATTR_VALUE",
+            "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME = 'category'",
+            genquery.AS_LIST, ctx
+        )
+        for row in iter:
+            categories.append(row[0])
+
+        # Get all tiers - Standard must be present
+        tiers = get_all_tiers(ctx)
+
+        # List of resources and their corresponding tiers (for easy access further)
+        resource_tiers = get_tiers_by_resource_names(ctx, get_resources(ctx))
+
+        # Steps to be taken per group
+        steps = ['research', 'vault']
+
+        with job.phase('collect'):
+            # Loop through all categories
+            for category in categories:
+                groups = get_groups_on_category(ctx, category)
+
+                for group in groups:
+                    # Per group collect totals for category and tier
+
+                    # Loop though all tiers and set storage to 0
+                    tier_storage = {}
+                    for tier in tiers:
+                        tier_storage[tier] = 0
+
+                    # per group handle research and vault
+                    for step in steps:
+                        if step == 'research':
+                            path = '/' + zone + '/home/' + group
+                        else:
+                            path = '/' + zone + '/home/vault/' + group.replace('research-', 'vault-', 1)
+
+                        # Sum up data in the folder and all its subfolders per resource
+                        sizes = collection.aggregate(ctx, path, ['SUM(DATA_SIZE)'], group='RESC_NAME')
+                        for resource, [storage] in sizes.items():
+                            # sum up for this tier
+                            the_tier = resource_tiers[resource]
+                            tier_storage[the_tier] += storage or 0
+
+                    # 3) Revision erea
+                    revision_path = '/' + zone + '/' + constants.UUREVISIONCOLLECTION + '/' + group
+                    whereClause = "COLL_NAME like '" + revision_path + "%'"
                     iter = genquery.row_iterator(
                         "SUM(DATA_SIZE), RESC_NAME",
                         whereClause,
                         genquery.AS_LIST, ctx
                     )
-
                     for row in iter:
                         # sum up for this tier
                         the_tier = resource_tiers[row[1]]
                         tier_storage[the_tier] += int(row[0])
 
-            # 3) Revision erea
-            revision_path = '/' + zone + '/' + constants.UUREVISIONCOLLECTION + '/' + group
-            whereClause = "COLL_NAME like '" + revision_path + "%'"
-            iter = genquery.row_iterator(
-                "SUM(DATA_SIZE), RESC_NAME",
-                whereClause,
-                genquery.AS_LIST, ctx
-            )
-            for row in iter:
-                # sum up for this tier
-                the_tier = resource_tiers[row[1]]
-                tier_storage[the_tier] += int(row[0])
-
-            # Write total storages as metadata on current group for any tier
-            key = md_storage_month
-            # val = [category, tier, storage]
-            for tier in tiers:
-                # constructed this way to be backwards compatible (not using json.dump)
-                val = "[\"" + category + "\", \"" + tier + "\", " + str(tier_storage[tier]) + "]"
-                # write as metadata (kv-pair) to current group
-                avu.associate_to_group(ctx, group, key, val)
+                    job.items += 1
+                    job.bytes += sum(tier_storage.values())
+
+                    # Write total storages as metadata on current group for any tier
+                    key = md_storage_month
+                    # val = [category, tier, storage]
+                    for tier in tiers:
+                        # constructed this way to be backwards compatible (not using json.dump)
+                        val = "[\"" + category + "\", \"" + tier + "\", " + str(tier_storage[tier]) + "]"
+                        # write as metadata (kv-pair) to current group
+                        avu.associate_to_group(ctx, group, key, val)
 
     return 'ok'
 
@@ -576,6 +590,7 @@ def resource_exists(ctx, resource_name):
     return False
 
 
+@cache.cached('resource_tiers', size=1, tags=lambda: [constants.UURESOURCETIERATTRNAME])
 def get_all_tiers(ctx):
     """List all tiers currently present including 'Standard'."""
     tiers = [constants.UUDEFAULTRESOURCETIER]
@@ -19,6 +19,11 @@ __all__ = ['api_revisions_restore',
            'api_revisions_list',
            'rule_revisions_clean_up']
 
+# Conditions used while stepping through the revision store, see util.query.render.
+REVISION_ORIGINAL_PATHS = "META_DATA_ATTR_NAME = {attr} AND COLL_NAME like {store}"
+REVISION_BY_ID          = "DATA_ID = {id} AND COLL_NAME like {store}"
+REVISIONS_OF_PATH       = "META_DATA_ATTR_NAME = {attr} AND META_DATA_ATTR_VALUE = {path} AND COLL_NAME like {store}"
+
 
 @rule.make(inputs=range(2), outputs=range(2, 3))
 def rule_revisions_clean_up(ctx, bucketcase, endOfCalendarDay):
@@ -45,25 +50,32 @@ def rule_revisions_clean_up(ctx, bucketcase, endOfCalendarDay):
     buckets = revision_bucket_list(ctx, bucketcase)
 
     # step through entire revision store and per item apply the bucket strategy
-    iter = genquery.row_iterator(
-        "META_DATA_ATTR_VALUE",
-        "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + 'original_path' + "'"
-        " AND COLL_NAME like '" + revision_store + "%'",
-        genquery.AS_LIST, ctx
+    iter = Query(
+        ctx, "META_DATA_ATTR_VALUE",
+        REVISION_ORIGINAL_PATHS,
+        params={'attr': constants.UUORGMETADATAPREFIX + 'original_path', 'store': revision_store + '%'},
+        output=query.AS_LIST
     )
 
-    for row in iter:
-        original_path = row[0]
-        # Get all related revisions
-        revisions = get_revision_list(ctx, original_path)
+    with metrics.job(ctx, 'revisions_clean_up', bucketcase=bucketcase) as job, job.phase('clean_up'):
+        for row in iter:
+            original_path = row[0]
+            job.items += 1
+
+            # Get all related revisions
+            revisions = get_revision_list(ctx, original_path)
+            metrics.observe('revisions_per_original', len(revisions))
 
-        # Process the original path conform the bucket settings
-        candidates = get_deletion_candidates(ctx, buckets, revisions, end_of_calendar_day)
+            # Process the original path conform the bucket settings
+            candidates = get_deletion_candidates(ctx, buckets, revisions, end_of_calendar_day)
 
-        # Delete the revisions that were found being obsolete
-        for revision_id in candidates:
-            if not revision_remove(ctx, revision_id):
-                return 'Something went wrong cleaning up revision store'
+            # Delete the revisions that were found being obsolete
+            for revision_id in candidates:
+                if not revision_remove(ctx, revision_id):
+                    job.errors += 1
+                    job.failed  = True
+                    return 'Something went wrong cleaning up revision store'
+                metrics.incr('revisions_removed')
 
     return 'Successfully cleaned up the revision store'
 
@@ -82,10 +94,11 @@ def revision_remove(ctx, revision_id):
     revision_store = '/' + zone + constants.UUREVISIONCOLLECTION
 
     # Check presence of specific revision in revision store
-    iter = genquery.row_iterator(
-        "COLL_NAME, DATA_NAME",
-        "DATA_ID = '" + revision_id + "' AND COLL_NAME like '" + revision_store + "%'",
-        genquery.AS_LIST, ctx
+    iter = Query(
+        ctx, "COLL_NAME, DATA_NAME",
+        REVISION_BY_ID,
+        params={'id': revision_id, 'store': revision_store + '%'},
+        output=query.AS_LIST
     )
 
     for row in iter:
@@ -171,26 +184,28 @@ def get_revision_list(ctx, path):
     zone = user.zone(ctx)
     revision_store = '/' + zone + constants.UUREVISIONCOLLECTION
 
-    iter = genquery.row_iterator(
-        "DATA_ID, order_desc(DATA_ID)",
-        "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + "original_path" + "'  "
-        " AND META_DATA_ATTR_VALUE = '" + path + "' "
-        " AND COLL_NAME like '" + revision_store + "%'",
-        genquery.AS_LIST, ctx
+    iter = Query(
+        ctx, "DATA_ID, order_desc(DATA_ID)",
+        REVISIONS_OF_PATH,
+        params={'attr': constants.UUORGMETADATAPREFIX + 'original_path', 'path': path, 'store': revision_store + '%'},
+        output=query.AS_LIST
     )
 
-    for row in iter:
-        # Get modification time
+    data_ids = [row[0] for row in iter]
+
+    # Get modification times of all revisions at once.
+    modify_times = query.batch(
+        ctx, "DATA_ID", data_ids,
+        "META_DATA_ATTR_VALUE",
+        "META_DATA_ATTR_NAME = {attr}",
+        params={'attr': constants.UUORGMETADATAPREFIX + 'original_modify_time'}
+    )
+
+    for data_id in data_ids:
         modify_time = 0
-        iter2 = genquery.row_iterator(
-            "META_DATA_ATTR_VALUE",
-            "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + "original_modify_time" + "' "
-            "AND DATA_ID = '" + row[0] + "'",
-            genquery.AS_LIST, ctx
-        )
-        for row2 in iter2:
-            modify_time = int(row2[0])
-        candidates.append([row[0], modify_time])
+        for value in modify_times[data_id]:
+            modify_time = int(value)
+        candidates.append([data_id, modify_time])
 
     return candidates
 
@@ -315,17 +330,17 @@ def api_revisions_search_on_filename(ctx, searchString, offset=0, limit=10):
             "COLL_NAME = '" + rev_data['main_revision_coll'] + "' "
             "AND META_DATA_ATTR_NAME = '" + originalDataNameKey + "' "
             "AND META_DATA_ATTR_VALUE = '" + rev_data['main_original_dataname'] + "' ",  # *originalDataName
-            genquery.AS_DICT, ctx)
+            genquery.AS_LIST, ctx)
 
-        for row in iter:
-            # based on data id get original_coll_name
-            iter2 = genquery.row_iterator(
-                "META_DATA_ATTR_VALUE",
-                "DATA_ID = '" + row['DATA_ID'] + "' "
-                "AND META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + 'original_path' + "' ",
-                genquery.AS_DICT, ctx)
-            for row2 in iter2:
-                rev_data['original_coll_name'] = row2['META_DATA_ATTR_VALUE']
+        # based on data ids get original_coll_name
+        original_paths = query.batch(
+            ctx, "DATA_ID", [row[0] for row in iter],
+            "META_DATA_ATTR_VALUE",
+            "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + 'original_path' + "' ")
+
+        for data_id, paths in original_paths.items():
+            for path in paths:
+                rev_data['original_coll_name'] = path
 
             rev_data['collection_exists'] = collection.exists(ctx, '/'.join(rev_data['original_coll_name'].split(os.path.sep)[:-1]))
             rev_data['original_coll_name'] = '/'.join(rev_data['original_coll_name'].split(os.path.sep)[3:])
@@ -381,25 +396,23 @@ def api_revisions_list(ctx, path):
     originalPathKey = constants.UUORGMETADATAPREFIX + 'original_path'
     startpath = '/' + zone + constants.UUREVISIONCOLLECTION
 
-    iter = genquery.row_iterator(
+    rows = list(genquery.row_iterator(
         "DATA_ID, COLL_NAME, order(DATA_NAME)",
         "META_DATA_ATTR_NAME = '" + originalPathKey + "' "
         "AND META_DATA_ATTR_VALUE = '" + path + "' "
         "AND COLL_NAME like '" + startpath + "%' ",
         genquery.AS_LIST, ctx
-    )
+    ))
 
-    for row in iter:
-        revisionPath = row[1] + '/' + row[2]
+    # Get metadata of all revisions at once.
+    revision_metadata = query.batch(ctx, "DATA_ID", [row[0] for row in rows],
+                                    "META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE")
 
-        iter2 = genquery.row_iterator(
-            "META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE ",
-            "DATA_ID = '" + row[0] + "' ",
-            genquery.AS_LIST, ctx
-        )
+    for row in rows:
+        revisionPath = row[1] + '/' + row[2]
 
         meta_data = {"data_id": row[0]}
-        for row2 in iter2:
+        for row2 in revision_metadata[row[0]]:
             meta_data[row2[0]] = row2[1]
 
         meta_data["dezoned_coll_name"] = '/' + '/'.join(meta_data["org_original_coll_name"].split(os.path.sep)[3:])
@@ -12,6 +12,12 @@ from util import *
 __all__ = []
 
 
+# Schemas and uischemas by path (see jsonutil.read).
+_read = cache.cached('schema', size=100)(jsonutil.read)
+
+
+@cache.cached('schema_category', size=1000,
+              tags=lambda rods_zone, group_name: [group_name, '/{}/yoda/schemas'.format(rods_zone)])
 def get_group_category(callback, rods_zone, group_name):
     """Determine category (for schema purposes) based upon rods zone and name of the group.
 
@@ -86,7 +92,7 @@ def get_active_schema(callback, path):
 
     :returns: Schema object (parsed from JSON)
     """
-    return jsonutil.read(callback, get_active_schema_path(callback, path))
+    return _read(callback, get_active_schema_path(callback, path))
 
 
 def get_active_schema_uischema(callback, path):
@@ -94,8 +100,8 @@ def get_active_schema_uischema(callback, path):
     schema_path   = get_active_schema_path(callback, path)
     uischema_path = '{}/{}'.format(pathutil.chop(schema_path)[0], 'uischema.json')
 
-    return jsonutil.read(callback, schema_path), \
-        jsonutil.read(callback, uischema_path)
+    return _read(callback, schema_path), \
+        _read(callback, uischema_path)
 
 
 def get_active_schema_id(callback, path):
@@ -146,4 +152,4 @@ def get_schema_by_id(callback, path, schema_id):
     path = get_schema_path_by_id(callback, path, schema_id)
     if path is None:
         return None
-    return jsonutil.read(callback, path)
+    return _read(callback, path)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Yoda ruleset benchmarks configuration.
+
+Benchmarks run the ruleset in-process against an in-memory catalog (see
+icat.py), so they do not need a Yoda environment. Like the ruleset, they
+run on Python 2.
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import json
+
+import pytest
+# Sets up the stand-ins for the modules iRODS provides, used by the modules below.
+import ruleset   # noqa: I100
+import icat      # noqa: I100
+import rulelang
+import zone
+
+# Zone sizes, see zone.build().
+ZONES = {'small':  dict(groups=2,  folders=5,  files=20,  revisions=3),
+         'medium': dict(groups=5,  folders=10, files=50,  revisions=4),
+         'large':  dict(groups=10, folders=20, files=100, revisions=5)}
+
+# Callback counters reported per benchmark.
+COUNTERS = ['queries', 'pages', 'rows', 'scanned', 'calls']
+
+
+def pytest_addoption(parser):
+    parser.addoption("--zone", action="store", default="small",
+                     help="Comma-separated zone sizes to benchmark ({})".format(', '.join(sorted(ZONES))))
+
+
+def pytest_generate_tests(metafunc):
+    if 'catalog' in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("--zone").split(',')
+        for size in sizes:
+            if size not in ZONES:
+                raise pytest.UsageError('Unknown zone size: {}'.format(size))
+        metafunc.parametrize('catalog', sizes, indirect=True, scope='session')
+
+
+def build_catalog(size):
+    """Build a catalog of the given size, including an intake study."""
+    catalog = zone.build(**ZONES[size])
+    zone.add_intake(catalog)
+    return catalog
+
+
+def callback(catalog, user='researcher', session_vars=None, warm=False):
+    """Create a callback for a user, with the rule language stand-ins registered.
+
+    Like a new agent, the callback starts with empty process-wide caches
+    (see util/cache.py), unless warm is set.
+    """
+    if not warm:
+        ruleset.module('util.cache').invalidate()
+
+    cb = icat.Callback(catalog, user)
+    cb.rei.session_vars.update(session_vars or {})
+    rulelang.register(cb)
+    return cb
+
+
+@pytest.fixture(scope='session')
+def rules():
+    """The ruleset package, loaded as iRODS does."""
+    return ruleset.load()
+
+
+@pytest.fixture(scope='session')
+def module(rules):
+    """Get a ruleset module by name, including modules that are only loaded when enabled."""
+    return ruleset.module
+
+
+@pytest.fixture(scope='session')
+def catalog(request):
+    """A catalog of the requested zone size, shared by benchmarks that do not modify it."""
+    return build_catalog(request.param)
+
+
+@pytest.fixture
+def fresh_catalog(request):
+    """Builds new catalogs of the requested zone size, for benchmarks that modify the catalog."""
+    return lambda: build_catalog(request.node.callspec.params['catalog'])
+
+
+@pytest.fixture
+def run(benchmark):
+    """Benchmark a rule, and record the catalog work of one call in the benchmark's extra info.
+
+    Every round gets a new callback, created outside of the timed call. To
+    benchmark rules that modify the catalog, pass a function that creates a
+    catalog as 'fresh'. To benchmark calls with the process-wide caches
+    filled by earlier calls, pass warm=True.
+
+    Returns the callback and rule output arguments of the last call.
+    """
+    def run(catalog, user, rule, *args, **options):
+        fresh  = options.get('fresh')
+        result = []
+
+        def setup():
+            return (callback(fresh() if fresh else catalog, user, options.get('session_vars'),
+                             options.get('warm', False)),), {}
+
+        def call(cb):
+            result[:] = [cb, rule(list(args), cb, cb.rei)]
+
+        benchmark.pedantic(call, setup=setup, rounds=options.get('rounds', 5))
+
+        cb, out = result
+        benchmark.extra_info.update((k, cb.stats.get(k, 0)) for k in COUNTERS)
+        return cb, out
+
+    return run
+
+
+@pytest.fixture
+def api(run):
+    """Benchmark an API rule (see run), and return the result data of the last call."""
+    def api(catalog, user, rule, params, **options):
+        cb, _ = run(catalog, user, rule, json.dumps(params), **options)
+        result = json.loads(''.join(cb.stdout))
+        assert result['status'] == 'ok', result
+        return result['data']
+
+    return api
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """Print the catalog work done by each benchmark, next to pytest-benchmark's timings."""
+    session = getattr(config, '_benchmarksession', None)
+    if session is None or not session.benchmarks:
+        return
+
+    tr = terminalreporter
+    tr.write_sep('-', 'catalog work per call')
+    width = max(len(b.name) for b in session.benchmarks)
+    tr.write_line('{:{}} '.format('Name', width) + ' '.join('{:>10}'.format(x) for x in COUNTERS))
+    for b in sorted(session.benchmarks, key=lambda b: b.name):
+        tr.write_line('{:{}} '.format(b.name, width)
+                      + ' '.join('{:>10}'.format(b.extra_info.get(x, '')) for x in COUNTERS))
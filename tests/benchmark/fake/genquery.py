@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Stand-in for the genquery module of the iRODS Python rule engine plugin.
+
+Most of the ruleset uses util/genquery.py instead, which is based on
+util.query. This module serves the modules that import the plugin's
+genquery module directly.
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+from collections import OrderedDict
+
+import irods_types
+
+AS_DICT = 0
+AS_LIST = 1
+
+
+def row_iterator(columns, conditions, row_return, callback):
+    """Iterate over the result rows of a genquery."""
+    if isinstance(columns, str):
+        columns = [x.strip() for x in columns.split(',')]
+
+    gqi = callback.msiMakeGenQuery(', '.join(columns), conditions, irods_types.GenQueryInp())['arguments'][2]
+    ret = callback.msiExecGenQuery(gqi, irods_types.GenQueryOut())
+    gqo = ret['arguments'][1]
+
+    while True:
+        for r in range(gqo.rowCnt):
+            row = [gqo.sqlResult[c].row(r) for c in range(len(columns))]
+            yield OrderedDict(zip(columns, row)) if row_return == AS_DICT else row
+
+        if not gqo.continueInx:
+            return
+
+        gqo = callback.msiGetMoreRows(gqi, gqo, 0)['arguments'][1]
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Stand-in for the irods_types module of the iRODS Python rule engine plugin.
+
+Only the types and attributes used by the ruleset are provided.
+See tests/benchmark/icat.py for the callback that fills them.
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+
+class GenQueryInp(object):
+    def __init__(self):
+        self.maxRows     = 0
+        self.continueInx = 0
+        self.rowOffset   = 0
+        self.options     = 0
+        # Not part of the real type: the query text, as passed to msiMakeGenQuery.
+        self.select      = ''
+        self.where       = ''
+
+
+class SqlResult(object):
+    def __init__(self, attriInx, values):
+        self.attriInx = attriInx
+        self.len      = len(values)
+        self._values  = values
+
+    def row(self, i):
+        return self._values[i]
+
+
+class GenQueryOut(object):
+    def __init__(self):
+        self.rowCnt        = 0
+        self.attriCnt      = 0
+        self.continueInx   = 0
+        self.totalRowCount = 0
+        self.sqlResult     = []
+
+
+class BytesBuf(object):
+    def __init__(self):
+        self.len = 0
+        self.buf = ''
+
+
+class KeyValPair(object):
+    def __init__(self):
+        self.ssLen = 0
+        self.key   = []
+        self.value = []
+
+
+class ExecCmdOut(object):
+    def __init__(self):
+        self.stdoutBuf = BytesBuf()
+        self.stderrBuf = BytesBuf()
+        self.status    = 0
+
+
+class InxIvalPair(object):
+    def __init__(self):
+        self.len   = 0
+        self.inx   = []
+        self.value = []
+
+
+class InxValPair(InxIvalPair):
+    pass
+
+
+c_string       = str
+c_string_array = list
+char_array     = str
+int_array      = list
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""Stand-in for the session_vars module of the iRODS Python rule engine plugin."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+
+def get_map(rei):
+    """Get the session variables of a rule invocation (see icat.Rei)."""
+    return rei.session_vars
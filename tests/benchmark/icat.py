@@ -0,0 +1,1119 @@
+# -*- coding: utf-8 -*-
+"""In-memory iRODS catalog and rule engine callback, for running the ruleset offline.
+
+The ruleset talks to iRODS through a rule engine callback (genqueries,
+microservices and other rules) and the session_vars and irods_types modules.
+This module provides stand-ins for these, backed by a Catalog of
+collections, data objects with replicas, users, groups, resources and AVUs,
+so that rules and APIs can be run and benchmarked without a Yoda stack.
+
+Supported genquery subset:
+
+- Columns of collections, data objects (one row per replica), users and
+  groups, resources, access control lists and AVUs of all of these.
+- Column functions ORDER, ORDER_ASC, ORDER_DESC, COUNT, SUM, MIN, MAX and AVG.
+- Conditions =, <>, !=, <, >, <=, >=, like, not like, in, not in and
+  between, combined with AND.
+- The options RETURN_TOTAL_ROW_COUNT, NO_DISTINCT, AUTO_CLOSE and
+  UPPER_CASE_WHERE, and paging through maxRows (of the first batch only),
+  rowOffset and continueInx.
+
+Anything else raises NotImplementedError, rather than silently returning
+wrong results.
+
+Example:
+
+    cat = Catalog('tempZone')
+    cat.add_group('research-test', members=['researcher'])
+    cat.add_data('/tempZone/home/research-test/a.txt', size=42, resources=['irodsResc', 'irodsRescRepl'])
+
+    cb  = Callback(cat, 'researcher')
+    ctx = rule.Context(cb, cb.rei)
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import bisect
+import operator
+import re
+from collections import namedtuple
+
+import irods_types
+
+MAX_SQL_ROWS = 256
+
+# Genquery options (see util.query.Option).
+RETURN_TOTAL_ROW_COUNT = 0x020
+NO_DISTINCT            = 0x040
+AUTO_CLOSE             = 0x100
+UPPER_CASE_WHERE       = 0x200
+
+# Access levels, as in COLL_ACCESS_NAME / DATA_ACCESS_NAME.
+ACCESS_TYPES = {'own':           1200,
+                'modify object': 1120,
+                'read object':   1050}
+
+
+# Catalog {{{
+
+Replica = namedtuple('Replica', ['num', 'resc', 'size', 'checksum', 'status'])
+
+# AVU: id, attribute, value, units.
+Avu = namedtuple('Avu', ['id', 'name', 'value', 'units'])
+
+
+class Coll(object):
+    __slots__ = ('id', 'name', 'parent', 'owner', 'create_time', 'modify_time',
+                 'data', 'avus', 'acl', 'inherit')
+
+
+class Data(object):
+    __slots__ = ('id', 'coll', 'name', 'owner', 'type', 'create_time', 'modify_time',
+                 'replicas', 'avus', 'acl', 'content')
+
+    @property
+    def path(self):
+        return '{}/{}'.format(self.coll.name, self.name)
+
+
+class User(object):
+    __slots__ = ('id', 'name', 'zone', 'type', 'info', 'comment', 'create_time', 'groups', 'avus')
+
+
+class Resource(object):
+    __slots__ = ('id', 'name', 'parent', 'type', 'location', 'avus')
+
+
+class Catalog(object):
+    """In-memory iRODS catalog of a single zone.
+
+    Object ids are unique across all object types, as in iRODS.
+    All timestamps are taken from self.clock (seconds since epoch), which
+    callers may advance as needed.
+    """
+
+    def __init__(self, zone='tempZone', clock=1600000000):
+        self.zone  = zone
+        self.clock = clock
+
+        self.colls     = {}  # name -> Coll
+        self.colls_id  = {}  # id -> Coll
+        self.data_id   = {}  # id -> Data
+        self.users     = {}  # name -> User (including groups)
+        self.users_id  = {}  # id -> User
+        self.resources = {}  # name -> Resource
+
+        self._next_id     = 10000
+        self._coll_names  = []     # sorted collection names, for prefix lookups
+        self._colls_dirty = False
+        self._avu_values  = None   # data object AVU value -> data objects, built when needed
+
+        self.add_user('rods', 'rodsadmin')
+        self.add_group('public')
+        self.add_resource('demoResc')
+
+        for path in ['/', '/' + zone, '/{}/home'.format(zone), '/{}/trash'.format(zone)]:
+            self.add_coll(path)
+
+    def _id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def time(self):
+        """Current catalog time, as formatted in the catalog."""
+        return '{:011d}'.format(self.clock)
+
+    # Users, groups and resources. {{{
+
+    def add_user(self, name, type='rodsuser', groups=()):
+        """Add a user, optionally as member of existing groups."""
+        u             = User()
+        u.id          = self._id()
+        u.name        = name
+        u.zone        = self.zone
+        u.type        = type
+        u.info        = ''
+        u.comment     = ''
+        u.create_time = self.time()
+        u.groups      = set([u.id])  # iRODS users are members of their own group.
+        u.avus        = []
+
+        self.users[name]   = u
+        self.users_id[u.id] = u
+
+        for g in groups:
+            self.add_member(g, name)
+
+        return u
+
+    def add_group(self, name, members=(), avus=()):
+        """Add a group with the given member names (users are created as needed) and (attribute, value) pairs."""
+        g = self.add_user(name, 'rodsgroup')
+        for m in members:
+            if m not in self.users:
+                self.add_user(m)
+            self.add_member(name, m)
+        for a, v in avus:
+            self.add_avu(g.avus, a, v)
+        return g
+
+    def add_member(self, group, user):
+        self.users[user].groups.add(self.users[group].id)
+
+    def add_resource(self, name, parent=None, type='unixfilesystem', location='localhost'):
+        r          = Resource()
+        r.id       = self._id()
+        r.name     = name
+        r.parent   = parent
+        r.type     = type
+        r.location = location
+        r.avus     = []
+
+        self.resources[name] = r
+        return r
+
+    def hierarchy(self, resc):
+        """Get the resource hierarchy string (root;...;leaf) of a resource name."""
+        names = [resc]
+        while self.resources[names[0]].parent is not None:
+            names.insert(0, self.resources[names[0]].parent)
+        return ';'.join(names)
+
+    # }}}
+    # Collections and data objects. {{{
+
+    def add_coll(self, path, owner='rods', acl=None):
+        """Add a collection, and any missing parent collections.
+
+        :param path:  Collection path
+        :param owner: Name of the owner
+        :param acl:   Dict of user/group name -> access name (default: owner has 'own')
+
+        :returns: The (new or existing) collection
+        """
+        if path in self.colls:
+            return self.colls[path]
+
+        parent = path.rsplit('/', 1)[0] or '/'
+        if path != '/':
+            self.add_coll(parent, owner, acl)
+
+        c             = Coll()
+        c.id          = self._id()
+        c.name        = path
+        c.parent      = parent
+        c.owner       = self.users[owner]
+        c.create_time = self.time()
+        c.modify_time = c.create_time
+        c.data        = []
+        c.avus        = []
+        c.acl         = self._acl(acl if acl is not None else {owner: 'own'})
+        c.inherit     = False
+
+        self.colls[path]   = c
+        self.colls_id[c.id] = c
+        self._colls_dirty  = True
+        return c
+
+    def add_data(self, path, size=0, resources=None, checksum=None, owner='rods',
+                 acl=None, avus=(), content=None, type='generic'):
+        """Add a data object with one replica per resource.
+
+        :param path:      Data object path (missing collections are created)
+        :param size:      Size in bytes (of the content, if given)
+        :param resources: Resource names to put replicas on (default: demoResc)
+        :param checksum:  Checksum of all replicas (default: none)
+        :param owner:     Name of the owner
+        :param acl:       Dict of user/group name -> access name (default: that of the collection)
+        :param avus:      (attribute, value) or (attribute, value, units) tuples
+        :param content:   Contents, for msiDataObjRead
+        :param type:      Data type name
+
+        :returns: The new data object
+        """
+        coll_name, name = path.rsplit('/', 1)
+        coll = self.add_coll(coll_name, owner)
+
+        if content is not None:
+            size = len(content)
+
+        d             = Data()
+        d.id          = self._id()
+        d.coll        = coll
+        d.name        = name
+        d.owner       = self.users[owner]
+        d.type        = type
+        d.create_time = self.time()
+        d.modify_time = d.create_time
+        d.replicas    = [Replica(i, r, size, checksum or '', '1')
+                         for i, r in enumerate(resources or ['demoResc'])]
+        d.avus        = []
+        # Objects share the ACL of their collection until one of them is changed.
+        d.acl         = coll.acl if acl is None else self._acl(acl)
+        d.content     = content
+
+        for avu in avus:
+            self.add_avu(d.avus, *avu)
+
+        coll.data.append(d)
+        self.data_id[d.id] = d
+        return d
+
+    def remove_data(self, d):
+        d.coll.data.remove(d)
+        del self.data_id[d.id]
+
+    def remove_coll(self, c):
+        for sub in list(self.subtree(c.name)):
+            for d in list(sub.data):
+                self.remove_data(d)
+            del self.colls[sub.name]
+            del self.colls_id[sub.id]
+        self._colls_dirty = True
+
+    def coll(self, path):
+        return self.colls.get(path)
+
+    def data(self, path):
+        coll_name, name = path.rsplit('/', 1)
+        coll = self.colls.get(coll_name)
+        if coll is not None:
+            for d in coll.data:
+                if d.name == name:
+                    return d
+
+    def obj(self, name, type):
+        """Look up an object by name and imeta-style type (-d, -C, -u, -R)."""
+        type = type.lstrip('-').lower()
+        if type == 'd':
+            return self.data(name)
+        elif type == 'c':
+            return self.coll(name)
+        elif type == 'u':
+            return self.users.get(name)
+        elif type == 'r':
+            return self.resources.get(name)
+        raise NotImplementedError('Object type {}'.format(type))
+
+    def names_with_prefix(self, prefix):
+        """Get collection names starting with a prefix, in sorted order."""
+        if self._colls_dirty:
+            self._coll_names  = sorted(self.colls)
+            self._colls_dirty = False
+        i = bisect.bisect_left(self._coll_names, prefix)
+        while i < len(self._coll_names) and self._coll_names[i].startswith(prefix):
+            yield self._coll_names[i]
+            i += 1
+
+    def subtree(self, path):
+        """Get a collection and all its subcollections."""
+        if path in self.colls:
+            yield self.colls[path]
+        for name in self.names_with_prefix(path.rstrip('/') + '/'):
+            yield self.colls[name]
+
+    # }}}
+    # AVUs and ACLs. {{{
+
+    def add_avu(self, avus, a, v, u=''):
+        avus.append(Avu(self._id(), a, v, u))
+        self.avus_changed()
+
+    def avus_changed(self):
+        """Drop AVU indexes, after AVUs were added, changed or removed."""
+        self._avu_values = None
+
+    def data_with_avu_value(self, value):
+        """Get data objects with an AVU with the given value."""
+        if self._avu_values is None:
+            self._avu_values = {}
+            for d in self.data_id.values():
+                for x in d.avus:
+                    self._avu_values.setdefault(x.value, []).append(d)
+        return [d for d in self._avu_values.get(value, []) if d.id in self.data_id]
+
+    def _acl(self, acl):
+        """Convert a dict of names -> access names into a dict of user ids -> access names."""
+        return {self.users[k].id: v for k, v in acl.items()}
+
+    def set_access(self, obj, user, access):
+        """Set (or with access 'null', remove) the access of a user on an object."""
+        if isinstance(obj, Data) and obj.acl is obj.coll.acl:
+            obj.acl = dict(obj.acl)
+        uid = self.users[user].id
+        if access == 'null':
+            obj.acl.pop(uid, None)
+        else:
+            obj.acl[uid] = access
+
+    def access(self, obj, user):
+        """Get the highest access level of a user (directly or through groups) on an object."""
+        levels = [ACCESS_TYPES.get(obj.acl.get(g), 0) for g in self.users[user].groups]
+        return max(levels + [0])
+
+    # }}}
+    # Genquery. {{{
+
+    def query(self, select, where, options=0, stats=None):
+        """Run a genquery.
+
+        :param select:  Comma-separated select columns, as passed to msiMakeGenQuery
+        :param where:   Conditions, as passed to msiMakeGenQuery
+        :param options: Genquery options
+        :param stats:   Optional dict in which 'scanned' is incremented for every candidate row
+
+        :returns: List of result rows (tuples of strings)
+        """
+        columns    = _parse_select(select)
+        conditions = _parse_where(where)
+        upper      = bool(options & UPPER_CASE_WHERE)
+
+        names    = set(c for _, c in columns) | set(c[0] for c in conditions)
+        families = set(_family(c) for c in names)
+
+        stages = self._plan(families, conditions, upper)
+
+        # Apply each condition as soon as the columns it tests are available.
+        stage_conditions = [[] for _ in stages]
+        for c in conditions:
+            f = _family(c[0])
+            i = next(i for i, (fs, _) in enumerate(stages) if f in fs)
+            stage_conditions[i].append(_predicate(c, upper))
+
+        bindings = [{}]
+        for (_, expand), conds in zip(stages, stage_conditions):
+            bindings = _expand(bindings, expand, conds, stats)
+
+        getters = [_COLUMNS[c][1] for _, c in columns]
+        rows    = (tuple(_str(g(b)) for g in getters) for b in bindings)
+
+        if any(f in _AGGREGATES for f, _ in columns):
+            rows = _aggregate(columns, rows)
+        elif not options & NO_DISTINCT:
+            rows = set(rows)
+
+        return _sort(columns, rows)
+
+    def _plan(self, families, conditions, upper):
+        """Determine the joins for a query: a list of (families, expand function)."""
+        def first(name):
+            for c in conditions:
+                if c[0] == name and not upper:
+                    return c
+
+        stages = []
+
+        if families & set(['data', 'replica', 'meta_data', 'data_access']):
+            stages.append((set(['coll', 'data']),
+                           lambda b: ({'coll': d.coll, 'data': d} for d in self._data_candidates(first))))
+            stages.append((set(['replica', 'resource']),
+                           lambda b: ({'replica': r,
+                                       'resource': self.resources[r.resc],
+                                       'hierarchy': self.hierarchy(r.resc)} for r in b['data'].replicas)))
+            if 'meta_data' in families:
+                stages.append((set(['meta_data']), lambda b: ({'avu': x} for x in b['data'].avus)))
+            if 'meta_coll' in families:
+                stages.append((set(['meta_coll']), lambda b: ({'coll_avu': x} for x in b['coll'].avus)))
+            if 'data_access' in families:
+                stages.append((set(['data_access', 'user']),
+                               lambda b: self._access(b['data'].acl)))
+            elif 'coll_access' in families:
+                stages.append((set(['coll_access', 'user']),
+                               lambda b: self._access(b['coll'].acl)))
+
+        elif families & set(['coll', 'meta_coll', 'coll_access']):
+            stages.append((set(['coll']),
+                           lambda b: ({'coll': c} for c in self._coll_candidates(first))))
+            if 'meta_coll' in families:
+                stages.append((set(['meta_coll']), lambda b: ({'coll_avu': x} for x in b['coll'].avus)))
+            if 'coll_access' in families:
+                stages.append((set(['coll_access', 'user']),
+                               lambda b: self._access(b['coll'].acl)))
+
+        elif families & set(['user', 'user_group', 'meta_user']):
+            stages.append((set(['user']),
+                           lambda b: ({'user': u} for u in self._user_candidates(first))))
+            if 'user_group' in families:
+                stages.append((set(['user_group']),
+                               lambda b: ({'group': self.users_id[g]} for g in b['user'].groups)))
+            if 'meta_user' in families:
+                stages.append((set(['meta_user']), lambda b: ({'avu': x} for x in b['user'].avus)))
+
+        elif families & set(['resource', 'meta_resc']):
+            stages.append((set(['resource']),
+                           lambda b: ({'resource': r} for r in self.resources.values())))
+            if 'meta_resc' in families:
+                stages.append((set(['meta_resc']), lambda b: ({'avu': x} for x in b['resource'].avus)))
+
+        joined = set.union(*[fs for fs, _ in stages]) if stages else set()
+        if not families <= joined:
+            raise NotImplementedError('Unsupported combination of columns: {}'.format(sorted(families)))
+
+        return stages
+
+    def _access(self, acl):
+        """Get ACL entries as row bindings, with the user they apply to."""
+        return ({'access': x, 'user': self.users_id[x[0]]} for x in acl.items())
+
+    def _coll_candidates(self, first):
+        """Get collections possibly matching the conditions, using the name/id indexes where possible."""
+        c = first('COLL_NAME')
+        if c is not None and c[1] in ('=', 'in'):
+            return (self.colls[x] for x in c[2] if x in self.colls)
+        if c is not None and c[1] == 'like' and _prefix(c[2][0]) is not None:
+            return (self.colls[x] for x in list(self.names_with_prefix(_prefix(c[2][0]))))
+
+        c = first('COLL_ID')
+        if c is not None and c[1] in ('=', 'in'):
+            return (self.colls_id[int(x)] for x in c[2] if x.isdigit() and int(x) in self.colls_id)
+
+        c = first('COLL_PARENT_NAME')
+        if c is not None and c[1] == '=':
+            # Children are among the names with the parent as prefix.
+            return (self.colls[x] for x in list(self.names_with_prefix(c[2][0].rstrip('/') + '/')))
+
+        return (self.colls[x] for x in list(self.names_with_prefix('')))
+
+    def _data_candidates(self, first):
+        """Get data objects possibly matching the conditions, using the id/collection indexes where possible."""
+        c = first('DATA_ID')
+        if c is not None and c[1] in ('=', 'in'):
+            return (self.data_id[int(x)] for x in c[2] if x.isdigit() and int(x) in self.data_id)
+
+        c = first('META_DATA_ATTR_VALUE')
+        if c is not None and c[1] in ('=', 'in'):
+            return (d for x in sorted(set(c[2])) for d in self.data_with_avu_value(x))
+
+        return (d for c in list(self._coll_candidates(first)) for d in list(c.data))
+
+    def _user_candidates(self, first):
+        c = first('USER_NAME')
+        if c is not None and c[1] in ('=', 'in'):
+            return (self.users[x] for x in c[2] if x in self.users)
+        return (self.users[x] for x in sorted(self.users))
+
+    # }}}
+
+
+# }}}
+# Genquery evaluation. {{{
+
+# Column name -> (family, getter on a row binding).
+_COLUMNS = {
+    'COLL_ID':                 ('coll', lambda b: b['coll'].id),
+    'COLL_NAME':               ('coll', lambda b: b['coll'].name),
+    'COLL_PARENT_NAME':        ('coll', lambda b: b['coll'].parent),
+    'COLL_OWNER_NAME':         ('coll', lambda b: b['coll'].owner.name),
+    'COLL_OWNER_ZONE':         ('coll', lambda b: b['coll'].owner.zone),
+    'COLL_CREATE_TIME':        ('coll', lambda b: b['coll'].create_time),
+    'COLL_MODIFY_TIME':        ('coll', lambda b: b['coll'].modify_time),
+    'COLL_INHERITANCE':        ('coll', lambda b: '1' if b['coll'].inherit else '0'),
+
+    'DATA_ID':                 ('data', lambda b: b['data'].id),
+    'DATA_COLL_ID':            ('data', lambda b: b['data'].coll.id),
+    'DATA_NAME':               ('data', lambda b: b['data'].name),
+    'DATA_OWNER_NAME':         ('data', lambda b: b['data'].owner.name),
+    'DATA_OWNER_ZONE':         ('data', lambda b: b['data'].owner.zone),
+    'DATA_TYPE_NAME':          ('data', lambda b: b['data'].type),
+    'DATA_CREATE_TIME':        ('data', lambda b: b['data'].create_time),
+    'DATA_MODIFY_TIME':        ('data', lambda b: b['data'].modify_time),
+
+    'DATA_REPL_NUM':           ('replica', lambda b: b['replica'].num),
+    'DATA_SIZE':               ('replica', lambda b: b['replica'].size),
+    'DATA_CHECKSUM':           ('replica', lambda b: b['replica'].checksum),
+    'DATA_REPL_STATUS':        ('replica', lambda b: b['replica'].status),
+    'DATA_RESC_NAME':          ('replica', lambda b: b['hierarchy'].split(';')[0]),
+    'DATA_RESC_HIER':          ('replica', lambda b: b['hierarchy']),
+
+    'META_DATA_ATTR_ID':       ('meta_data', lambda b: b['avu'].id),
+    'META_DATA_ATTR_NAME':     ('meta_data', lambda b: b['avu'].name),
+    'META_DATA_ATTR_VALUE':    ('meta_data', lambda b: b['avu'].value),
+    'META_DATA_ATTR_UNITS':    ('meta_data', lambda b: b['avu'].units),
+
+    'META_COLL_ATTR_ID':       ('meta_coll', lambda b: b['coll_avu'].id),
+    'META_COLL_ATTR_NAME':     ('meta_coll', lambda b: b['coll_avu'].name),
+    'META_COLL_ATTR_VALUE':    ('meta_coll', lambda b: b['coll_avu'].value),
+    'META_COLL_ATTR_UNITS':    ('meta_coll', lambda b: b['coll_avu'].units),
+
+    'DATA_ACCESS_DATA_ID':     ('data_access', lambda b: b['data'].id),
+    'DATA_ACCESS_USER_ID':     ('data_access', lambda b: b['access'][0]),
+    'DATA_ACCESS_NAME':        ('data_access', lambda b: b['access'][1]),
+    'DATA_ACCESS_TYPE':        ('data_access', lambda b: ACCESS_TYPES[b['access'][1]]),
+
+    'COLL_ACCESS_COLL_ID':     ('coll_access', lambda b: b['coll'].id),
+    'COLL_ACCESS_USER_ID':     ('coll_access', lambda b: b['access'][0]),
+    'COLL_ACCESS_NAME':        ('coll_access', lambda b: b['access'][1]),
+    'COLL_ACCESS_TYPE':        ('coll_access', lambda b: ACCESS_TYPES[b['access'][1]]),
+
+    'USER_ID':                 ('user', lambda b: b['user'].id),
+    'USER_NAME':               ('user', lambda b: b['user'].name),
+    'USER_ZONE':               ('user', lambda b: b['user'].zone),
+    'USER_TYPE':               ('user', lambda b: b['user'].type),
+    'USER_INFO':               ('user', lambda b: b['user'].info),
+    'USER_COMMENT':            ('user', lambda b: b['user'].comment),
+    'USER_CREATE_TIME':        ('user', lambda b: b['user'].create_time),
+    'USER_GROUP_ID':           ('user_group', lambda b: b['group'].id),
+    'USER_GROUP_NAME':         ('user_group', lambda b: b['group'].name),
+
+    'META_USER_ATTR_ID':       ('meta_user', lambda b: b['avu'].id),
+    'META_USER_ATTR_NAME':     ('meta_user', lambda b: b['avu'].name),
+    'META_USER_ATTR_VALUE':    ('meta_user', lambda b: b['avu'].value),
+    'META_USER_ATTR_UNITS':    ('meta_user', lambda b: b['avu'].units),
+
+    'RESC_ID':                 ('resource', lambda b: b['resource'].id),
+    'RESC_NAME':               ('resource', lambda b: b['resource'].name),
+    'RESC_PARENT':             ('resource', lambda b: b['resource'].parent or ''),
+    'RESC_TYPE_NAME':          ('resource', lambda b: b['resource'].type),
+    'RESC_LOC':                ('resource', lambda b: b['resource'].location),
+
+    'META_RESC_ATTR_ID':       ('meta_resc', lambda b: b['avu'].id),
+    'META_RESC_ATTR_NAME':     ('meta_resc', lambda b: b['avu'].name),
+    'META_RESC_ATTR_VALUE':    ('meta_resc', lambda b: b['avu'].value),
+    'META_RESC_ATTR_UNITS':    ('meta_resc', lambda b: b['avu'].units),
+}
+
+# Columns compared and sorted as numbers.
+_NUMERIC = set(['COLL_ID', 'DATA_ID', 'DATA_COLL_ID', 'DATA_REPL_NUM', 'DATA_SIZE', 'USER_ID',
+                'USER_GROUP_ID', 'RESC_ID', 'DATA_ACCESS_USER_ID', 'COLL_ACCESS_USER_ID',
+                'DATA_ACCESS_TYPE', 'COLL_ACCESS_TYPE', 'DATA_ACCESS_DATA_ID', 'COLL_ACCESS_COLL_ID'])
+
+_FUNCTIONS  = set(['ORDER', 'ORDER_ASC', 'ORDER_DESC', 'COUNT', 'SUM', 'MIN', 'MAX', 'AVG'])
+_AGGREGATES = set(['COUNT', 'SUM', 'MIN', 'MAX', 'AVG'])
+
+_COMPARISONS = {'=':  operator.eq,
+                '<>': operator.ne,
+                '!=': operator.ne,
+                '<':  operator.lt,
+                '>':  operator.gt,
+                '<=': operator.le,
+                '>=': operator.ge}
+
+
+def _family(column):
+    try:
+        return _COLUMNS[column][0]
+    except KeyError:
+        raise NotImplementedError('Unsupported column: {}'.format(column))
+
+
+def _str(x):
+    return x if isinstance(x, str) else str(x)
+
+
+def _expand(bindings, expand, conditions, stats):
+    """Join each row binding with the results of expand, and filter on conditions."""
+    for b in bindings:
+        for x in expand(b):
+            nb = dict(b)
+            nb.update(x)
+            if stats is not None:
+                stats['scanned'] = stats.get('scanned', 0) + 1
+            if all(c(nb) for c in conditions):
+                yield nb
+
+
+def _parse_select(select):
+    """Parse select columns into (function or None, column) pairs."""
+    columns = []
+    for x in select.split(','):
+        m = re.match(r'^\s*(?:(\w+)\s*\(\s*(\w+)\s*\)|(\w+))\s*$', x)
+        if not m:
+            raise NotImplementedError('Unsupported select column: {}'.format(x))
+        if m.group(3):
+            columns.append((None, m.group(3).upper()))
+        else:
+            f = m.group(1).upper()
+            if f not in _FUNCTIONS:
+                raise NotImplementedError('Unsupported column function: {}'.format(f))
+            columns.append((f, m.group(2).upper()))
+        _family(columns[-1][1])
+    return columns
+
+
+def _parse_where(where):
+    """Parse conditions into (column, operator, [values]) tuples."""
+    literals = []
+
+    def stash(m):
+        literals.append(m.group(1))
+        return '\0{}\0'.format(len(literals) - 1)
+
+    text = re.sub(r"'([^']*)'", stash, where or '').strip()
+    if not text:
+        return []
+
+    conditions = []
+    for part in re.split(r'\s+and\s+', text, flags=re.IGNORECASE):
+        m = re.match(r'^\s*(\w+)\s+(not\s+like|like|not\s+in|in|between|=|<>|!=|<=|>=|<|>)\s*(.*?)\s*$',
+                     part, re.IGNORECASE)
+        if not m or '||' in part:
+            raise NotImplementedError('Unsupported condition: {}'.format(part))
+
+        op     = re.sub(r'\s+', ' ', m.group(2).lower())
+        values = [literals[int(i)] for i in re.findall(r'\0(\d+)\0', m.group(3))]
+        rest   = re.sub(r'\0\d+\0', '', m.group(3))
+        if not values or re.search(r'[^\s(),]', rest):
+            raise NotImplementedError('Unsupported condition: {}'.format(part))
+
+        column = m.group(1).upper()
+        _family(column)
+        conditions.append((column, op, values))
+
+    return conditions
+
+
+def _prefix(pattern):
+    """Get the literal prefix of a like pattern ending in '%', or None."""
+    if pattern.endswith('%') and not re.search(r'[%_]', pattern[:-1]):
+        return pattern[:-1]
+
+
+def _like(pattern):
+    return re.compile('^' + ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c)
+                                    for c in pattern) + '$', re.DOTALL)
+
+
+def _predicate(condition, upper):
+    """Create a test function on row bindings for a parsed condition."""
+    column, op, values = condition
+    get = _COLUMNS[column][1]
+
+    def text(x):
+        x = _str(x)
+        return x.upper() if upper else x
+
+    def key(x):
+        x = text(x)
+        if column in _NUMERIC and x.lstrip('-').isdigit():
+            return int(x)
+        return x
+
+    if op in ('like', 'not like'):
+        regex  = _like(values[0])
+        negate = op == 'not like'
+        return lambda b: (regex.match(text(get(b))) is None) == negate
+
+    values = [key(v) for v in values]
+
+    if op in ('in', 'not in'):
+        values = set(values)
+        negate = op == 'not in'
+        return lambda b: (key(get(b)) in values) != negate
+    if op == 'between':
+        return lambda b: values[0] <= key(get(b)) <= values[1]
+
+    compare, v = _COMPARISONS[op], values[0]
+    return lambda b: compare(key(get(b)), v)
+
+
+def _number(column, x):
+    return int(x) if column in _NUMERIC or x.lstrip('-').isdigit() else x
+
+
+def _aggregate(columns, rows):
+    """Group rows on their non-aggregated columns and compute the aggregates."""
+    groups = {}
+    for row in rows:
+        key = tuple(x for (f, _), x in zip(columns, row) if f not in _AGGREGATES)
+        acc = groups.get(key)
+        if acc is None:
+            acc = groups[key] = [[] for _ in columns]
+        for i, (f, _) in enumerate(columns):
+            if f in _AGGREGATES and row[i] != '':
+                acc[i].append(row[i])
+
+    if not groups and all(f in _AGGREGATES for f, _ in columns):
+        # Aggregates without grouping always produce one row.
+        groups[()] = [[] for _ in columns]
+
+    result = []
+    for key, acc in groups.items():
+        key = iter(key)
+        row = []
+        for (f, c), xs in zip(columns, acc):
+            if f not in _AGGREGATES:
+                row.append(next(key))
+            elif f == 'COUNT':
+                row.append(str(len(xs)))
+            elif not xs:
+                row.append('')
+            elif f == 'SUM':
+                row.append(str(sum(int(x) for x in xs)))
+            elif f == 'AVG':
+                row.append(str(sum(int(x) for x in xs) / len(xs)))
+            else:
+                row.append(_str((min if f == 'MIN' else max)(xs, key=lambda x: _number(c, x))))
+        result.append(tuple(row))
+    return result
+
+
+def _sort(columns, rows):
+    """Sort rows on their ORDER columns, then on all columns (for a deterministic order)."""
+    numeric = [c in _NUMERIC and f not in ('COUNT', 'SUM', 'AVG') or f in ('COUNT', 'SUM', 'AVG')
+               for f, c in columns]
+
+    def key(i):
+        if numeric[i]:
+            return lambda row: int(row[i]) if row[i] else -1
+        return lambda row: row[i]
+
+    keys = [key(i) for i in range(len(columns))]
+    rows = sorted(rows, key=lambda row: tuple(k(row) for k in keys))
+
+    # Python sorts are stable, so sorting on the last ORDER column first
+    # results in rows ordered by all ORDER columns, in the order given.
+    for i in reversed(range(len(columns))):
+        f = columns[i][0]
+        if f in ('ORDER', 'ORDER_ASC', 'ORDER_DESC'):
+            rows.sort(key=keys[i], reverse=f == 'ORDER_DESC')
+    return rows
+
+# }}}
+# Rule engine callback. {{{
+
+
+class Rei(object):
+    """Rule execution info, as passed to rules (see session_vars.get_map)."""
+
+    def __init__(self, user, zone, type='rodsuser'):
+        client = {'user_name': user, 'irods_zone': zone, 'user_type': type}
+        self.session_vars = {'client_user': client,
+                             'proxy_user':  dict(client)}
+
+
+def _ok(*args):
+    return {'status': True, 'code': 0, 'arguments': list(args)}
+
+
+class BaseCallback(object):
+    """Rule engine callback without a catalog: genquery paging, output and registered rules.
+
+    Subclasses provide msiExecGenQuery (via _page) and other microservices.
+    Other rules can be added with register(name, function); the function
+    receives the callback followed by the rule arguments, and may return a
+    list of (output) arguments.
+
+    Counters in self.stats:
+    - queries: executed genqueries
+    - pages:   fetched pages of genquery results
+    - rows:    returned genquery rows
+    - scanned: catalog rows examined while evaluating genqueries
+    - calls:   other microservice / rule calls
+
+    Log lines are collected in self.log, rule output in self.stdout.
+    """
+
+    def __init__(self, rei):
+        self.rei        = rei
+        self.stats      = {}
+        self.log        = []
+        self.stdout     = []
+        self.statements = {}  # continueInx -> remaining rows
+        self.rules      = {}
+
+        self._next_handle = 0
+
+    def register(self, name, function):
+        self.rules[name] = function
+
+    def reset(self):
+        """Reset counters and output."""
+        self.stats.clear()
+        del self.log[:]
+        del self.stdout[:]
+
+    def _count(self, name, n=1):
+        self.stats[name] = self.stats.get(name, 0) + n
+
+    def _handle(self):
+        self._next_handle += 1
+        return self._next_handle
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name not in self.rules:
+            raise RuntimeError('Rule or microservice not available: {}'.format(name))
+
+        def call(*args):
+            self._count('calls')
+            out = self.rules[name](self, *args)
+            return _ok(*(args if out is None else out))
+        return call
+
+    # Genquery. {{{
+
+    def msiMakeGenQuery(self, select, where, gqi):
+        gqi.select  = select
+        gqi.where   = where
+        gqi.maxRows = MAX_SQL_ROWS
+        return _ok(select, where, gqi)
+
+    def msiGetMoreRows(self, gqi, gqo, cti):
+        handle = gqo.continueInx
+        if not handle:
+            return _ok(gqi, irods_types.GenQueryOut(), 0)
+
+        rows = self.statements.pop(handle)
+
+        # Like iRODS, msiGetMoreRows fetches a full batch, whatever maxRows
+        # the caller set (see Query._close).
+        gqi.maxRows = MAX_SQL_ROWS
+        gqo = self._page(gqi, rows, handle)
+        return _ok(gqi, gqo, gqo.continueInx)
+
+    def msiCloseGenQuery(self, gqi, gqo):
+        self.statements.pop(gqo.continueInx, None)
+        return _ok(gqi, gqo)
+
+    def _exec(self, gqi, rows, total):
+        """Return the first page of a query result of the given total amount of rows."""
+        self._count('queries')
+        gqo = self._page(gqi, rows, None)
+        gqo.totalRowCount = total if gqi.options & RETURN_TOTAL_ROW_COUNT else 0
+        return _ok(gqi, gqo)
+
+    def _page(self, gqi, rows, handle):
+        """Return a page of rows, keeping the rest in an open statement unless AUTO_CLOSE is set."""
+        self._count('pages')
+
+        n    = max(0, min(gqi.maxRows, len(rows)))
+        page = rows[:n]
+        self._count('rows', n)
+
+        gqo = irods_types.GenQueryOut()
+        columns = [x.strip() for x in gqi.select.split(',')]
+        gqo.rowCnt    = n
+        gqo.attriCnt  = len(columns)
+        gqo.sqlResult = [irods_types.SqlResult(i, [row[i] for row in page]) for i in range(len(columns))]
+
+        if n < len(rows) and not gqi.options & AUTO_CLOSE:
+            handle = handle or self._handle()
+            self.statements[handle] = rows[n:]
+            gqo.continueInx = handle
+        else:
+            gqo.continueInx = 0
+        return gqo
+
+    # }}}
+    # Output. {{{
+
+    def writeLine(self, target, text):
+        (self.log if target == 'serverLog' else self.stdout).append(text + '\n')
+        return _ok(target, text)
+
+    def writeString(self, target, text):
+        (self.log if target == 'serverLog' else self.stdout).append(text)
+        return _ok(target, text)
+
+    # }}}
+
+
+class Callback(BaseCallback):
+    """Rule engine callback on a Catalog, for a client user (see BaseCallback)."""
+
+    def __init__(self, catalog, user='rods'):
+        u = catalog.users[user]
+        super(Callback, self).__init__(Rei(u.name, u.zone, u.type))
+        self.catalog = catalog
+        self.user    = user
+        self.files   = {}  # open data object handle -> [data object, position]
+
+    def msiExecGenQuery(self, gqi, gqo):
+        rows = self.catalog.query(gqi.select, gqi.where, gqi.options, self.stats)
+        return self._exec(gqi, rows[gqi.rowOffset:], len(rows))
+
+    # Metadata. {{{
+
+    def msiString2KeyValPair(self, s, kvp):
+        self._count('calls')
+        kvp = irods_types.KeyValPair()
+        for x in s.split('%') if s else []:
+            k, v = x.split('=', 1)
+            kvp.key.append(k)
+            kvp.value.append(v)
+        kvp.ssLen = len(kvp.key)
+        return _ok(s, kvp)
+
+    def msiAddKeyVal(self, kvp, k, v):
+        self._count('calls')
+        kvp.key.append(k)
+        kvp.value.append(v)
+        kvp.ssLen = len(kvp.key)
+        return _ok(kvp, k, v)
+
+    def _avus(self, name, type):
+        self._count('calls')
+        obj = self.catalog.obj(name, type)
+        if obj is None:
+            raise RuntimeError('Object does not exist: {}'.format(name))
+        return obj.avus
+
+    def msiAssociateKeyValuePairsToObj(self, kvp, name, type):
+        avus = self._avus(name, type)
+        for k, v in zip(kvp.key, kvp.value):
+            self.catalog.add_avu(avus, k, v)
+        return _ok(kvp, name, type)
+
+    def msiSetKeyValuePairsToObj(self, kvp, name, type):
+        avus = self._avus(name, type)
+        for k, v in zip(kvp.key, kvp.value):
+            avus[:] = [x for x in avus if x.name != k]
+            self.catalog.add_avu(avus, k, v)
+        return _ok(kvp, name, type)
+
+    def msiRemoveKeyValuePairsFromObj(self, kvp, name, type):
+        avus = self._avus(name, type)
+        for k, v in zip(kvp.key, kvp.value):
+            avus[:] = [x for x in avus if (x.name, x.value) != (k, v)]
+        self.catalog.avus_changed()
+        return _ok(kvp, name, type)
+
+    def msi_add_avu(self, type, name, a, v, u):
+        self.catalog.add_avu(self._avus(name, type), a, v, u)
+        return _ok(type, name, a, v, u)
+
+    def msi_rmw_avu(self, type, name, a, v, u):
+        avus = self._avus(name, type)
+        a_, v_, u_ = _like(a), _like(v), _like(u)
+        avus[:] = [x for x in avus
+                   if not (a_.match(x.name) and v_.match(x.value) and (not u or u_.match(x.units)))]
+        self.catalog.avus_changed()
+        return _ok(type, name, a, v, u)
+
+    # }}}
+    # Data objects and collections. {{{
+
+    def _path(self, arg):
+        return arg.split('++++')[0].split('objPath=')[-1]
+
+    def msiDataObjCreate(self, path, options, handle):
+        self._count('calls')
+        d = self.catalog.data(path)
+        if d is None:
+            d = self.catalog.add_data(path, owner=self.user, content='')
+        elif 'forceFlag' not in options:
+            raise RuntimeError('Data object exists: {}'.format(path))
+        d.content  = ''
+        d.replicas = [r._replace(size=0) for r in d.replicas]
+        handle = self._handle()
+        self.files[handle] = [d, 0]
+        return _ok(path, options, handle)
+
+    def msiDataObjOpen(self, options, handle):
+        self._count('calls')
+        d = self.catalog.data(self._path(options))
+        if d is None:
+            raise RuntimeError('Data object does not exist: {}'.format(options))
+        handle = self._handle()
+        self.files[handle] = [d, 0]
+        return _ok(options, handle)
+
+    def msiDataObjRead(self, handle, length, buf):
+        self._count('calls')
+        d, pos = self.files[handle]
+        data = (d.content or '')[pos:pos + int(length)]
+        self.files[handle][1] += len(data)
+        buf = irods_types.BytesBuf()
+        buf.buf = data
+        buf.len = len(data)
+        return _ok(handle, length, buf)
+
+    def msiDataObjWrite(self, handle, data, length):
+        self._count('calls')
+        d = self.files[handle][0]
+        d.content  = (d.content or '') + data
+        d.replicas = [r._replace(size=len(d.content)) for r in d.replicas]
+        return _ok(handle, data, len(data))
+
+    def msiDataObjLseek(self, handle, offset, whence, status):
+        self._count('calls')
+        d = self.files[handle][0]
+        self.files[handle][1] = int(offset) + (len(d.content or '') if whence == 'SEEK_END' else 0)
+        return _ok(handle, offset, whence, 0)
+
+    def msiDataObjClose(self, handle, status):
+        self._count('calls')
+        self.files.pop(handle, None)
+        return _ok(handle, 0)
+
+    def msiDataObjUnlink(self, options, status):
+        self._count('calls')
+        d = self.catalog.data(self._path(options))
+        if d is None:
+            raise RuntimeError('Data object does not exist: {}'.format(options))
+        self.catalog.remove_data(d)
+        return _ok(options, 0)
+
+    def msiDataObjCopy(self, src, dst, options, status):
+        self._count('calls')
+        d = self.catalog.data(src)
+        self.catalog.add_data(dst, size=d.replicas[0].size, resources=[r.resc for r in d.replicas],
+                              owner=self.user, content=d.content)
+        return _ok(src, dst, options, 0)
+
+    def msiDataObjRename(self, src, dst, flag, status):
+        self._count('calls')
+        d = self.catalog.data(src)
+        self.catalog.remove_data(d)
+        coll_name, d.name = dst.rsplit('/', 1)
+        d.coll = self.catalog.add_coll(coll_name, self.user)
+        d.coll.data.append(d)
+        self.catalog.data_id[d.id] = d
+        return _ok(src, dst, flag, 0)
+
+    def msiCollCreate(self, path, flag, status):
+        self._count('calls')
+        self.catalog.add_coll(path, self.user)
+        return _ok(path, flag, 0)
+
+    def msiRmColl(self, path, options, status):
+        self._count('calls')
+        self.catalog.remove_coll(self.catalog.coll(path))
+        return _ok(path, options, 0)
+
+    def msiGetObjType(self, path, type):
+        self._count('calls')
+        if self.catalog.coll(path) is not None:
+            type = '-c'
+        elif self.catalog.data(path) is not None:
+            type = '-d'
+        else:
+            raise RuntimeError('Object does not exist: {}'.format(path))
+        return _ok(path, type)
+
+    def msiGetIcatTime(self, out, format):
+        return _ok(str(self.catalog.clock), format)
+
+    # }}}
+    # Access. {{{
+
+    def msiCheckAccess(self, path, access, result):
+        self._count('calls')
+        obj = self.catalog.coll(path) or self.catalog.data(path)
+        allowed = obj is not None and self.catalog.access(obj, self.user) >= ACCESS_TYPES[access]
+        return _ok(path, access, 1 if allowed else 0)
+
+    def msiSetACL(self, recursive, access, user, path):
+        self._count('calls')
+        access = access.replace('admin:', '')
+        access = {'read': 'read object', 'write': 'modify object'}.get(access, access)
+        objs = [self.catalog.coll(path) or self.catalog.data(path)]
+        if recursive == 'recursive' and isinstance(objs[0], Coll):
+            objs = [x for c in self.catalog.subtree(path) for x in [c] + c.data]
+        for obj in objs:
+            if access in ('inherit', 'noinherit'):
+                if isinstance(obj, Coll):
+                    obj.inherit = access == 'inherit'
+            else:
+                self.catalog.set_access(obj, user.split('#')[0], access)
+        return _ok(recursive, access, user, path)
+
+    def msiSudoObjAclSet(self, recursive, access, user, path, policy_kv):
+        self.msiSetACL('recursive' if recursive in ('1', 'recursive') else 'default', access, user, path)
+        return _ok(recursive, access, user, path, policy_kv)
+
+    # }}}
+
+# }}}
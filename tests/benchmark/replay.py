@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Replay recorded API calls (see util/record.py) against the current ruleset.
+
+A ReplayCallback serves the genquery results and microservice results of a
+recording, so that a slow portal request can be reproduced and profiled
+offline. Queries are matched on their select, conditions and offset, other
+calls on their name and arguments. Paging follows the replayed code, so
+the query, page and row counts show the effect of code changes.
+
+Usage:
+
+    python2 replay.py recording.jsonl [--api api_browse_folder] [--profile]
+
+For every recorded call this prints the API, the status of the replay and
+the counts of the recording and the replay.
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+from collections import defaultdict, deque
+
+import ruleset   # noqa: I100 (sets up the stand-in modules)
+import icat      # noqa: I100
+import irods_types
+
+
+def _arg(x):
+    """Convert a call argument as the recorder does, for matching."""
+    if isinstance(x, (bool, int, long, float, basestring)) or x is None:
+        return x
+    if hasattr(x, 'buf') and hasattr(x, 'len'):
+        return {'buf': ''.join(x.buf[:x.len])}
+    return None
+
+
+def _out(recorded, arg):
+    """Rebuild a recorded output argument."""
+    if isinstance(recorded, dict) and 'buf' in recorded:
+        buf = irods_types.BytesBuf()
+        buf.buf = recorded['buf'] or ''
+        buf.len = len(buf.buf)
+        return buf
+    if recorded is None:
+        return arg
+    return recorded.encode('utf-8') if isinstance(recorded, unicode) else recorded
+
+
+def _key(name, args):
+    # Buffers passed as input are empty and need not match.
+    return name, json.dumps([None if isinstance(x, dict) else x for x in args])
+
+
+def _utf8(row):
+    return [x.encode('utf-8') if isinstance(x, unicode) else x for x in row]
+
+
+class ReplayCallback(icat.BaseCallback):
+    """Rule engine callback serving the results of one recorded API call.
+
+    Calls that were not recorded raise a RuntimeError, like failing
+    microservices do, and are listed in self.missing.
+    """
+
+    def __init__(self, recording):
+        user = recording['user']
+        super(ReplayCallback, self).__init__(icat.Rei(str(user['user_name']), str(user['irods_zone'])))
+        self.missing  = []
+        self._queries = defaultdict(deque)  # (select, where, offset) -> [total, rows]
+        self._calls   = defaultdict(deque)  # (name, arguments) -> call
+
+        statements = {}
+        for call in recording['calls']:
+            if call['msi'] == 'msiExecGenQuery':
+                result = [call['total'], [_utf8(x) for x in call['rows']]]
+                self._queries[(call['select'], call['where'], call['offset'])].append(result)
+                if call['statement']:
+                    statements[call['statement']] = result
+            elif call['msi'] == 'msiGetMoreRows':
+                result = statements.pop(call['statement'], None)
+                if result is not None:
+                    result[1] += [_utf8(x) for x in call['rows']]
+                    if call['next']:
+                        statements[call['next']] = result
+            else:
+                self._calls[_key(call['msi'], call['args'])].append(call)
+
+    def msiExecGenQuery(self, gqi, gqo):
+        key = (gqi.select, gqi.where, gqi.rowOffset)
+        if not self._queries[key]:
+            self.missing.append('query: select {} where {}'.format(gqi.select, gqi.where))
+            raise RuntimeError('Query was not recorded: {}'.format(key))
+
+        total, rows = self._queries[key].popleft()
+        return self._exec(gqi, rows, total)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args):
+            self._count('calls')
+            calls = self._calls[_key(name, [_arg(x) for x in args])]
+            if not calls:
+                self.missing.append('call: {}{}'.format(name, args))
+                raise RuntimeError('Call was not recorded: {}'.format(name))
+
+            c = calls.popleft()
+            if 'error' in c:
+                raise RuntimeError(c['error'])
+            return {'status':    c['status'],
+                    'code':      c['code'],
+                    'arguments': [_out(x, a) for x, a in zip(c['out'], args)]}
+        return call
+
+
+def recorded_counts(recording):
+    """Count the queries, pages and rows of a recording."""
+    counts = {'queries': 0, 'pages': 0, 'rows': 0, 'calls': 0}
+    for c in recording['calls']:
+        if c['msi'] in ('msiExecGenQuery', 'msiGetMoreRows'):
+            counts['queries'] += c['msi'] == 'msiExecGenQuery'
+            counts['pages']   += 1
+            counts['rows']    += len(c['rows'])
+        elif c['msi'] not in ('msiMakeGenQuery', 'msiCloseGenQuery'):
+            counts['calls'] += 1
+    return counts
+
+
+def replay(recording):
+    """Replay a recorded API call.
+
+    :param recording: Recording, as a dict decoded from one line of a recording file
+
+    :returns: Tuple of the callback after the replay and the decoded API result
+    """
+    rules = ruleset.load()
+    try:
+        rule = getattr(rules, recording['api'])
+    except AttributeError:
+        rule = getattr(ruleset.module(recording['module']), recording['api'])
+
+    # Like a new agent, without cached lookups.
+    ruleset.module('util.cache').invalidate()
+
+    cb = ReplayCallback(recording)
+    rule([json.dumps(recording['input'])], cb, cb.rei)
+    return cb, json.loads(''.join(cb.stdout))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded API calls.')
+    parser.add_argument('recording', help='recording file (JSON lines)')
+    parser.add_argument('--api', help='only replay calls of this API')
+    parser.add_argument('--profile', action='store_true', help='print a profile of each replay')
+    args = parser.parse_args()
+
+    with open(args.recording) as f:
+        recordings = [json.loads(line) for line in f if line.strip()]
+
+    ruleset.load()
+
+    for r in recordings:
+        if args.api and r['api'] != args.api:
+            continue
+
+        profile = cProfile.Profile() if args.profile else None
+        t = time.time()
+        if profile:
+            profile.enable()
+        cb, result = replay(r)
+        if profile:
+            profile.disable()
+        t = time.time() - t
+
+        before = recorded_counts(r)
+        print('{} ({}ms recorded, {}ms replayed): {}'.format(r['api'], r['ms'], int(t * 1000), result['status']))
+        for k in ['queries', 'pages', 'rows', 'calls']:
+            print('  {:8} {:6} -> {}'.format(k, before[k], cb.stats.get(k, 0)))
+        for m in cb.missing:
+            print('  missing  {}'.format(m))
+        if profile:
+            pstats.Stats(profile, stream=sys.stdout).sort_stats('cumulative').print_stats(20)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Stand-ins for rule language rules that Python rules call through the callback.
+
+Each rule runs the same catalog queries as its counterpart in the *.r files,
+so that they count towards the callback statistics.
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+
+def _query(callback, select, where):
+    callback._count('queries')
+    callback._count('pages')
+    rows = callback.catalog.query(select, where, 0, callback.stats)
+    callback._count('rows', len(rows))
+    return rows
+
+
+def uuGetBaseGroup(callback, group, base):
+    """Get the research group belonging to a vault group."""
+    return [group, group.replace('vault-', 'research-', 1) if group.startswith('vault-') else group]
+
+
+def uuGroupGetCategory(callback, group, category, subcategory):
+    """Get the category and subcategory of a group."""
+    category, subcategory = '', ''
+    for name, value in _query(callback, 'META_USER_ATTR_NAME, META_USER_ATTR_VALUE',
+                              "USER_GROUP_NAME = '{}' AND META_USER_ATTR_NAME like '%category'".format(group)):
+        if name == 'category':
+            category = value
+        elif name == 'subcategory':
+            subcategory = value
+    return [group, category, subcategory]
+
+
+def uuGroupGetMemberType(callback, group, user, type):
+    """Get the membership type of a user in a group: 'none', 'reader', 'normal' or 'manager'."""
+    name, _, zone = user.partition('#')
+    zone = zone or callback.catalog.zone
+
+    members = [x[0] for x in _query(callback, 'USER_NAME',
+                                    "USER_GROUP_NAME = '{}' AND USER_TYPE <> 'rodsgroup'".format(group))]
+    if name not in members:
+        return [group, user, 'none']
+
+    managers = [x[0] for x in _query(callback, 'META_USER_ATTR_VALUE',
+                                     "USER_GROUP_NAME = '{}' AND META_USER_ATTR_NAME = 'manager'".format(group))]
+    return [group, user, 'manager' if '{}#{}'.format(name, zone) in managers else 'normal']
+
+
+RULES = [uuGetBaseGroup,
+         uuGroupGetCategory,
+         uuGroupGetMemberType]
+
+
+def register(callback):
+    """Register all stand-in rules with a callback."""
+    for f in RULES:
+        callback.register(f.__name__, f)
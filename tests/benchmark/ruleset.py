@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Loading the ruleset outside of iRODS, with the stand-in modules in fake/."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import imp
+import importlib
+import os
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Stand-ins for the modules the iRODS Python rule engine provides.
+if os.path.join(here, 'fake') not in sys.path:
+    sys.path[:0] = [os.path.join(here, 'fake'), here]
+
+
+def load():
+    """Load the ruleset package, as iRODS does."""
+    if 'rules_uu' in sys.modules:
+        return sys.modules['rules_uu']
+    return imp.load_module('rules_uu', None, os.path.join(here, '..', '..'), ('', '', imp.PKG_DIRECTORY))
+
+
+def module(name):
+    """Get a ruleset module by name, including modules that are only loaded when enabled (e.g. 'intake')."""
+    load()
+    return importlib.import_module('rules_uu.' + name)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of portal API rules."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import base64
+import json
+import pstats
+
+import conftest
+
+GROUP  = '/tempZone/home/research-category-0-0'
+FOLDER = GROUP + '/folder-1'
+INTAKE = '/tempZone/home/grp-intake-initial'
+
+
+def test_browse_folder(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_browse_folder, {'coll': FOLDER})
+    assert len(data['items']) == 10
+
+
+def test_browse_folder_deep_page(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_browse_folder, {'coll': FOLDER, 'offset': 10, 'limit': 10})
+    assert len(data['items']) == 10
+
+
+def call(catalog, rule, params):
+    """Call an API rule once as researcher, and return its result."""
+    cb = conftest.callback(catalog)
+    rule([json.dumps(params)], cb, cb.rei)
+    return json.loads(''.join(cb.stdout))
+
+
+def test_browse_folder_cursor(rules, catalog, fresh_catalog):
+    """Paging with a cursor returns the same items as paging with an offset, whatever the names."""
+    catalog = fresh_catalog()
+    for name in ['B.txt', 'a.txt', 'c.txt', "it's.txt", "it's.txt.bak", 'z.txt']:
+        catalog.add_data(GROUP + '/mixed/' + name, owner='researcher')
+    catalog.add_coll(GROUP + '/mixed/Sub', owner='researcher')
+
+    items = call(catalog, rules.api_browse_folder, {'coll': GROUP + '/mixed'})['data']['items']
+    assert len(items) == 7
+
+    for limit in (1, 2, 3):
+        paged, cursor = [], ''
+        while cursor is not None:
+            result = call(catalog, rules.api_browse_folder, {'coll': GROUP + '/mixed', 'limit': limit, 'cursor': cursor})
+            assert result['status'] == 'ok', result
+            paged += result['data']['items']
+            cursor = result['data']['cursor']
+        assert paged == items
+
+
+def test_browse_folder_cursor_invalid(rules, catalog):
+    unquotable = base64.urlsafe_b64encode(json.dumps(['DATA_NAME', "x' or DATA_NAME like '%", 0]))
+    for cursor in ['x', '2:', 5, '1:' + unquotable, '0:' + unquotable]:
+        result = call(catalog, rules.api_browse_folder, {'coll': FOLDER, 'cursor': cursor})
+        assert result['status'] == 'error_badrequest', cursor
+
+
+def test_browse_folder_sorted(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_browse_folder,
+               {'coll': FOLDER, 'sort_on': 'modified', 'sort_order': 'desc'})
+    assert len(data['items']) == 10
+
+
+def test_search_filename(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_search, {'search_string': 'file-1', 'search_type': 'filename'})
+    assert data['total'] > 0
+
+
+def test_search_folder(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_search, {'search_string': 'folder-1', 'search_type': 'folder'})
+    assert data['total'] > 0
+
+
+def test_meta_form_load(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_meta_form_load, {'coll': GROUP + '/folder-0'})
+    assert data['metadata'] is not None
+
+
+def test_meta_form_load_warm(api, rules, module, catalog):
+    """Load the metadata form with the group category and schemas cached by an earlier call (see util/cache.py)."""
+    cb = conftest.callback(catalog)
+    rules.api_meta_form_load([json.dumps({'coll': GROUP + '/folder-0'})], cb, cb.rei)
+
+    data = api(catalog, 'researcher', rules.api_meta_form_load, {'coll': GROUP + '/folder-0'}, warm=True)
+    assert data['metadata'] is not None
+    assert module('util.cache').stats()['schema']['hits'] >= 2
+
+
+def test_meta_form_load_without_metadata(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_meta_form_load, {'coll': FOLDER})
+    assert data['metadata'] is None
+
+
+def test_revisions_list(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_revisions_list, {'path': FOLDER + '/file-1.txt'})
+    assert len(data['revisions']) > 0
+
+
+def test_browse_folder_profiled(api, rules, module, catalog, monkeypatch, tmpdir):
+    """Browse with profiling enabled for the API: every call writes a profile."""
+    config = module('util.config').config
+    monkeypatch.setitem(config._items, 'profile_dir', str(tmpdir))
+    monkeypatch.setitem(config._items, 'profile_apis', ['api_browse_folder'])
+
+    data = api(catalog, 'researcher', rules.api_browse_folder, {'coll': FOLDER})
+    assert len(data['items']) == 10
+
+    profiles = tmpdir.listdir()
+    assert profiles and all(p.basename.startswith('api_browse_folder-') for p in profiles)
+    assert pstats.Stats(str(profiles[0])).total_calls > 0
+
+
+# The API calls the portal makes to render a research folder page.
+PAGE = [{'fn': 'api_research_collection_details', 'args': {'path': FOLDER}},
+        {'fn': 'api_browse_folder',               'args': {'coll': FOLDER}},
+        {'fn': 'api_folder_get_locks',            'args': {'coll': FOLDER}},
+        {'fn': 'api_research_system_metadata',    'args': {'coll': FOLDER}}]
+
+
+def test_batch_page(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_batch, {'calls': PAGE})
+    assert [x['status'] for x in data] == ['ok'] * len(PAGE)
+    assert len(data[1]['data']['items']) == 10
+
+
+def test_batch_query_stats(rules, module, catalog, monkeypatch):
+    """Each call in a batch reports its own queries, and the batch the total."""
+    monkeypatch.setitem(module('util.config').config._items, 'environment', 'development')
+    calls = [{'fn': 'api_browse_folder', 'args': {'coll': FOLDER}},
+             {'fn': 'api_folder_get_locks', 'args': {'coll': FOLDER}}]
+
+    single = [call(catalog, getattr(rules, c['fn']), c['args'])['debug_info']['queries']['queries']
+              for c in calls]
+    batch  = call(catalog, rules.api_batch, {'calls': calls})
+    assert [x['debug_info']['queries']['queries'] for x in batch['data']] == single
+    assert batch['debug_info']['queries']['queries'] == sum(single)
+
+
+def test_batch_unknown_api(api, rules, catalog):
+    data = api(catalog, 'researcher', rules.api_batch,
+               {'calls': [{'fn': 'api_batch', 'args': {'calls': []}}, {'fn': 'rule_revisions_clean_up'}] + PAGE[1:2]})
+    assert [x['status'] for x in data] == ['error_badrequest', 'error_badrequest', 'ok']
+
+
+def test_streamed_debug_info(module, catalog, fresh_catalog, monkeypatch):
+    """Statistics of a streamed result include the queries made while streaming, and follow the data."""
+    monkeypatch.setitem(module('util.config').config._items, 'environment', 'development')
+    intake = module('intake')
+
+    catalog = fresh_catalog()
+    cb = conftest.callback(catalog)
+    intake.api_intake_scan_for_datasets([json.dumps({'coll': INTAKE})], cb, cb.rei)
+
+    cb = conftest.callback(catalog)
+    intake.api_intake_list_datasets([json.dumps({'coll': INTAKE})], cb, cb.rei)
+    out    = ''.join(cb.stdout)
+    result = json.loads(out)
+    assert len(result['data']) > 1
+    assert out.index('"debug_info"') > out.index('"data"')
+    assert result['debug_info']['queries']['queries'] == cb.stats['queries']
+
+
+def test_group_data(api, rules, module, catalog):
+    """Streamed result, which should be the same as the list of groups."""
+    data = api(catalog, 'rods', rules.api_group_data, {})
+
+    cb = conftest.callback(catalog, 'rods')
+    groups = module('group').getGroupData(module('util.rule').Context(cb, cb.rei))
+    assert data == json.loads(json.dumps(groups))
+
+
+def test_group_data_filtered(api, rules, catalog):
+    data = api(catalog, 'rods', rules.api_group_data_filtered, {'username': 'researcher', 'zone_name': 'tempZone'})
+    assert data and all('researcher#tempZone' in g['members'] + g['read'] for g in data)
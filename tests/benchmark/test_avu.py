@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of metadata writes, one AVU per msi call or several at once."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import pytest
+
+import conftest
+
+FOLDER = '/tempZone/home/research-category-0-0/folder-1'
+
+AVUS = [('wave', '20w'), ('experiment_type', 'echo'), ('pseudocode', 'B00001'), ('version', 'Raw'),
+        ('directory', FOLDER), ('dataset_id', '20w\techo\tB00001\tRaw\t' + FOLDER)]
+
+
+@pytest.fixture
+def write(benchmark, module, catalog, fresh_catalog):
+    """Benchmark a function writing metadata on FOLDER, and return the AVUs and calls of the last round."""
+    rule = module('util.rule')
+    result = []
+
+    def write(f):
+        def setup():
+            catalog = fresh_catalog()
+            cb = conftest.callback(catalog)
+            return (rule.Context(cb, cb.rei), catalog), {}
+
+        def call(ctx, catalog):
+            f(ctx)
+            result[:] = [catalog, ctx.callback]
+
+        benchmark.pedantic(call, setup=setup, rounds=5)
+        catalog, cb = result
+        benchmark.extra_info['calls'] = cb.stats.get('calls', 0)
+        return [(x.name, x.value) for x in catalog.obj(FOLDER, '-C').avus], cb.stats.get('calls', 0)
+
+    return write
+
+
+@pytest.mark.benchmark(group='avu')
+def test_set_on_coll(write, module, catalog):
+    avu = module('util.avu')
+    avus, calls = write(lambda ctx: [avu.set_on_coll(ctx, FOLDER, a, v) for a, v in AVUS])
+    assert avus == AVUS
+    # One msiString2KeyValPair and one msiSetKeyValuePairsToObj per AVU.
+    assert calls == 2 * len(AVUS)
+
+
+@pytest.mark.benchmark(group='avu')
+def test_set_many(write, module, catalog):
+    avu = module('util.avu')
+    avus, calls = write(lambda ctx: avu.set_many(ctx, FOLDER, '-C', AVUS))
+    assert avus == AVUS
+    # One msiAddKeyVal per AVU, and a single msiSetKeyValuePairsToObj.
+    assert calls == len(AVUS) + 1
+
+
+def test_associate_many_repeated(module, catalog, fresh_catalog):
+    """Values of a repeated attribute are all associated."""
+    rule = module('util.rule')
+    avu  = module('util.avu')
+
+    cb  = conftest.callback(fresh_catalog())
+    ctx = rule.Context(cb, cb.rei)
+    avu.associate_many(ctx, FOLDER, '-C', [('a', '1'), ('b', '2'), ('a', '3')])
+    assert sorted((x.a, x.v) for x in avu.of_coll(ctx, FOLDER)) == [('a', '1'), ('a', '3'), ('b', '2')]
+    # Three msiAddKeyVal, and an msiAssociateKeyValuePairsToObj per key-value pair.
+    assert cb.stats['calls'] == 5
+
+    avu.remove_many(ctx, FOLDER, '-C', {'a': '1', 'b': '2'})
+    assert [(x.a, x.v) for x in avu.of_coll(ctx, FOLDER)] == [('a', '3')]
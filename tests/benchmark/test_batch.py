@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of batch rules, which modify the catalog and therefore get a new one every round."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import json
+
+import conftest
+
+INTAKE = '/tempZone/home/grp-intake-initial'
+
+
+def test_revisions_clean_up(run, rules, catalog, fresh_catalog):
+    cb, _ = run(catalog, 'rods', rules.rule_revisions_clean_up, '1', '0', '', fresh=fresh_catalog, rounds=3)
+    assert len(cb.catalog.data_id) < len(catalog.data_id)
+
+
+def test_monthly_storage_statistics(run, rules, catalog, fresh_catalog):
+    cb, _ = run(catalog, 'rods', rules.rule_resource_store_monthly_storage_statistics,
+                fresh=fresh_catalog, rounds=3)
+    assert not cb.statements
+
+
+def test_intake_scan(api, module, catalog, fresh_catalog):
+    data = api(catalog, 'researcher', module('intake').api_intake_scan_for_datasets, {'coll': INTAKE},
+               fresh=fresh_catalog, rounds=3)
+    assert data['proc_status'] == 'OK'
+
+
+def test_revisions_clean_up_metrics(rules, module, catalog, fresh_catalog, monkeypatch, tmpdir):
+    """Revision clean up with metrics written to a local file."""
+    path = str(tmpdir.join('metrics.jsonl'))
+    monkeypatch.setitem(module('util.config').config._items, 'metrics_file', path)
+
+    cb = conftest.callback(fresh_catalog(), 'rods')
+    rules.rule_revisions_clean_up(['1', '0', ''], cb, cb.rei)
+
+    with open(path) as f:
+        events = [json.loads(line) for line in f]
+    assert [e['event'] for e in events] == ['phase', 'metrics', 'job']
+    phase, stats, job = events
+    assert phase['job'] == job['job'] == 'revisions_clean_up'
+    assert phase['items'] == job['items'] > 0
+    assert job['status'] == 'ok' and job['errors'] == 0
+    assert stats['counters']['revisions_removed'] == len(catalog.data_id) - len(cb.catalog.data_id)
+
+
+def test_revisions_clean_up_failed_metrics(rules, module, catalog, fresh_catalog, monkeypatch, tmpdir):
+    """A clean up that stops on a revision that could not be removed is reported as failed."""
+    path = str(tmpdir.join('metrics.jsonl'))
+    monkeypatch.setitem(module('util.config').config._items, 'metrics_file', path)
+    monkeypatch.setattr(module('revisions'), 'revision_remove', lambda ctx, revision_id: False)
+
+    cb = conftest.callback(fresh_catalog(), 'rods')
+    rules.rule_revisions_clean_up(['1', '0', ''], cb, cb.rei)
+
+    with open(path) as f:
+        events = [json.loads(line) for line in f]
+    phase, job = events[0], events[-1]
+    assert phase['status'] == job['status'] == 'error'
+    assert job['errors'] == 1
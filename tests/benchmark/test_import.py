@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of loading the ruleset, as every agent does on startup."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Dependencies that only some rules need.
+DEPENDENCIES = ['jinja2', 'jsonschema', 'requests', 'xmltodict']
+
+SCRIPT = '''
+import sys
+sys.path[:0] = [{here!r}]
+import ruleset
+rules = ruleset.load()
+{extra}
+print(' '.join(m for m in {dependencies!r} if m in sys.modules))
+'''
+
+
+def load(extra=''):
+    """Load the ruleset in a new interpreter, and get the optional dependencies that were imported."""
+    script = SCRIPT.format(here=os.path.dirname(os.path.abspath(__file__)), extra=extra, dependencies=DEPENDENCIES)
+    return subprocess.check_output([sys.executable, '-c', script]).split()
+
+
+@pytest.mark.benchmark(group='import')
+def test_load(benchmark):
+    """Load the ruleset: modules are imported when their rules are first called."""
+    assert benchmark.pedantic(load, rounds=5) == []
+
+
+@pytest.mark.benchmark(group='import')
+def test_load_all(benchmark):
+    """Load the ruleset and import all modules, as before modules were imported lazily."""
+    assert benchmark.pedantic(load, args=('rules._import_all()',), rounds=5) == DEPENDENCIES
+
+
+def test_import_api():
+    """Importing the module of an API (see api_batch) replaces the stubs of its rules only."""
+    out = load('print(rules.api_browse_folder.__module__)\n'
+               'rules._import_api("api_browse_folder")\n'
+               'print(rules.api_browse_folder.__module__)\n'
+               'print(rules.api_vault_submit.__module__)\n')
+    assert out == ['rules_uu', 'rules_uu.util.rule', 'rules_uu']
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of JSON encoding of large API results, and decoding of large schemas and metadata."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import json
+import os
+from collections import OrderedDict
+
+import pytest
+
+SCHEMAS = os.path.join(os.path.dirname(__file__), '..', '..', 'schemas')
+
+
+def browse_result(n=1000):
+    """An api_browse_folder result with n items, some with non-ASCII names."""
+    return {'total': n,
+            'items': [OrderedDict([('name', 'file-{}-caf\xc3\xa9.txt'.format(i) if i % 10 == 0 else 'file-{}.txt'.format(i)),
+                                   ('type', 'data'),
+                                   ('size', 1024 * i),
+                                   ('create_time', 1612345678 + i),
+                                   ('modify_time', 1612345678 + i)]) for i in range(n)]}
+
+
+def group_result(n=200, members=20):
+    """An api_group_data result with n groups of some members each."""
+    return [{'name': 'research-group-{}'.format(i),
+             'category': u'catégorie',
+             'subcategory': 'sub-{}'.format(i % 5),
+             'members': {'user-{}@uu.nl'.format(j): 'normal' for j in range(members)}} for i in range(n)]
+
+
+RESULTS = {'browse': browse_result, 'group': group_result}
+
+
+def _fold(x, **alg):
+    """The previous generic fold over JSON structures, used by the previous encoder and decoder."""
+    f = alg.get(type(x).__name__, lambda y: y)
+    if type(x) in [dict, OrderedDict]:
+        return f(OrderedDict([(k, _fold(v, **alg)) for k, v in x.items()]))
+    elif type(x) is list:
+        return f([_fold(v, **alg) for v in x])
+    else:
+        return f(x)
+
+
+def legacy_dump(data):
+    """The previous API encoder: copy all strings to unicode, then dump with indentation."""
+    data = _fold(data,
+                 str=lambda x: x.decode('utf-8'),
+                 OrderedDict=lambda x: OrderedDict([(k.decode('utf-8'), v) for k, v in x.items()]),
+                 dict=lambda x: OrderedDict([(k.decode('utf-8'), v) for k, v in x.items()]))
+    return json.dumps(data, ensure_ascii=False, encoding='utf-8', indent=4).encode('utf-8')
+
+
+def legacy_parse(text):
+    """The previous decoder: parse, then copy all strings to UTF-8 in a second pass."""
+    return _fold(json.loads(text, object_pairs_hook=OrderedDict),
+                 unicode=lambda x: x.encode('utf-8'),
+                 OrderedDict=lambda x: OrderedDict([(k.encode('utf-8'), v) for k, v in x.items()]))
+
+
+def schema(name):
+    with open(os.path.join(SCHEMAS, name)) as f:
+        return f.read()
+
+
+def metadata(n=200):
+    """A large yoda-metadata.json, with n creators and keywords."""
+    return json.dumps(OrderedDict([
+        ('links', [{'rel': 'describedby', 'href': 'https://yoda.uu.nl/schemas/default-1/metadata.json'}]),
+        ('Title', u'Metingen van de waterkwaliteit in het Utrechtse rivierengebied (1990\u20132020)'),
+        ('Description', u'Beschrijving met tekens als \xe9, \xeb en \u2013. ' * 50),
+        ('Tag', ['tag-{}'.format(i) for i in range(n)]),
+        ('Creator', [OrderedDict([('Name', OrderedDict([('Given_Name', u'J\xe9r\xf4me'), ('Family_Name', 'Smit-{}'.format(i))])),
+                                  ('Affiliation', ['Utrecht University', 'Faculty of Geosciences']),
+                                  ('Person_Identifier', [OrderedDict([('Name_Identifier_Scheme', 'ORCID'),
+                                                                      ('Name_Identifier', '0000-0002-1825-{:04d}'.format(i))])])])
+                     for i in range(n)]),
+        ('Related_Datapackage', [OrderedDict([('Relation_Type', 'IsSupplementTo'), ('Title', 'Package {}'.format(i)),
+                                              ('Persistent_Identifier', OrderedDict([('Identifier_Scheme', 'DOI'),
+                                                                                     ('Identifier', '10.1234/{}'.format(i))]))])
+                                 for i in range(n)])]), indent=4)
+
+
+DOCUMENTS = {'datarequest': lambda: schema('../datarequest/schemas/youth-0/datarequest/schema.json'),
+             'hptlab-0': lambda: schema('hptlab-0/metadata.json'),
+             'teclab-0': lambda: schema('teclab-0/metadata.json'),
+             'uischema': lambda: schema('teclab-0/uischema.json'),
+             'metadata': metadata}
+
+
+@pytest.fixture(scope='module')
+def jsonutil(module):
+    return module('util.jsonutil')
+
+
+@pytest.mark.parametrize('result', sorted(RESULTS))
+@pytest.mark.benchmark(group='json dump')
+def test_dump_legacy(benchmark, jsonutil, result):
+    data = RESULTS[result]()
+    out = benchmark(legacy_dump, data)
+    assert json.loads(out) == json.loads(jsonutil.dump(data))
+
+
+@pytest.mark.parametrize('result', sorted(RESULTS))
+@pytest.mark.benchmark(group='json dump')
+def test_dump(benchmark, jsonutil, result):
+    benchmark(jsonutil.dump, RESULTS[result]())
+
+
+@pytest.mark.parametrize('result', sorted(RESULTS))
+@pytest.mark.benchmark(group='json dump')
+def test_dump_compact(benchmark, jsonutil, result):
+    data = RESULTS[result]()
+    out = benchmark(jsonutil.dump_compact, data)
+    assert json.loads(out) == json.loads(jsonutil.dump(data))
+    assert len(out) < len(jsonutil.dump(data))
+
+
+@pytest.mark.parametrize('document', sorted(DOCUMENTS))
+@pytest.mark.benchmark(group='json parse')
+def test_parse_legacy(benchmark, jsonutil, document):
+    text = DOCUMENTS[document]()
+    assert benchmark(legacy_parse, text) == jsonutil.parse(text)
+
+
+@pytest.mark.parametrize('document', sorted(DOCUMENTS))
+@pytest.mark.benchmark(group='json parse')
+def test_parse(benchmark, jsonutil, document):
+    data = benchmark(jsonutil.parse, DOCUMENTS[document]())
+
+    def strings(x):
+        if isinstance(x, dict):
+            return [k for k in x] + [s for v in x.values() for s in strings(v)]
+        elif isinstance(x, list):
+            return [s for v in x for s in strings(v)]
+        return [x] if isinstance(x, basestring) else []
+    assert type(data) is OrderedDict
+    assert all(type(s) is str for s in strings(data))
+
+
+@pytest.mark.parametrize('result', sorted(RESULTS))
+@pytest.mark.benchmark(group='json dump')
+def test_dump_stream(benchmark, jsonutil, result):
+    """Streamed encoding of a result with its list as a generator, written in pieces."""
+    data = RESULTS[result]()
+
+    def stream():
+        streamed = dict(data, items=(x for x in data['items'])) if type(data) is dict else (x for x in data)
+        return ''.join(jsonutil.dump_stream({'status': 'ok', 'data': streamed}))
+
+    out = benchmark(stream)
+    assert out == jsonutil.dump_compact({'status': 'ok', 'data': data})
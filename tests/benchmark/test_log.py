@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of logging within a rule."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import conftest
+
+LINES = 250
+
+
+def test_write(benchmark, module, catalog):
+    """Log many lines from a rule: lines are buffered and written in a few writeLine calls."""
+    rule = module('util.rule')
+    log  = module('util.log')
+
+    @rule.make()
+    def rule_log(ctx):
+        for i in range(LINES):
+            log.write(ctx, 'line {} of {}', i, LINES)
+
+    def setup():
+        return (conftest.callback(catalog),), {}
+
+    result = []
+
+    def call(cb):
+        rule_log([], cb, cb.rei)
+        result[:] = [cb]
+
+    benchmark.pedantic(call, setup=setup, rounds=20)
+    cb, = result
+    lines = ''.join(cb.log).splitlines()
+    assert len(lines) == LINES
+    assert lines[0] == '{researcher#tempZone} rule_log: line 0 of 250'
+    assert len(cb.log) <= LINES // rule.Context.LOG_BUFFER_LINES + 1
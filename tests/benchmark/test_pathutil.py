@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of path classification, which policies do for every operation."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import re
+
+import pytest
+
+EDGE_CASES = ['', '/', 'x', '//', '/tempZone', '/tempZone/', '/tempZone/yoda/x', '/tempZone/home',
+              '/tempZone/home/', '/tempZone/home//x', '/tempZone/home/rods', '/tempZone/home/vault-',
+              '/tempZone/home/vault-x', '/tempZone/home/vault-x/', '/tempZone/home/vault-x//',
+              '/tempZone/home/vault-x/y/z', '/tempZone/home/research-x/y/z', '/tempZone/home/Research-x/y',
+              '/tempZone/home/datamanager-x/y', '/tempZone/home/grp-intake-x/y', '/tempZone/home/grp-x/y',
+              '/tempZone/home/datarequests-x/y', '/tempZone/home/datarequest-x/y', '/tempZone/trash/home/research-x']
+
+
+def legacy_info(path, Space):
+    """The previous pathutil.info: up to seven regexes in sequence, and a new namedtuple type per call."""
+    def f(x):
+        return '' if x is None else x
+
+    def g(m, i):
+        return '' if i > len(m.groups()) else f(m.group(i))
+
+    def result(s, m):
+        return (s, g(m, 1), g(m, 2), g(m, 3))
+
+    def test(r, space):
+        m = re.match(r, path)
+        return m and result(space, m)
+
+    from collections import namedtuple
+
+    return (namedtuple('PathInfo', 'space zone group subpath'.split())
+            (*test('^/([^/]+)/home/(vault-[^/]+)(?:/(.+))?$',        Space.VAULT)
+            or test('^/([^/]+)/home/(research-[^/]+)(?:/(.+))?$',    Space.RESEARCH)
+            or test('^/([^/]+)/home/(datamanager-[^/]+)(?:/(.+))?$', Space.DATAMANAGER)
+            or test('^/([^/]+)/home/(grp-intake-[^/]+)(?:/(.+))?$',  Space.INTAKE)
+            or test('^/([^/]+)/home/(datarequests-[^/]+)(?:/(.+))?$', Space.DATAREQUEST)
+            or test('^/([^/]+)/home/([^/]+)(?:/(.+))?$',             Space.OTHER)
+            or test('^/([^/]+)()(?:/(.+))?$',                        Space.OTHER)
+            or (Space.OTHER, '', '', '')))
+
+
+def workload(catalog, n=5000, distinct=200):
+    """Paths as classified by policies: a limited set of collections and data objects, over and over."""
+    paths = sorted(catalog.colls) + sorted(d.path for d in catalog.data_id.values())
+    paths = paths[::max(1, len(paths) // distinct)]
+    return [paths[(i * 7) % len(paths)] for i in range(n)]
+
+
+@pytest.fixture(scope='module')
+def pathutil(module):
+    return module('util.pathutil')
+
+
+def test_edge_cases(pathutil):
+    for path in EDGE_CASES:
+        assert pathutil.info(path) == legacy_info(path, pathutil.Space), path
+        assert type(pathutil.info(path)) is pathutil.PathInfo
+
+
+@pytest.mark.benchmark(group='pathutil')
+def test_info_legacy(benchmark, pathutil, catalog):
+    paths = workload(catalog)
+    benchmark(lambda: [legacy_info(x, pathutil.Space) for x in paths])
+
+
+@pytest.mark.benchmark(group='pathutil')
+def test_info(benchmark, pathutil, catalog):
+    """Classify paths without the memoized results."""
+    paths = workload(catalog)
+
+    assert benchmark(lambda: [pathutil._info(x) for x in paths]) == [legacy_info(x, pathutil.Space) for x in paths]
+
+
+@pytest.mark.benchmark(group='pathutil')
+def test_info_memoized(benchmark, pathutil, catalog):
+    paths = workload(catalog)
+    assert benchmark(lambda: [pathutil.info(x) for x in paths]) == [legacy_info(x, pathutil.Space) for x in paths]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of policy checks, which run for every matching operation in the zone."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import conftest
+
+FOLDER = '/tempZone/home/research-category-0-0/folder-1'
+INTAKE = '/tempZone/home/grp-intake-initial/10w_pci/B00000'
+
+
+def test_data_open_for_write(run, rules, catalog):
+    run(catalog, 'researcher', rules.py_acPreprocForDataObjOpen, rounds=20,
+        session_vars={'data_object': {'write_flag': 1, 'object_path': FOLDER + '/file-1.txt'}})
+
+
+def test_data_put(run, rules, catalog):
+    run(catalog, 'researcher', rules.py_acPostProcForPut, rounds=20,
+        session_vars={'data_object': {'object_path': FOLDER + '/file-1.txt'}})
+
+
+def test_coll_create(run, rules, catalog):
+    run(catalog, 'researcher', rules.py_acPreprocForCollCreate, rounds=20,
+        session_vars={'collection': {'name': FOLDER + '/new'}})
+
+
+def test_coll_create_intake(run, rules, catalog):
+    run(catalog, 'researcher', rules.py_acPreprocForCollCreate, rounds=20,
+        session_vars={'collection': {'name': INTAKE + '/new'}})
+
+
+def test_metadata_modify(run, rules, catalog):
+    run(catalog, 'researcher', rules.py_acPreProcForModifyAVUMetadata,
+        'set', '-C', FOLDER, 'Title', 'Benchmark', 'usr_0_s', rounds=20)
+
+
+def test_metadata_modify_post_invalidates_cache(rules, module, catalog):
+    """Changing an AVU of a group drops cached lookups of the group (see util/cache.py)."""
+    schema = module('schema')
+    group  = 'research-category-0-0'
+
+    cb = conftest.callback(catalog)
+    assert schema.get_group_category(cb, 'tempZone', group) == 'default'
+    assert len(schema.get_group_category.cache) == 1
+
+    rules.py_acPostProcForModifyAVUMetadata(['set', '-u', group, 'category', 'other', ''], cb, cb.rei)
+    assert len(schema.get_group_category.cache) == 0
+
+
+def test_client_type_memoized(module, catalog):
+    """The client user and its type are looked up once per invocation, also when the query cache is dropped."""
+    rule = module('util.rule')
+    user = module('util.user')
+
+    @rule.make()
+    def rule_is_admin(ctx):
+        for _ in range(3):
+            assert not user.is_admin(ctx, user.user_and_zone(ctx))
+            ctx.query_cache.invalidate()
+
+    cb = conftest.callback(catalog)
+    rule_is_admin([], cb, cb.rei)
+    assert cb.stats['queries'] == 1
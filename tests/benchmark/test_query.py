@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of query primitives on large result sets."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import pytest
+
+import conftest
+
+HOME = '/tempZone/home'
+
+
+def query(benchmark, module, catalog, f):
+    """Benchmark f(ctx, Query), and record the catalog work of one call."""
+    Context = module('util.rule').Context
+    Query   = module('util.query').Query
+
+    def setup():
+        cb = conftest.callback(catalog)
+        return (cb, Context(cb, cb.rei)), {}
+
+    result = []
+
+    def call(cb, ctx):
+        result[:] = [cb, f(ctx, Query)]
+
+    benchmark.pedantic(call, setup=setup, rounds=20)
+    cb, out = result
+    benchmark.extra_info.update((k, cb.stats.get(k, 0)) for k in conftest.COUNTERS)
+    assert not cb.statements, 'query left open'
+    return out
+
+
+def legacy_fetch(ctx, query, columns, conditions, n):
+    """Get the first n rows of a query the way Query did before closing statements at execution.
+
+    The statement was executed without AUTO_CLOSE, and closed by fetching
+    another (full) batch with AUTO_CLOSE set.
+    """
+    gqi = ctx.msiMakeGenQuery(columns, conditions, query.irods_types.GenQueryInp())['arguments'][2]
+    gqi.maxRows  = n
+    gqi.options |= query.Option.RETURN_TOTAL_ROW_COUNT
+    gqo = ctx.msiExecGenQuery(gqi, query.irods_types.GenQueryOut())['arguments'][1]
+    rows = [gqo.sqlResult[0].row(r) for r in range(gqo.rowCnt)]
+
+    cti = gqo.continueInx
+    while cti > 0:
+        gqi.options |= query.Option.AUTO_CLOSE
+        ret = ctx.msiGetMoreRows(gqi, gqo, 0)
+        gqo, cti = ret['arguments'][1], ret['arguments'][2]
+
+    return rows
+
+
+def round_trips(module, catalog, f):
+    """Get the pages and rows that iRODS returns for f(ctx, query module)."""
+    cb = conftest.callback(catalog)
+    f(module('util.rule').Context(cb, cb.rei), module('util.query'))
+    assert not cb.statements, 'query left open'
+    return cb.stats['pages'], cb.stats['rows']
+
+
+def test_close_round_trips(module, catalog):
+    """Queries that need one batch are closed by iRODS with that batch, instead of with an extra full batch."""
+    condition = "COLL_NAME like '{}/%'".format(HOME)
+
+    for n, new in [(1, lambda ctx, q: q.Query(ctx, 'DATA_ID', condition).first()),
+                   (10, lambda ctx, q: list(q.Query(ctx, 'DATA_ID', condition, limit=10)))]:
+        legacy = round_trips(module, catalog, lambda ctx, q: legacy_fetch(ctx, q, 'DATA_ID', condition, n))
+        assert round_trips(module, catalog, new) == (1, n)
+        assert legacy[0] == 2 and legacy[1] > n
+
+
+@pytest.mark.benchmark(group='close')
+def test_first_legacy(benchmark, module, catalog):
+    q = module('util.query')
+    assert query(benchmark, module, catalog,
+                 lambda ctx, Query: legacy_fetch(ctx, q, 'DATA_ID', "COLL_NAME like '{}/%'".format(HOME), 1))
+
+
+@pytest.mark.benchmark(group='close')
+def test_limit_legacy(benchmark, module, catalog):
+    q = module('util.query')
+    assert len(query(benchmark, module, catalog,
+                     lambda ctx, Query: legacy_fetch(ctx, q, 'DATA_ID', "COLL_NAME like '{}/%'".format(HOME), 10))) == 10
+
+
+@pytest.mark.benchmark(group='close')
+def test_first(benchmark, module, catalog):
+    assert query(benchmark, module, catalog,
+                 lambda ctx, Query: Query(ctx, 'DATA_ID', "COLL_NAME like '{}/%'".format(HOME)).first())
+
+
+@pytest.mark.benchmark(group='close')
+def test_exists(benchmark, module, catalog):
+    assert query(benchmark, module, catalog,
+                 lambda ctx, Query: Query(ctx, 'DATA_ID', "COLL_NAME like '{}/%'".format(HOME)).exists())
+
+
+@pytest.mark.benchmark(group='close')
+def test_limit(benchmark, module, catalog):
+    assert len(query(benchmark, module, catalog,
+                     lambda ctx, Query: list(Query(ctx, 'DATA_ID', "COLL_NAME like '{}/%'".format(HOME),
+                                                   limit=10)))) == 10
+
+
+def test_collection_empty(benchmark, module, catalog):
+    collection = module('util.collection')
+    assert not query(benchmark, module, catalog, lambda ctx, Query: collection.empty(ctx, HOME))
+
+
+def test_cursor_case_insensitive(module, catalog):
+    """Cursors would skip rows in case insensitive queries, as rows are not ordered on the uppercased values."""
+    Query = module('util.query').Query
+    cb    = conftest.callback(catalog)
+    q     = Query(cb, 'ORDER(COLL_NAME)', "COLL_NAME like '{}/%'".format(HOME), limit=1)
+    list(q)
+
+    with pytest.raises(ValueError):
+        Query(cb, 'ORDER(COLL_NAME)', "COLL_NAME like '{}/%'".format(HOME), after=q.cursor(), case_sensitive=False)
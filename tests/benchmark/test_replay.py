@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of replayed API calls, recorded on the in-memory catalog (see util/record.py)."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import json
+import os
+
+import pytest
+import replay
+
+import conftest
+
+FOLDER = '/tempZone/home/research-category-0-0/folder-0'
+
+
+@pytest.fixture
+def record(tmpdir, monkeypatch, module, catalog):
+    """Record API calls on the catalog, and return the recordings."""
+    path   = str(tmpdir.join('recording.jsonl'))
+    config = module('util.config').config
+    monkeypatch.setitem(config._items, 'query_record', path)
+
+    def record(rule, params, anonymize=False, warm=False):
+        monkeypatch.setitem(config._items, 'query_record_anonymize', anonymize)
+        cb = conftest.callback(catalog, warm=warm)
+        rule([json.dumps(params)], cb, cb.rei)
+        with open(path) as f:
+            recording = json.loads(f.readlines()[-1])
+        return cb, json.loads(''.join(cb.stdout)), recording
+
+    return record
+
+
+@pytest.mark.parametrize('anonymize', [False, True], ids=['plain', 'anonymized'])
+def test_replay_browse_folder(benchmark, rules, record, anonymize):
+    cb, result, recording = record(rules.api_browse_folder, {'coll': FOLDER}, anonymize)
+    assert recording['api'] == 'api_browse_folder'
+    assert (recording['input']['coll'] == FOLDER) != anonymize
+
+    replayed, replayed_result = benchmark(replay.replay, recording)
+    assert not replayed.missing
+    assert replayed.stats == {k: v for k, v in cb.stats.items() if k != 'scanned'}
+    assert replayed_result['status'] == 'ok'
+    if not anonymize:
+        assert replayed_result == result
+    benchmark.extra_info.update((k, replayed.stats.get(k, 0)) for k in conftest.COUNTERS)
+
+
+def test_replay_meta_form_load(benchmark, rules, record):
+    cb, result, recording = record(rules.api_meta_form_load, {'coll': FOLDER})
+
+    replayed, replayed_result = benchmark(replay.replay, recording)
+    assert not replayed.missing
+    assert replayed_result == result
+    # Queries of rule language rules are not part of the recording.
+    assert replay.recorded_counts(recording)['queries'] == replayed.stats['queries']
+    benchmark.extra_info.update((k, replayed.stats.get(k, 0)) for k in conftest.COUNTERS)
+
+
+def test_record_warm(rules, module, catalog, record, monkeypatch):
+    """Recording skips the process-wide caches for the recorded call only, and leaves them filled."""
+    cache = module('util.cache')
+    config = module('util.config').config
+
+    with monkeypatch.context() as m:
+        m.setitem(config._items, 'query_record', '')
+        cb = conftest.callback(catalog)
+        rules.api_meta_form_load([json.dumps({'coll': FOLDER})], cb, cb.rei)
+    stats = cache.stats()
+    assert any(x['size'] for x in stats.values())
+
+    cb, result, recording = record(rules.api_meta_form_load, {'coll': FOLDER}, warm=True)
+    assert [x['size'] for x in cache.stats().values()] == [x['size'] for x in stats.values()]
+    assert [x['hits'] for x in cache.stats().values()] == [x['hits'] for x in stats.values()]
+
+    replayed, replayed_result = replay.replay(recording)
+    assert not replayed.missing
+    assert replayed_result == result
+
+
+@pytest.mark.skipif(not os.path.exists('/dev/full'), reason='needs /dev/full')
+def test_record_unwritable(rules, module, catalog, monkeypatch):
+    """A recording that cannot be written is logged, and the call itself succeeds."""
+    monkeypatch.setitem(module('util.config').config._items, 'query_record', '/dev/full')
+
+    cb = conftest.callback(catalog)
+    rules.api_browse_folder([json.dumps({'coll': FOLDER})], cb, cb.rei)
+    assert json.loads(''.join(cb.stdout))['status'] == 'ok'
+    assert any('Could not write recording of <api_browse_folder>' in x for x in cb.log)
+
+
+def test_anonymize_conditions(module):
+    record = module('util.record')
+    conditions = ("COLL_NAME = '/tempZone/home/research-alpha' AND DATA_NAME >= 'secret-file.txt'"
+                  " AND DATA_NAME<'bravo.txt' AND COLL_NAME begin_of '/tempZone/home/research-charlie'"
+                  " AND DATA_NAME between 'delta.txt' 'echo.txt' AND DATA_SIZE > '5'")
+    anonymized = record.anonymize_conditions(conditions)
+    for name in ['alpha', 'secret', 'bravo', 'charlie', 'delta', 'echo']:
+        assert name not in anonymized
+    assert "DATA_SIZE > '5'" in anonymized
+
+
+def test_replay_browse_folder_cursor_anonymized(rules, module, record):
+    """Key values in input cursors and keyset conditions are anonymized, and the recording can be replayed."""
+    params = {'coll': FOLDER, 'limit': 3, 'cursor': ''}
+    _, result, _ = record(rules.api_browse_folder, params)
+    params['cursor'] = result['data']['cursor']
+    _, key, _ = module('util.query')._decode_cursor(params['cursor'].split(':', 1)[1])
+
+    _, result, recording = record(rules.api_browse_folder, params, anonymize=True)
+    assert result['status'] == 'ok' and len(result['data']['items']) == 3
+    assert any(' >= ' in x.get('where', '') for x in recording['calls'])
+
+    text = json.dumps(recording)
+    names = [key, FOLDER.rsplit('/', 1)[1]] + [x['name'] for x in result['data']['items']]
+    for name in names:
+        assert name.rsplit('.', 1)[0] not in text
+
+    replayed, replayed_result = replay.replay(recording)
+    assert not replayed.missing
+    assert len(replayed_result['data']['items']) == 3
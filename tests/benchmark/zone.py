@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Synthetic Yoda zones for the in-memory catalog (see icat.py)."""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import json
+import os
+import time
+
+import icat
+
+ORG = 'org_'
+REVISIONS = '/yoda/revisions'
+
+# Metadata schemas shipped with the ruleset.
+SCHEMAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'schemas')
+
+# Resources and their storage tier.
+RESOURCES = [('irodsResc',     'Standard'),
+             ('irodsRescRepl', 'Archive')]
+
+
+def build(zone='tempZone', categories=1, groups=2, folders=5, files=20, revisions=2, replicas=2, size=1024,
+          clock=None, schema='default-1'):
+    """Create a catalog with research groups, folders, files and revisions.
+
+    Each category has a datamanager group and a number of research groups,
+    all with the users 'researcher' and 'datamanager' as members. Every
+    research group has the given number of folders, with the given number of
+    files each, and every file has the given number of revisions in the
+    revision store.
+
+    The number of data objects created is
+    categories * groups * folders * files * (1 + revisions).
+
+    :param zone:       Zone name
+    :param categories: Number of group categories
+    :param groups:     Number of research groups per category
+    :param folders:    Number of folders per research group
+    :param files:      Number of files per folder
+    :param revisions:  Number of revisions per file
+    :param replicas:   Number of replicas per data object (at most len(RESOURCES))
+    :param size:       Size of each data object in bytes
+    :param clock:      Catalog time (default: now, as revision cleanup compares against the current time)
+    :param schema:     Name of a schema in the schemas directory to install, or None
+
+    :returns: The populated icat.Catalog
+    """
+    cat = icat.Catalog(zone, int(time.time()) if clock is None else clock)
+
+    for name, tier in RESOURCES:
+        cat.add_avu(cat.add_resource(name).avus, ORG + 'storage_tier', tier)
+    resources = [name for name, _ in RESOURCES[:replicas]]
+
+    cat.add_user('researcher')
+    cat.add_user('datamanager')
+    cat.add_user('technicaladmin', 'rodsadmin')
+
+    revision_store = '/{}{}'.format(zone, REVISIONS)
+    cat.add_coll(revision_store)
+
+    if schema is not None:
+        add_schema(cat, schema)
+
+    for c in range(categories):
+        category = 'category-{}'.format(c)
+        cat.add_group('datamanager-' + category, members=['datamanager'],
+                      avus=[('category', category), ('subcategory', category)])
+
+        for g in range(groups):
+            group = 'research-{}-{}'.format(category, g)
+            cat.add_group(group, members=['researcher', 'datamanager'],
+                          avus=[('category', category),
+                                ('subcategory', category),
+                                ('data_classification', 'unspecified')])
+
+            acl = {group: 'own', 'rods': 'own'}
+            home = cat.add_coll('/{}/home/{}'.format(zone, group), acl=acl)
+            cat.add_coll('/{}/home/{}'.format(zone, group.replace('research-', 'vault-', 1)),
+                         acl={'rods': 'own', 'datamanager-' + category: 'read object'})
+
+            for f in range(folders):
+                folder = cat.add_coll('{}/folder-{}'.format(home.name, f), acl=acl)
+                for i in range(files):
+                    path = '{}/file-{}.txt'.format(folder.name, i)
+                    d = cat.add_data(path, size=size, resources=resources, checksum='sha2:x')
+                    add_revisions(cat, revision_store, group, d, revisions)
+                if schema is not None and f == 0:
+                    add_metadata(cat, folder.name, schema)
+
+    return cat
+
+
+def add_schema(cat, schema, category='default'):
+    """Install a metadata schema from the schemas directory for a category."""
+    for name in ['metadata.json', 'uischema.json']:
+        with open(os.path.join(SCHEMAS, schema, name)) as f:
+            content = f.read()
+        cat.add_data('/{}/yoda/schemas/{}/{}'.format(cat.zone, category, name),
+                     content=content, acl={'public': 'read object', 'rods': 'own'})
+
+
+def add_metadata(cat, coll, schema):
+    """Add a minimal yoda-metadata.json for the given schema to a collection."""
+    metadata = {'links': [{'rel': 'describedby',
+                           'href': 'https://yoda.uu.nl/schemas/{}/metadata.json'.format(schema)}],
+                'Title': 'Benchmark',
+                'Description': 'Synthetic data package',
+                'Data_Classification': 'Public',
+                'Retention_Period': 10,
+                'License': 'Custom',
+                'Data_Access_Restriction': 'Open - freely retrievable',
+                'Creator': [{'Name': {'Given_Name': 'Bench', 'Family_Name': 'Mark'},
+                             'Affiliation': ['Utrecht University']}]}
+    cat.add_data('{}/yoda-metadata.json'.format(coll), content=json.dumps(metadata))
+
+
+def add_intake(cat, study='initial', waves=2, experiments=2, pseudocodes=5, files=3, size=1024):
+    """Add an intake study with datasets laid out as <wave>_<experiment>/<pseudocode>/<files>.
+
+    Every (wave, experiment, pseudocode) combination forms one dataset.
+
+    :returns: The intake collection path
+    """
+    group = 'grp-intake-' + study
+    for name in [group, 'grp-datamanager-' + study]:
+        # Groups are created with a category by the group manager.
+        cat.add_group(name, members=['researcher', 'datamanager'],
+                      avus=[('category', 'intake'), ('subcategory', study)])
+
+    acl  = {group: 'own', 'rods': 'own'}
+    root = cat.add_coll('/{}/home/{}'.format(cat.zone, group), acl=acl).name
+    experiment_types = ['pci', 'echo', 'facehouse', 'peabody']
+
+    for w in range(waves):
+        for e in range(experiments):
+            coll = cat.add_coll('{}/{}w_{}'.format(root, 10 * (w + 1), experiment_types[e % len(experiment_types)]),
+                                acl=acl)
+            for p in range(pseudocodes):
+                dataset = cat.add_coll('{}/B{:05d}'.format(coll.name, p), acl=acl)
+                for i in range(files):
+                    cat.add_data('{}/file-{}.txt'.format(dataset.name, i), size=size, acl=acl)
+    return root
+
+
+def add_revisions(cat, store, group, d, n):
+    """Add n revisions of a data object to the revision store, one day apart."""
+    for r in range(n):
+        t = cat.clock - (r + 1) * 86400
+        path = '{}/{}/{}/{}_{}_researcher'.format(store, group, d.coll.id, d.name, t)
+        cat.add_data(path,
+                     size=d.replicas[0].size,
+                     resources=[x.resc for x in d.replicas],
+                     avus=[(ORG + 'original_path',        d.path),
+                           (ORG + 'original_coll_name',   d.coll.name),
+                           (ORG + 'original_data_name',   d.name),
+                           (ORG + 'original_data_id',     str(d.id)),
+                           (ORG + 'original_coll_id',     str(d.coll.id)),
+                           (ORG + 'original_modify_time', str(t)),
+                           (ORG + 'original_group_name',  group),
+                           (ORG + 'original_filesize',    str(d.replicas[0].size))])
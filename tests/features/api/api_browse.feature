@@ -15,6 +15,18 @@ Feature: Browse API
             | datamanager | /tempZone/home/research-initial/testdata | lorem.txt                    |
             | datamanager | /tempZone/home/research-initial/testdata | SIPI_Jelly_Beans_4.1.07.tiff |
 
+    Scenario: Browse folder with cursor
+        Given user "<user>" is authenticated
+        And the Yoda browse folder API is paged through "<collection>" with a cursor
+        Then the response status code is "200"
+        And the browse result contains "<result>"
+
+        Examples:
+            | user        | collection                               | result                       |
+            | researcher  | /tempZone/home/research-initial          | testdata                     |
+            | researcher  | /tempZone/home/research-initial/testdata | lorem.txt                    |
+            | researcher  | /tempZone/home/research-initial/testdata | SIPI_Jelly_Beans_4.1.07.tiff |
+
     Scenario: Browse collections
         Given user "<user>" is authenticated
         And the Yoda browse collections API is queried with "<collection>"
@@ -25,6 +25,26 @@ def api_browse_folder(user, collection):
     )
 
 
+@given('the Yoda browse folder API is paged through "<collection>" with a cursor', target_fixture="api_response")
+def api_browse_folder_cursor(user, collection):
+    # Page through the entire collection, two items at a time.
+    items = []
+    cursor = ""
+    while cursor is not None:
+        http_status, body = api_request(
+            user,
+            "browse_folder",
+            {"coll": collection, "limit": 2, "cursor": cursor}
+        )
+        if http_status != 200:
+            return http_status, body
+
+        items += body['data']['items']
+        cursor = body['data']['cursor']
+
+    return http_status, {'data': {'items': items}}
+
+
 @given('the Yoda browse collections API is queried with "<collection>"', target_fixture="api_response")
 def api_browse_collections(user, collection):
     return api_request(
@@ -67,6 +67,12 @@ class api(object):
     """
     fns = []
 
+    # Set by rulesets that import their modules lazily.
+    loader = None
+
+    # Defined in util.api itself, rather than by a ruleset module.
+    api_batch = None
+
     @staticmethod
     def make():
         def f(g):
@@ -92,6 +98,9 @@ sys.path += ['/etc/irods']
 try:
     # Import the ruleset.
     ruleset_mod = import_module(ruleset_name)
+
+    # Import modules that the ruleset imports lazily, declaring their APIs.
+    getattr(ruleset_mod, '_import_all', lambda: None)()
 except Exception as e:
     print('Could not import ruleset <{}>: {}'.format(ruleset_name, e), file=sys.stderr)
     raise
@@ -28,6 +28,8 @@ import group
 import avu
 import misc
 import query
+import metrics
+import cache
 import genquery  # temporary
 import config
 
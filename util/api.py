@@ -8,11 +8,15 @@ __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import inspect
+import random
 import traceback
 from collections import OrderedDict
+from types import GeneratorType
 
 import jsonutil
 import log
+import profiling
+import record
 import rule
 from config import config
 from error import *
@@ -102,6 +106,13 @@ def _api(f):
     # If the function accepts **kwargs, we do not forbid extra arguments.
     allow_extra = a_kw is not None
 
+    # Result shorthands.
+    def error_internal(debug_info=None):
+        return Error('internal', 'An internal error occurred', debug_info=debug_info)
+
+    def bad_request(debug_info=None):
+        return Error('badrequest', 'An internal error occurred', debug_info=debug_info)
+
     def wrapper(ctx, inp):
         """A function that receives a JSON string and calls a wrapped function with unpacked arguments.
 
@@ -113,13 +124,6 @@ def _api(f):
 
         :returns: Result of the JSON API call
         """
-        # Result shorthands.
-        def error_internal(debug_info=None):
-            return Error('internal', 'An internal error occurred', debug_info=debug_info)
-
-        def bad_request(debug_info=None):
-            return Error('badrequest', 'An internal error occurred', debug_info=debug_info)
-
         # Validate input string: is it a valid JSON object?
         try:
             data = jsonutil.parse(inp)
@@ -130,6 +134,16 @@ def _api(f):
                             .format(f.__name__))
             return bad_request('JSON parse error: {}'.format(e)).as_dict()
 
+        return call(ctx, data)
+
+    def call(ctx, data):
+        """Call the wrapped function with arguments from a decoded JSON object (see api_batch).
+
+        :param ctx:  Combined type of a callback and rei struct
+        :param data: Dict of arguments
+
+        :returns: Result of the API call
+        """
         # Check that required arguments are present.
         for param in required:
             if param not in data:
@@ -153,17 +167,45 @@ def _api(f):
             # Time the request.
             import time
             t = time.time()
-            result = f(ctx, **data)
-            t = time.time() - t
-
-            log._debug(ctx, '%4dms %s' % (int(t * 1000), f.__name__))
+            recorder = record.start(ctx)
+            profile  = profiling.start(f.__name__)
+            outer    = _start_query_stats(ctx)
+
+            # Filled in by finish(), after a streamed result has been written.
+            debug_info = {}
+
+            def finish():
+                t_ = time.time() - t
+                if profile is not None:
+                    profiling.finish(ctx, profile, f.__name__, t_)
+                if recorder is not None:
+                    record.finish(ctx, recorder, f, data, t_)
+
+                log._debug(ctx, '{:4d}ms {}', int(t_ * 1000), f.__name__)
+                _log_query_stats(ctx, f.__name__, t_)
+                debug_info.update(time=t_, queries=_query_stats(ctx))
+                _finish_query_stats(ctx, outer)
+
+            try:
+                result = f(ctx, **data)
+            except Exception:
+                finish()
+                raise
+
+            if type(result) is GeneratorType:
+                # Streamed result (see make()): timing, statistics,
+                # recording and profiling continue until it has been written.
+                # The debug info is written after the data.
+                result = _stream(ctx, f, result, finish)
+            else:
+                finish()
 
             if type(result) is Error:
                 raise result  # Allow api.Errors to be either raised or returned.
 
             elif not isinstance(result, Result):
                 # No error / explicit status info implies 'OK' status.
-                result = Result(result, debug_info={'time': t})
+                result = Result(result, debug_info=debug_info)
 
             return result.as_dict()
         except Error as e:
@@ -179,9 +221,75 @@ def _api(f):
                             .format(f.__name__, traceback.format_exc()))
             return error_internal(traceback.format_exc()).as_dict()
 
+    wrapper.call = call
     return wrapper
 
 
+def _stream(ctx, f, result, finish):
+    """Pass through a streamed API result, calling finish at the end and logging uncaught errors.
+
+    Errors of a streamed result occur after the API function has returned,
+    so they can only be logged.
+    """
+    try:
+        for x in result:
+            yield x
+    except Exception:
+        log._write(ctx, 'Error: API rule <{}> failed while streaming its result (trace follows below this line)\n{}'
+                        .format(f.__name__, traceback.format_exc()))
+        raise
+    finally:
+        finish()
+
+
+def _start_query_stats(ctx):
+    """Give an API call its own genquery statistics.
+
+    Within api_batch, all calls share the rule's context. Each call gets new
+    statistics, which are added to those of the batch when it finishes (see
+    _finish_query_stats).
+
+    :returns: The statistics to restore afterwards, if any
+    """
+    if isinstance(ctx, rule.Context):
+        outer, ctx.query_stats = ctx.query_stats, rule.QueryStats()
+        return outer
+
+
+def _finish_query_stats(ctx, outer):
+    """Add the genquery statistics of a finished API call to those of the enclosing call."""
+    if outer is not None:
+        outer.add(ctx.query_stats)
+        ctx.query_stats = outer
+
+
+def _query_stats(ctx):
+    """Get the genquery statistics of an API call, if available."""
+    if isinstance(ctx, rule.Context):
+        return ctx.query_stats.as_dict()
+
+
+def _log_query_stats(ctx, name, t):
+    """Log the genquery statistics of a sample of API calls (see config.query_stats_sample)."""
+    if config.query_stats_sample <= 0 or not isinstance(ctx, rule.Context):
+        return
+    if random.randrange(config.query_stats_sample) != 0:
+        return
+
+    stats = ctx.query_stats
+    log._write(ctx, 'API <{}> took {}ms: {} (slowest: {})'
+                    .format(name, int(t * 1000), stats,
+                            '; '.join('{}ms {}'.format(*x) for x in stats.slowest())))
+
+
+# API functions by name, callable with a dict of arguments (see api_batch).
+registry = {}
+
+# Imports the module of an API by name, for modules that are imported lazily
+# (set by the ruleset package, see __init__).
+loader = None
+
+
 def make():
     """Create API functions callable as iRODS rules.
 
@@ -206,14 +314,60 @@ def make():
         # this returns {"status": "ok", "status_info": null, "data": 42}
         # when called as api_ping {"foo": 42}
 
+    Large results can be streamed: if f returns a generator, or a dict with
+    generators as values, these are encoded as JSON arrays and written
+    while they are consumed (see jsonutil.dump_stream). Errors raised by the
+    generators cannot be turned into an error result anymore; they are
+    logged, and make the rule call fail. Timing and query statistics of a
+    streamed result are taken once it has been written, so its debug info
+    comes after the data.
+
     :returns: API function callable as iRODS rules
     """
     def deco(f):
         # The "base" API function, that does handling of arguments and errors.
         base = _api(f)
+        registry[f.__name__] = base.call
 
         # The JSON-in, JSON-out rule.
         return rule.make(inputs=[0], outputs=[],
-                         transform=jsonutil.dump, handler=rule.Output.STDOUT)(base)
+                         transform=jsonutil.dump_stream, handler=rule.Output.STDOUT_STREAM)(base)
 
     return deco
+
+
+@make()
+def api_batch(ctx, calls):
+    """Run multiple API calls in one rule invocation.
+
+    The calls share the rule's context, including its query cache, so a
+    page that needs several API calls can get them in one request.
+    Each call reports its own query statistics, and the batch their total:
+
+        api_batch {"calls": [{"fn": "api_browse_folder", "args": {"coll": "/tempZone/home/research-a"}},
+                             {"fn": "api_folder_get_locks", "args": {"coll": "/tempZone/home/research-a"}}]}
+
+    :param ctx:   Combined type of a callback and rei struct
+    :param calls: List of calls, each with the API name as 'fn' and a dict of arguments as 'args'
+
+    :returns: List of results of the calls, each with status and data as returned by a single API call
+    """
+    if type(calls) is not list:
+        return Error('badrequest', 'Calls must be a list')
+
+    def call(c):
+        fn = c.get('fn') if isinstance(c, dict) else None
+        args = c.get('args', {}) if isinstance(c, dict) else None
+
+        if fn not in registry and loader is not None and isinstance(fn, basestring):
+            loader(fn)
+
+        if fn == 'api_batch' or fn not in registry:
+            return Error('badrequest', 'Unknown API: {}'.format(fn)).as_dict()
+        elif not isinstance(args, dict):
+            return Error('badrequest', 'Arguments of {} must be an object'.format(fn)).as_dict()
+        else:
+            return registry[fn](ctx, args)
+
+    # Streamed (see make()): each result is written before the next call runs.
+    return (call(c) for c in calls)
@@ -100,6 +100,64 @@ def rm_from_group(ctx, group, a, v):
     msi.remove_key_value_pairs_from_obj(ctx, x['arguments'][1], group, '-u')
 
 
+def _key_val_pairs(ctx, avus):
+    """Build KeyValPairs holding a list of (attribute, value) pairs, in order.
+
+    A KeyValPair holds one value per attribute, so a repeated attribute
+    starts a new KeyValPair.
+    """
+    kvps = []
+    keys = None
+
+    for a, v in avus:
+        if keys is None or a in keys:
+            kvps.append(irods_types.KeyValPair())
+            keys = set()
+        keys.add(a)
+        kvps[-1] = msi.add_key_val(ctx, kvps[-1], a, v if isinstance(v, basestring) else str(v))['arguments'][0]
+
+    return kvps
+
+
+def set_many(ctx, obj, obj_type, avus):
+    """Set key/value metadata on an object, with one metadata msi call for all distinct attributes.
+
+    Building the KeyValPair still takes an msiAddKeyVal call per AVU, and
+    iRODS still updates the catalog once per AVU.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param obj:      Path of a data object or collection, or name of a group or resource
+    :param obj_type: Object type ('-d', '-C', '-u' or '-R')
+    :param avus:     Dict of attribute => value, or list of (attribute, value) pairs
+    """
+    for kvp in _key_val_pairs(ctx, avus.items() if isinstance(avus, dict) else avus):
+        msi.set_key_value_pairs_to_obj(ctx, kvp, obj, obj_type)
+
+
+def associate_many(ctx, obj, obj_type, avus):
+    """Associate key/value metadata to an object, with one metadata msi call for all distinct attributes (see set_many).
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param obj:      Path of a data object or collection, or name of a group or resource
+    :param obj_type: Object type ('-d', '-C', '-u' or '-R')
+    :param avus:     Dict of attribute => value, or list of (attribute, value) pairs
+    """
+    for kvp in _key_val_pairs(ctx, avus.items() if isinstance(avus, dict) else avus):
+        msi.associate_key_value_pairs_to_obj(ctx, kvp, obj, obj_type)
+
+
+def remove_many(ctx, obj, obj_type, avus):
+    """Remove key/value metadata from an object, with one metadata msi call for all distinct attributes (see set_many).
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param obj:      Path of a data object or collection, or name of a group or resource
+    :param obj_type: Object type ('-d', '-C', '-u' or '-R')
+    :param avus:     Dict of attribute => value, or list of (attribute, value) pairs
+    """
+    for kvp in _key_val_pairs(ctx, avus.items() if isinstance(avus, dict) else avus):
+        msi.remove_key_value_pairs_from_obj(ctx, kvp, obj, obj_type)
+
+
 def rmw_from_coll(ctx, obj, a, v, u=''):
     """Remove AVU from collection with wildcards."""
     msi.rmw_avu(ctx, '-C', obj, a, v, u)
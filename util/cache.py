@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""Process-wide caches of lookups that rarely change.
+
+Unlike the query cache of a rule.Context, which lives for one rule
+invocation, these caches live as long as the rule engine, i.e. the agent
+process. They are meant for data that is the same for every user and
+changes rarely, such as group categories, schemas and resource tiers:
+
+    @cache.cached('resource_tier', size=100, tags=lambda res_name: [res_name, constants.UURESOURCETIERATTRNAME])
+    def get_tier_by_resource_name(ctx, res_name):
+        ...
+
+Results are cached by their arguments (except ctx), are evicted least
+recently used when a cache is full, and expire after config.cache_ttl
+seconds ('0' disables caching).
+
+Entries are tagged with the names they depend on: object paths, group and
+resource names and attribute names. The static PEPs for AVU, ACL and group
+changes call invalidate() (see policies.py), which drops the entries
+referring to a changed object. This works within one agent only; changes
+made in other agents are seen after at most config.cache_ttl seconds.
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import time
+from collections import OrderedDict
+
+import rule
+from config import config
+
+# Caches by name.
+_caches = OrderedDict()
+
+
+def _affected(tag, name):
+    """Check whether an entry tag refers to a name, or, for paths, to a parent or child of it."""
+    return tag == name or (name.startswith('/') and tag.startswith('/')
+                           and (tag.startswith(name + '/') or name.startswith(tag + '/')))
+
+
+class Cache(object):
+    """Bounded LRU cache of which entries expire after config.cache_ttl seconds."""
+
+    def __init__(self, name, size):
+        self.name        = name
+        self.size        = size
+        self.hits        = 0
+        self.misses      = 0
+        self.evictions   = 0
+        self.expirations = 0
+        self._entries    = OrderedDict()  # key => (value, expiry time, tags), least recently used first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Get the value of a key.
+
+        :param key: Key (hashable)
+
+        :returns: Tuple of a boolean indicating whether the key is cached, and its value
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        if entry[1] < time.time():
+            self.expirations += 1
+            self.misses += 1
+            return False, None
+
+        self._entries[key] = entry
+        self.hits += 1
+        return True, entry[0]
+
+    def put(self, key, value, tags=()):
+        """Cache a value, tagged with the names it depends on.
+
+        :param key:   Key (hashable)
+        :param value: Value, which must not be modified afterwards
+        :param tags:  Names of objects, groups, resources or attributes the value depends on
+        """
+        if config.cache_ttl <= 0:
+            return
+
+        self._entries.pop(key, None)
+        self._entries[key] = (value, time.time() + config.cache_ttl, frozenset(x.lower() for x in tags))
+
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, name=None):
+        """Drop entries referring to a name, or all entries if no name is given.
+
+        For paths, entries referring to parents or children of the path are dropped as well.
+
+        :param name: Path or name of a changed object, group, resource or attribute
+        """
+        if name is None:
+            self._entries.clear()
+            return
+
+        name = name.lower().rstrip('/')
+        for key, (_, _2, tags) in list(self._entries.items()):
+            if any(_affected(x, name) for x in tags):
+                del self._entries[key]
+
+    def stats(self):
+        """Get the number of entries, hits, misses, evictions and expirations of the cache."""
+        return {'size':        len(self._entries),
+                'hits':        self.hits,
+                'misses':      self.misses,
+                'evictions':   self.evictions,
+                'expirations': self.expirations}
+
+
+def make(name, size):
+    """Get a process-wide cache by name, creating it if needed.
+
+    :param name: Name of the cache
+    :param size: Maximum number of entries
+
+    :returns: Cache
+    """
+    c = _caches.get(name)
+    if c is None:
+        c = _caches[name] = Cache(name, size)
+    return c
+
+
+def cached(name, size, tags=None):
+    """Cache results of a function in a process-wide cache (see module documentation).
+
+    The function must take a ctx as its first argument, and only hashable
+    further arguments. Exceptions are not cached. With ctx.cache_bypass set
+    (see rule.Context), the function is called without using the cache.
+
+    :param name: Name of the cache
+    :param size: Maximum number of entries
+    :param tags: Function that gets the tags of an entry from the arguments (except ctx),
+                 by default all string arguments
+
+    :returns: Decorator
+    """
+    c = make(name, size)
+
+    def deco(f):
+        def wrapper(ctx, *args):
+            if isinstance(ctx, rule.Context) and ctx.cache_bypass:
+                return f(ctx, *args)
+
+            found, value = c.get(args)
+            if not found:
+                value = f(ctx, *args)
+                c.put(args, value, (tags or _string_args)(*args))
+            return value
+
+        wrapper.__name__ = f.__name__
+        wrapper.__doc__  = f.__doc__
+        wrapper.cache    = c
+        return wrapper
+    return deco
+
+
+def _string_args(*args):
+    return [x for x in args if isinstance(x, basestring)]
+
+
+def invalidate(*names):
+    """Drop entries referring to any of the given names from all caches, or all entries if no name is given.
+
+    :param names: Paths or names of changed objects, groups, resources or attributes
+    """
+    for c in _caches.values():
+        if not names:
+            c.invalidate()
+        for name in names:
+            if name:
+                c.invalidate(name)
+
+
+def stats():
+    """Get the hit and miss statistics of all caches.
+
+    :returns: Dict of cache name => statistics
+    """
+    return OrderedDict((name, c.stats()) for name, c in _caches.items())
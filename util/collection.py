@@ -5,22 +5,19 @@ __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import itertools
-import sys
-if sys.version_info > (2, 7):
-    from functools import reduce
+from collections import OrderedDict
 
 import genquery
 import irods_types
 
 import msi
+import query
 from query import Query
 
 
 def exists(ctx, path):
     """Check if a collection with the given path exists."""
-    return len(list(genquery.row_iterator(
-               "COLL_ID", "COLL_NAME = '{}'".format(path),
-               genquery.AS_LIST, ctx))) > 0
+    return Query(ctx, "COLL_ID", "COLL_NAME = '{}'".format(path), cache=True).exists()
 
 
 def owner(ctx, path):
@@ -32,30 +29,198 @@ def owner(ctx, path):
     return tuple(owners[0]) if len(owners) > 0 else None
 
 
+def subtree(ctx, path, columns, conditions='', output=query.AS_LIST, recursive=True, unique=False):
+    """Query data objects in a collection and (optionally) all its subcollections.
+
+    Data objects in a subtree cannot be selected with one genquery condition:
+    "COLL_NAME like '/a/b%'" also matches siblings such as '/a/bc', so the
+    root ("COLL_NAME = path") and its descendants ("COLL_NAME like path/%")
+    are queried separately and their results are chained into one generator.
+
+    With unique=True, rows of replicas of an already seen data object are
+    dropped. This requires DATA_ID to be one of the selected columns.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param path:       Path of the root collection
+    :param columns:    Columns to select (list or comma-separated string)
+    :param conditions: Additional conditions, combined with AND
+    :param output:     Query output type (see util.query.OutputType)
+    :param recursive:  Include data objects in subcollections
+    :param unique:     Yield each data object only once
+
+    :returns: Generator of query results (rows, or column pages for AS_COLUMNS)
+    """
+    if type(columns) is str:
+        columns = [x.strip() for x in columns.split(',')]
+
+    queries = [Query(ctx, columns, c, output=output)
+               for c in _subtree_conditions(path, conditions, recursive)]
+    results = itertools.chain(*queries)
+
+    if not unique:
+        return results
+
+    assert 'DATA_ID' in columns, 'unique subtree queries must select DATA_ID'
+    return _unique(results, columns, columns.index('DATA_ID'), output)
+
+
+def aggregate(ctx, path, aggregates, conditions='', recursive=True, group=None):
+    """Compute aggregates over data objects in a collection subtree.
+
+    The aggregation is pushed down to the catalog; only the per-query
+    results are combined here. Supported functions are COUNT, SUM, MIN and
+    MAX on numeric columns. Note that these count each replica separately.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param path:       Path of the root collection
+    :param aggregates: List of aggregate columns, e.g. ['COUNT(DATA_ID)', 'SUM(DATA_SIZE)']
+    :param conditions: Additional conditions, combined with AND
+    :param recursive:  Include data objects in subcollections
+    :param group:      Optional column to group the aggregates by
+
+    :returns: List of aggregate values (None for MIN/MAX over nothing), or,
+              if group is given, an OrderedDict of group value -> such a list
+    """
+    functions = [c.split('(', 1)[0].strip().upper() for c in aggregates]
+    assert all(f in _AGGREGATES for f in functions), 'unsupported aggregate in {}'.format(aggregates)
+
+    columns = list(aggregates) + ([group] if group is not None else [])
+    results = OrderedDict()
+
+    for row in subtree(ctx, path, columns, conditions, recursive=recursive):
+        key = row[-1] if group is not None else None
+        combined = results.get(key, [None] * len(functions))
+        for i, f in enumerate(functions):
+            if row[i] == '':
+                continue
+            value = int(row[i])
+            combined[i] = value if combined[i] is None else _AGGREGATES[f](combined[i], value)
+        results[key] = combined
+
+    if group is not None:
+        return results
+
+    combined = results.get(None, [None] * len(functions))
+    return [0 if v is None and f in ('COUNT', 'SUM') else v for f, v in zip(functions, combined)]
+
+
+_AGGREGATES = {'COUNT': lambda a, b: a + b,
+               'SUM': lambda a, b: a + b,
+               'MIN': min,
+               'MAX': max}
+
+
+def _subtree_conditions(path, conditions, recursive):
+    """Get the genquery conditions that together select a collection subtree."""
+    scopes = ["COLL_NAME = '{}'".format(path)]
+    if recursive:
+        scopes.append("COLL_NAME like '{}/%'".format(path))
+
+    return [c + ' AND ' + conditions if conditions else c for c in scopes]
+
+
+def _unique(results, columns, i, output):
+    """Filter subtree query results on unique values of column i."""
+    seen = set()
+
+    def new(key):
+        if key in seen:
+            return False
+        seen.add(key)
+        return True
+
+    for result in results:
+        if output == query.AS_COLUMNS:
+            keep = [j for j, key in enumerate(result[i]) if new(key)]
+            if keep:
+                yield [[cells[j] for j in keep] for cells in result]
+        elif output == query.AS_DICT:
+            if new(result[columns[i]]):
+                yield result
+        elif output == query.AS_TUPLE and len(columns) == 1:
+            if new(result):
+                yield result
+        elif new(result[i]):
+            yield result
+
+
 def empty(ctx, path):
     """Check if a collection contains any data objects."""
-    return (len(list(genquery.row_iterator(
-                     "DATA_ID",
-                     "COLL_NAME = '{}'".format(path),
-                     genquery.AS_LIST, ctx))) == 0
-            and len(list(genquery.row_iterator(
-                    "DATA_ID",
-                    "COLL_NAME like '{}/%'".format(path),
-                    genquery.AS_LIST, ctx))) == 0)
+    for _ in subtree(ctx, path, "DATA_ID"):
+        return False
+
+    return True
 
 
 def size(ctx, path):
-    """Get a collection's size in bytes."""
-    def func(x, row):
-        return x + int(row[1])
+    """Get a collection's size in bytes.
+
+    Each data object is counted once, regardless of its number of replicas.
+    """
+    return logical_stats(ctx, path)[1]
+
+
+def stats(ctx, path, recursive=True, logical=True):
+    """Get replica-aware object counts and sizes of a collection.
+
+    Replica counts and physical sizes are aggregated in the catalog, per
+    resource hierarchy. Logical counts and sizes (each data object counted
+    once, with the size of its largest replica) need one grouped row per
+    data object and can be skipped with logical=False.
+
+    :param ctx:       Combined type of a callback and rei struct
+    :param path:      A collection path
+    :param recursive: Measure subcollections as well
+    :param logical:   Compute object count and logical size
+
+    :returns: Dict with 'objects', 'replicas', 'logical_bytes',
+              'physical_bytes' and 'resources' (resource hierarchy -> dict
+              with 'replicas' and 'bytes'). The logical values are None if
+              logical=False.
+    """
+    resources = aggregate(ctx, path, ['COUNT(DATA_ID)', 'SUM(DATA_SIZE)'],
+                          recursive=recursive, group='DATA_RESC_HIER')
+
+    result = {'objects':        None,
+              'replicas':       sum(replicas or 0 for replicas, _ in resources.values()),
+              'logical_bytes':  None,
+              'physical_bytes': sum(size or 0 for _, size in resources.values()),
+              'resources':      {hier: {'replicas': replicas or 0, 'bytes': size or 0}
+                                 for hier, (replicas, size) in resources.items()}}
+
+    if logical:
+        result['objects'], result['logical_bytes'] = logical_stats(ctx, path, recursive)
+
+    return result
 
-    return reduce(func,
-                  itertools.chain(genquery.row_iterator("DATA_ID, DATA_SIZE",
-                                                        "COLL_NAME like '{}'".format(path),
-                                                        genquery.AS_LIST, ctx),
-                                  genquery.row_iterator("DATA_ID, DATA_SIZE",
-                                                        "COLL_NAME like '{}/%'".format(path),
-                                                        genquery.AS_LIST, ctx)), 0)
+
+def logical_stats(ctx, path, recursive=True):
+    """Count data objects and their logical size in bytes.
+
+    Each data object is counted once, with the size of its largest replica.
+    Unlike stats(), this does not query the replicas per resource hierarchy.
+
+    This is not a pushed-down aggregate: genquery has no COUNT(DISTINCT), and
+    a COUNT/SUM over replicas counts every object once per replica. Instead,
+    the catalog groups the replicas into one (DATA_ID, MAX(DATA_SIZE)) row
+    per data object, which are summed here. That takes one round trip per
+    256 objects (per query, for the collection and its subcollections).
+
+    :param ctx:       Combined type of a callback and rei struct
+    :param path:      A collection path
+    :param recursive: Measure subcollections as well
+
+    :returns: Tuple of the number of data objects and their size in bytes
+    """
+    objects, size = 0, 0
+
+    # Grouping by DATA_ID yields one row per data object.
+    for ids, sizes in subtree(ctx, path, "DATA_ID, MAX(DATA_SIZE)",
+                              output=query.AS_COLUMNS, recursive=recursive):
+        objects += len(ids)
+        size += sum(int(x) for x in sizes)
+
+    return objects, size
 
 
 def data_count(ctx, path, recursive=True):
@@ -67,16 +232,16 @@ def data_count(ctx, path, recursive=True):
 
     :returns: Number of data objects
     """
-    # Generators can't be fed to len(), so here we are...
-    return sum(1 for _ in data_objects(ctx, path, recursive=recursive))
+    return sum(len(ids) for [ids] in subtree(ctx, path, "DATA_ID",
+                                             output=query.AS_COLUMNS,
+                                             recursive=recursive))
 
 
 def collection_count(ctx, path):
     """Get a collection's collection count (the amount of collections within a collection)."""
-    return sum(1 for _ in genquery.row_iterator(
-               "COLL_ID",
-               "COLL_NAME like '{}/%'".format(path),
-               genquery.AS_LIST, ctx))
+    return sum(len(ids) for [ids] in Query(ctx, "COLL_ID",
+                                           "COLL_NAME like '{}/%'".format(path),
+                                           output=query.AS_COLUMNS))
 
 
 def data_objects(ctx, path, recursive=False):
@@ -98,19 +263,8 @@ def data_objects(ctx, path, recursive=False):
     def to_absolute(row):
         return '{}/{}'.format(*row)
 
-    q_root = genquery.row_iterator("COLL_NAME, DATA_NAME",
-                                   "COLL_NAME = '{}'".format(path),
-                                   genquery.AS_LIST, ctx)
-
-    if not recursive:
-        return itertools.imap(to_absolute, q_root)
-
-    # Recursive? Return a generator combining both queries.
-    q_sub = genquery.row_iterator("COLL_NAME, DATA_NAME",
-                                  "COLL_NAME like '{}/%'".format(path),
-                                  genquery.AS_LIST, ctx)
-
-    return itertools.imap(to_absolute, itertools.chain(q_root, q_sub))
+    return itertools.imap(to_absolute,
+                          subtree(ctx, path, "COLL_NAME, DATA_NAME", recursive=recursive))
 
 
 def create(ctx, path):
@@ -94,7 +94,21 @@ config = Config(environment=None,
                 epic_url=None,
                 epic_handle_prefix=None,
                 epic_key=None,
-                epic_certificate=None)
+                epic_certificate=None,
+                query_stats_sample=0,
+                query_record=None,
+                query_record_anonymize=False,
+                query_record_min_ms=0,
+                log_level=None,
+                metrics_file=None,
+                metrics_file_max_size=10485760,
+                metrics_file_backups=5,
+                metrics_data_object=None,
+                profile_dir=None,
+                profile_apis=[],
+                profile_sample=0,
+                profile_min_ms=0,
+                cache_ttl=60)
 
 # }}}
 
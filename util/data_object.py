@@ -16,10 +16,8 @@ from query import Query
 
 def exists(ctx, path):
     """Check if a data object with the given path exists."""
-    return len(list(genquery.row_iterator(
-               "DATA_ID",
-               "COLL_NAME = '%s' AND DATA_NAME = '%s'" % pathutil.chop(path),
-               genquery.AS_LIST, ctx))) > 0
+    return Query(ctx, "DATA_ID",
+                 "COLL_NAME = '%s' AND DATA_NAME = '%s'" % pathutil.chop(path)).exists()
 
 
 def owner(ctx, path):
@@ -59,6 +57,25 @@ def write(ctx, path, data):
     msi.data_obj_close(ctx, handle, 0)
 
 
+def append(ctx, path, data):
+    """Append a string to an iRODS data object, creating it if it does not exist.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param path: Path to iRODS data object
+    :param data: Data to append to data object
+    """
+    if not exists(ctx, path):
+        write(ctx, path, data)
+        return
+
+    ret = msi.data_obj_open(ctx, 'objPath={}++++openFlags=O_WRONLY'.format(path), 0)
+    handle = ret['arguments'][1]
+
+    msi.data_obj_lseek(ctx, handle, 0, 'SEEK_END', 0)
+    msi.data_obj_write(ctx, handle, data, 0)
+    msi.data_obj_close(ctx, handle, 0)
+
+
 def read(ctx, path, max_size=constants.IIDATA_MAX_SLURP_SIZE):
     """Read an entire iRODS data object into a string."""
     sz = size(ctx, path)
@@ -19,3 +19,7 @@ class UUFileNotExistError(UUError):
 
 class UUJsonValidationError(UUError):
     """JSON data could not be validated."""
+
+
+class UUQueryParameterError(UUError):
+    """Value cannot be used as a genquery condition parameter."""
@@ -4,6 +4,7 @@
 __copyright__ = 'Copyright (c) 2019-2020, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
+import cache
 import user
 from query import Query
 
@@ -17,7 +18,7 @@ def exists(ctx, grp):
     :returns: Boolean indicating if group with given name exists
     """
     return Query(ctx, "USER_GROUP_NAME", "USER_GROUP_NAME = '{}' AND USER_TYPE = 'rodsgroup'"
-                      .format(grp)).first() is not None
+                      .format(grp)).exists()
 
 
 def members(ctx, grp):
@@ -45,6 +46,7 @@ def is_member(ctx, grp, usr=None):
     return user.is_member_of(ctx, grp, usr)
 
 
+@cache.cached('group_category', size=1000)
 def get_category(ctx, grp):
     """Get the category of a group.
 
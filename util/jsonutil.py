@@ -6,6 +6,7 @@ __license__   = 'GPLv3, see LICENSE'
 
 import json
 from collections import OrderedDict
+from types import GeneratorType
 
 import data_object
 import error
@@ -22,38 +23,27 @@ class ParseError(error.UUError):
     """
 
 
-def _fold(x, **alg):
-    """Fold over a JSON structure.
+def _demote(x):
+    """Transform unicode -> UTF-8 encoded strings in a parsed JSON value, except in objects.
 
-    Calls functions from 'alg', indexed by the type of value, to transform values recursively.
-
-    :param x:     JSON structure
-    :param **alg: Functions to fold over JSON structure
-
-    :returns: Function f folded over a JSON structure
+    Objects are transformed while parsing (see _demote_pairs), so only
+    strings and (nested) lists of strings remain. Lists are changed in place.
     """
-    f = alg.get(type(x).__name__, lambda y: y)
-    if type(x) in [dict, OrderedDict]:
-        return f(OrderedDict([(k, _fold(v, **alg)) for k, v in x.items()]))
-    elif type(x) is list:
-        return f([_fold(v, **alg) for v in x])
-    else:
-        return f(x)
-
-
-def _demote_strings(json_data):
-    """Transform unicode -> UTF-8 encoded strings recursively, for a given JSON structure.
-
-    Needed for handling unicode in JSON as long as we are still using Python2.
-    Both JSON string values and JSON object (dict) keys are transformed.
+    t = type(x)
+    if t is unicode:
+        return x.encode('utf-8')
+    elif t is list:
+        for i, y in enumerate(x):
+            if type(y) is unicode:
+                x[i] = y.encode('utf-8')
+            elif type(y) is list:
+                _demote(y)
+    return x
 
-    :param json_data: JSON structure to transform
 
-    :returns: JSON structure with unicode strings transformed to UTF-8 encoded strings
-    """
-    return _fold(json_data,
-                 unicode=lambda x: x.encode('utf-8'),
-                 OrderedDict=lambda x: OrderedDict([(k.encode('utf-8'), v) for k, v in x.items()]))
+def _demote_pairs(pairs):
+    """Build an OrderedDict of a parsed JSON object with UTF-8 encoded strings (object_pairs_hook for parse)."""
+    return OrderedDict([(k.encode('utf-8'), _demote(v)) for k, v in pairs])
 
 
 def _promote_strings(json_data):
@@ -68,10 +58,17 @@ def _promote_strings(json_data):
 
     :returns: JSON structure with UTF-8 encoded strings transformed to unicode strings
     """
-    return _fold(json_data,
-                 str=lambda x: x.decode('utf-8'),
-                 OrderedDict=lambda x: OrderedDict([(k.decode('utf-8'), v) for k, v in x.items()]),
-                 dict=lambda x: OrderedDict([(k.decode('utf-8'), v) for k, v in x.items()]))
+    # A direct recursion rather than a generic fold, as this is on the path of every dump.
+    t = type(json_data)
+    if t is str:
+        return json_data.decode('utf-8')
+    elif t is list:
+        return [_promote_strings(x) for x in json_data]
+    elif t is dict or t is OrderedDict:
+        return OrderedDict([(k.decode('utf-8') if type(k) is str else k, _promote_strings(v))
+                            for k, v in json_data.items()])
+    else:
+        return json_data
 
 
 def parse(text, want_bytes=True):
@@ -88,8 +85,10 @@ def parse(text, want_bytes=True):
     :returns: JSON string as OrderedDict
     """
     try:
-        x = json.loads(text, object_pairs_hook=OrderedDict)
-        return _demote_strings(x) if want_bytes else x
+        if want_bytes:
+            # Strings are encoded as objects are parsed, rather than in a second pass.
+            return _demote(json.loads(text, object_pairs_hook=_demote_pairs))
+        return json.loads(text, object_pairs_hook=OrderedDict)
     except ValueError:
         raise ParseError('JSON file format error')
 
@@ -106,6 +105,67 @@ def dump(data, **options):
                .encode('utf-8')  # turn unicode json string back into an encoded str
 
 
+# Encoder for compact output. It accepts both UTF-8 encoded and unicode
+# strings, as non-ASCII characters are escaped, and uses the C accelerated
+# encoder of the json module (which is not used for indented output).
+_compact_encoder = json.JSONEncoder(ensure_ascii=True, encoding='utf-8', separators=(',', ':'))
+
+
+def dump_compact(data):
+    """Dump an object to a compact, ASCII-only JSON string.
+
+    Unlike dump(), this does not need to copy the object to transform its
+    strings first, which makes it suitable for large results (e.g. of API calls).
+
+    :param data: Object to dump
+
+    :returns: JSON string without whitespace, with non-ASCII characters escaped
+    """
+    return _compact_encoder.encode(data)
+
+
+def _streamed(x, depth):
+    """Check whether a dict has generators as values, directly or in nested dicts up to a depth."""
+    return any(type(v) is GeneratorType or (depth > 1 and type(v) in (dict, OrderedDict) and _streamed(v, depth - 1))
+               for v in x.values())
+
+
+def dump_stream(data, depth=2):
+    """Dump an object to compact JSON like dump_compact(), as a generator of chunks.
+
+    Generators in the object are encoded as JSON arrays while they are
+    consumed, so that large results need not be held in memory at once.
+    Generators are found as the object itself, as items of generators, and
+    as values of dicts up to the given depth (e.g. {'data': {'items': ...}}).
+
+    :param data:  Object to dump
+    :param depth: Depth of dicts to look for generators in
+
+    :returns: Generator of JSON strings
+    """
+    t = type(data)
+    if t is GeneratorType:
+        yield '['
+        first = True
+        for x in data:
+            if not first:
+                yield ','
+            first = False
+            for chunk in dump_stream(x, depth):
+                yield chunk
+        yield ']'
+    elif (t is dict or t is OrderedDict) and depth > 0 and _streamed(data, depth):
+        sep = '{'
+        for k, v in data.items():
+            yield sep + _compact_encoder.encode(k if isinstance(k, basestring) else str(k)) + ':'
+            sep = ','
+            for chunk in dump_stream(v, depth - 1):
+                yield chunk
+        yield '}'
+    else:
+        yield _compact_encoder.encode(data)
+
+
 def read(callback, path, **options):
     """Read an iRODS data object and parse it as JSON."""
     return parse(data_object.read(callback, path), **options)
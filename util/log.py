@@ -1,37 +1,87 @@
 # -*- coding: utf-8 -*-
-"""Logging facilities."""
+"""Logging facilities.
+
+Messages can be given as a format string with arguments, which are only
+formatted if the message is actually logged:
+
+    log.debug(ctx, 'checking {} against {}', path, schema)
+
+Within rules, log lines are buffered and written to the server log at the
+end of the rule (see rule.Context.log).
+"""
 
 __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import inspect
+import sys
 
 import rule
 import user
 from config import config
 
+# Log levels.
+DEBUG   = 10
+INFO    = 20
+WARNING = 30
+ERROR   = 40
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+
+
+def level():
+    """Get the minimum level of messages to log (see config.log_level).
+
+    :returns: Log level; without configured level, DEBUG in development and INFO otherwise
+    """
+    if config.log_level is not None:
+        return LEVELS[config.log_level]
+    return DEBUG if config.environment == 'development' else INFO
+
 
-def write(ctx, text):
+def enabled(lvl):
+    """Check whether messages of a level are logged, e.g. to avoid computing expensive log output."""
+    return lvl >= level()
+
+
+def _format(text, args):
+    return text.format(*args) if args else text
+
+
+def write(ctx, text, *args):
     """Write a message to the log, including client name and originating rule/API name."""
-    caller = inspect.stack()[1][3]
-    _write(ctx, '{}: {}'.format(caller, text))
+    if enabled(INFO):
+        _write(ctx, '{}: {}'.format(sys._getframe(1).f_code.co_name, _format(text, args)))
+
+
+def warning(ctx, text, *args):
+    """Write a warning to the log, including client name and originating rule/API name."""
+    if enabled(WARNING):
+        _write(ctx, '{}: WARNING: {}'.format(sys._getframe(1).f_code.co_name, _format(text, args)))
+
+
+def error(ctx, text, *args):
+    """Write an error to the log, including client name and originating rule/API name."""
+    _write(ctx, '{}: ERROR: {}'.format(sys._getframe(1).f_code.co_name, _format(text, args)))
 
 
-def _write(ctx, text):
+def _write(ctx, text, *args):
     """Write a message to the log, including the client name (intended for internal use)."""
+    text = _format(text, args)
     if type(ctx) is rule.Context:
-        ctx.writeLine('serverLog', '{{{}#{}}} {}'.format(*list(user.user_and_zone(ctx)) + [text]))
+        if ctx.log_prefix is None:
+            ctx.log_prefix = '{{{}}} '.format(user.full_name(ctx))
+        ctx.log(ctx.log_prefix + text)
     else:
         ctx.writeLine('serverLog', text)
 
 
-def debug(ctx, text):
-    """Write a log message if in a development environment."""
-    if config.environment == 'development':
-        write(ctx, 'DEBUG: {}'.format(text))
+def debug(ctx, text, *args):
+    """Write a debug message to the log, if debug messages are enabled (see level)."""
+    if enabled(DEBUG):
+        _write(ctx, '{}: DEBUG: {}'.format(sys._getframe(1).f_code.co_name, _format(text, args)))
 
 
-def _debug(ctx, text):
-    """Write a log message if in a development environment."""
-    if config.environment == 'development':
-        _write(ctx, 'DEBUG: {}'.format(text))
+def _debug(ctx, text, *args):
+    """Write a debug message to the log, without the originating rule/API name."""
+    if enabled(DEBUG):
+        _write(ctx, 'DEBUG: {}'.format(_format(text, args)))
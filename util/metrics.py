@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""Structured metrics of rules and batch jobs.
+
+Metrics are written as JSON lines to a local file on the server
+(config.metrics_file), which is rotated when it grows beyond
+config.metrics_file_max_size, and/or appended to a data object
+(config.metrics_data_object). Without either, metrics are disabled and the
+functions below return immediately.
+
+Batch jobs report their progress per job and phase:
+
+    with metrics.job(ctx, 'revisions_clean_up') as job:
+        with job.phase('scan'):
+            for x in ...:
+                job.items += 1
+                job.bytes += size
+
+This writes an event at the end of every phase and one at the end of the job,
+with status 'error' if it ended with an exception or job.failed was set:
+
+    {"event": "phase", "job": "revisions_clean_up", "run": "4f0c2e91d3a7", "phase": "scan",
+     "items": 120, "bytes": 1048576, "errors": 0, "duration": 1.234,
+     "time": 1612345678.901, "host": "provider.yoda", "pid": 1234}
+
+Rules can count and time things with counters and histograms, which are
+kept in memory and written as a 'metrics' event by flush(), e.g. at the end
+of a job:
+
+    metrics.incr('revisions_removed')
+    metrics.observe('revision_remove_ms', ms)
+
+Events are buffered in the agent and written in one go by flush(), which
+jobs call at the end of every phase.
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import bisect
+import json
+import os
+import socket
+import time
+import uuid
+
+import data_object
+import log
+import msi
+from config import config
+
+# Upper bounds of histogram buckets, e.g. in milliseconds or kilobytes.
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000]
+
+# Buffered events are written when there are this many.
+FLUSH_EVENTS = 100
+
+_host       = socket.gethostname()
+_counters   = {}
+_histograms = {}
+_pending    = []
+
+
+def enabled():
+    """Check whether metrics are written (see config.metrics_file and config.metrics_data_object)."""
+    return bool(config.metrics_file or config.metrics_data_object)
+
+
+class Histogram(object):
+    """Distribution of observed values, counted in BUCKETS."""
+
+    __slots__ = ['count', 'sum', 'min', 'max', 'buckets']
+
+    def __init__(self):
+        self.count   = 0
+        self.sum     = 0
+        self.min     = None
+        self.max     = None
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum   += value
+        self.min    = value if self.min is None else min(self.min, value)
+        self.max    = value if self.max is None else max(self.max, value)
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+
+    def as_dict(self):
+        """Get the histogram as a dict, with only the non-empty buckets ('le' bounds)."""
+        bounds = [str(x) for x in BUCKETS] + ['inf']
+        return {'count':   self.count,
+                'sum':     self.sum,
+                'min':     self.min,
+                'max':     self.max,
+                'buckets': {b: n for b, n in zip(bounds, self.buckets) if n}}
+
+
+def incr(name, n=1):
+    """Increment a counter.
+
+    :param name: Name of the counter
+    :param n:    Amount to add
+    """
+    if enabled():
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name, value):
+    """Add a value to a histogram.
+
+    :param name:  Name of the histogram
+    :param value: Observed value, e.g. a duration in milliseconds
+    """
+    if enabled():
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = Histogram()
+        h.observe(value)
+
+
+def _event(event, fields):
+    fields.update(event=event, time=round(time.time(), 3), host=_host, pid=os.getpid())
+    return fields
+
+
+def emit(ctx, event, **fields):
+    """Write an event, buffered until flush() or until FLUSH_EVENTS events are buffered.
+
+    :param ctx:    Combined type of a callback and rei struct
+    :param event:  Event type, e.g. 'phase'
+    :param fields: Event fields (JSON-compatible)
+    """
+    if not enabled():
+        return
+    _pending.append(_event(event, fields))
+    if len(_pending) >= FLUSH_EVENTS:
+        flush(ctx)
+
+
+def flush(ctx):
+    """Write the buffered events, and the counters and histograms as a 'metrics' event.
+
+    Counters and histograms are reset afterwards. Errors are logged: metrics
+    never cause a rule to fail.
+
+    :param ctx: Combined type of a callback and rei struct
+    """
+    if not enabled():
+        return
+
+    if _counters or _histograms:
+        _pending.append(_event('metrics', {'counters':   dict(_counters),
+                                           'histograms': {k: h.as_dict() for k, h in _histograms.items()}}))
+        _counters.clear()
+        _histograms.clear()
+
+    if not _pending:
+        return
+
+    lines = ''.join(json.dumps(e) + '\n' for e in _pending)
+    del _pending[:]
+
+    try:
+        if config.metrics_file:
+            _append_file(config.metrics_file, lines)
+        if config.metrics_data_object:
+            data_object.append(ctx, config.metrics_data_object, lines)
+    except (IOError, OSError, msi.Error) as e:
+        log._write(ctx, 'Could not write metrics: {}', e)
+
+
+def _append_file(path, lines):
+    """Append to a local file, rotating it first if it would grow too large."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+
+    if size and size + len(lines) > config.metrics_file_max_size:
+        _rotate(path, config.metrics_file_backups)
+
+    # Append in one write, so that lines of concurrent agents do not interleave.
+    with open(path, 'a') as f:
+        f.write(lines)
+
+
+def _rotate(path, backups):
+    """Rename path to path.1, path.1 to path.2, etc., keeping the given number of backups."""
+    try:
+        if backups < 1:
+            os.remove(path)
+            return
+        for i in range(backups - 1, 0, -1):
+            if os.path.exists('{}.{}'.format(path, i)):
+                os.rename('{}.{}'.format(path, i), '{}.{}'.format(path, i + 1))
+        os.rename(path, path + '.1')
+    except OSError:
+        # Another agent rotated the file at the same time.
+        pass
+
+
+class Job(object):
+    """Progress of a batch job: items and bytes processed and errors, per phase (see module documentation).
+
+    Use as a context manager; the job event is written at the end, with
+    status 'error' if the job ended with an exception or was marked as failed.
+    """
+
+    def __init__(self, ctx, name, **fields):
+        self.ctx    = ctx
+        self.name   = name
+        self.fields = fields
+        self.run    = uuid.uuid4().hex[:12]
+        self.items  = 0
+        self.bytes  = 0
+        self.errors = 0
+        self.failed = False  # set when the job gives up without an exception
+        self.start  = time.time()
+
+    def _emit(self, event, start, counts, **fields):
+        fields.update(self.fields)
+        emit(self.ctx, event,
+             job=self.name,
+             run=self.run,
+             items=self.items - counts[0],
+             bytes=self.bytes - counts[1],
+             errors=self.errors - counts[2],
+             duration=round(time.time() - start, 3),
+             **fields)
+
+    def phase(self, name):
+        """Get a context manager for a phase of the job, which writes an event for the phase at the end.
+
+        :param name: Name of the phase
+
+        :returns: Context manager
+        """
+        return _Phase(self, name)
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, typ, value, tb):
+        if typ is not None:
+            self.errors += 1
+        self._emit('job', self.start, (0, 0, 0), status='ok' if typ is None and not self.failed else 'error')
+        flush(self.ctx)
+
+
+class _Phase(object):
+    def __init__(self, job, name):
+        self.job  = job
+        self.name = name
+
+    def __enter__(self):
+        self.start  = time.time()
+        self.counts = (self.job.items, self.job.bytes, self.job.errors)
+        return self.job
+
+    def __exit__(self, typ, value, tb):
+        # The exception, if any, is counted as an error of the job.
+        self.job._emit('phase', self.start, self.counts,
+                       phase=self.name, status='ok' if typ is None and not self.job.failed else 'error')
+        flush(self.job.ctx)
+
+
+def job(ctx, name, **fields):
+    """Report the progress of a batch job (see module documentation).
+
+    :param ctx:    Combined type of a callback and rei struct
+    :param name:   Name of the job
+    :param fields: Extra fields for the events of the job, e.g. parameters
+
+    :returns: Job, to be used as a context manager
+    """
+    return Job(ctx, name, **fields)
@@ -9,7 +9,10 @@ all errors to unambiguous Python exceptions.
 __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
+import time
+
 import error
+import rule
 
 
 class Error(error.UUError):
@@ -35,10 +38,25 @@ class Error(error.UUError):
 
 # Machinery for wrapping microservices and creating microservice-specific exceptions. {{{
 
-def make(name, error_text):
-    """Create msi wrapper function and exception type as a tuple (see functions below)."""
+def make(name, error_text, modifies=()):
+    """Create msi wrapper function and exception type as a tuple (see functions below).
+
+    :param name:       Name of the microservice, without 'msi' prefix
+    :param error_text: Message of the exception raised on failure
+    :param modifies:   Indices of the msi arguments naming objects (paths, groups, ...)
+                       that the msi modifies, used to invalidate cached query results
+
+    :returns: Tuple of msi wrapper and exception type
+    """
     e = _make_exception(name, error_text)
-    return (_wrap('msi' + name, e), e)
+    return (_wrap('msi' + name, e, modifies), e)
+
+
+def _target(arg):
+    """Extract an object path or name from an msi argument (e.g. 'objPath=/a/b++++forceFlag=')."""
+    if not isinstance(arg, str):
+        return None
+    return arg.split('++++')[0].split('objPath=')[-1]
 
 
 def _run(msi, exception, *args):
@@ -59,7 +77,7 @@ def _run(msi, exception, *args):
     return ret
 
 
-def _wrap(msi, exception):
+def _wrap(msi, exception, modifies=()):
     """Wrap an MSI such that it throws an MSI-specific exception on failure.
 
     The arguments to the wrapper are the same as that of the msi, only with
@@ -70,10 +88,30 @@ def _wrap(msi, exception):
 
     :param msi:       MSI function to wrap
     :param exception: Exeption to throw on failure
+    :param modifies:  Indices of the msi arguments naming objects that the msi modifies
 
     :returns: MSI wrapper
     """
-    return lambda callback, *args: _run(getattr(callback, msi), exception, *args)
+    def wrapper(callback, *args):
+        if not isinstance(callback, rule.Context):
+            return _run(getattr(callback, msi), exception, *args)
+
+        # Call the msi on the bare callback, so that only the query cache
+        # entries for the modified objects are dropped (see rule.Context).
+        t = time.time()
+        try:
+            return _run(getattr(callback.callback, msi), exception, *args)
+        finally:
+            callback.query_stats.msi(msi, time.time() - t)
+            if msi not in rule.READ_ONLY_CALLS:
+                if modifies:
+                    for i in modifies:
+                        if i < len(args):
+                            callback.query_cache.invalidate(_target(args[i]))
+                else:
+                    callback.query_cache.invalidate()
+
+    return wrapper
 
 
 def _make_exception(name, message):
@@ -91,18 +129,19 @@ def _make_exception(name, message):
 # Note: there is no 'msi_' prefix:
 # When imported without '*', these msis are callable as msi.coll_create(), etc.
 
-data_obj_create, DataObjCreateError = make('DataObjCreate', 'Could not create data object')
+data_obj_create, DataObjCreateError = make('DataObjCreate', 'Could not create data object', modifies=[0])
 data_obj_open,   DataObjOpenError   = make('DataObjOpen',   'Could not open data object')
 data_obj_read,   DataObjReadError   = make('DataObjRead',   'Could not read data object')
 data_obj_write,  DataObjWriteError  = make('DataObjWrite',  'Could not write data object')
 data_obj_close,  DataObjCloseError  = make('DataObjClose',  'Could not close data object')
-data_obj_copy,   DataObjCopyError   = make('DataObjCopy',   'Could not copy data object')
-data_obj_unlink, DataObjUnlinkError = make('DataObjUnlink', 'Could not remove data object')
-data_obj_rename, DataObjRenameError = make('DataObjRename', 'Could not rename data object')
-coll_create,     CollCreateError    = make('CollCreate',    'Could not create collection')
-rm_coll,         RmCollError        = make('RmColl',        'Could not remove collection')
+data_obj_lseek,  DataObjLseekError  = make('DataObjLseek',  'Could not seek in data object')
+data_obj_copy,   DataObjCopyError   = make('DataObjCopy',   'Could not copy data object',   modifies=[1])
+data_obj_unlink, DataObjUnlinkError = make('DataObjUnlink', 'Could not remove data object', modifies=[0])
+data_obj_rename, DataObjRenameError = make('DataObjRename', 'Could not rename data object', modifies=[0, 1])
+coll_create,     CollCreateError    = make('CollCreate',    'Could not create collection',  modifies=[0])
+rm_coll,         RmCollError        = make('RmColl',        'Could not remove collection',  modifies=[0])
 check_access,    CheckAccessError   = make('CheckAccess',   'Could not check access')
-set_acl,         SetACLError        = make('SetACL',        'Could not set ACL')
+set_acl,         SetACLError        = make('SetACL',        'Could not set ACL',            modifies=[3])
 get_icat_time,   GetIcatTimeError   = make('GetIcatTime',   'Could not get Icat time')
 get_obj_type,    GetObjTypeError    = make('GetObjType',    'Could not get object type')
 
@@ -111,21 +150,23 @@ register_epic_pid, RegisterEpicPIDError = make('RegisterEpicPID', 'Could not reg
 string_2_key_val_pair, String2KeyValPairError = \
     make('String2KeyValPair', 'Could not create keyval pair')
 
+add_key_val, AddKeyValError = make('AddKeyVal', 'Could not add to keyval pair')
+
 set_key_value_pairs_to_obj, SetKeyValuePairsToObjError = \
-    make('SetKeyValuePairsToObj', 'Could not set metadata on object')
+    make('SetKeyValuePairsToObj', 'Could not set metadata on object', modifies=[1])
 
 associate_key_value_pairs_to_obj, AssociateKeyValuePairsToObjError = \
-    make('AssociateKeyValuePairsToObj', 'Could not associate metadata to object')
+    make('AssociateKeyValuePairsToObj', 'Could not associate metadata to object', modifies=[1])
 
 # :s/[A-Z]/_\L\0/g
 
 remove_key_value_pairs_from_obj, RemoveKeyValuePairsFromObjError = \
-    make('RemoveKeyValuePairsFromObj', 'Could not remove metadata from object')
+    make('RemoveKeyValuePairsFromObj', 'Could not remove metadata from object', modifies=[1])
 
-add_avu, AddAvuError = make('_add_avu', 'Could not add metadata to object')
-rmw_avu, RmwAvuError = make('_rmw_avu', 'Could not remove metadata to object')
+add_avu, AddAvuError = make('_add_avu', 'Could not add metadata to object',    modifies=[1])
+rmw_avu, RmwAvuError = make('_rmw_avu', 'Could not remove metadata to object', modifies=[1])
 
-sudo_obj_acl_set, SudoObjAclSetError = make('SudoObjAclSet', 'Could not set ACLs as admin')
+sudo_obj_acl_set, SudoObjAclSetError = make('SudoObjAclSet', 'Could not set ACLs as admin', modifies=[3])
 
 # Add new msis here as needed.
 
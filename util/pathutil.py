@@ -6,7 +6,7 @@
 __copyright__ = 'Copyright (c) 2019-2021, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import re
+from collections import namedtuple
 from enum import Enum
 
 import msi
@@ -39,6 +39,10 @@ class ObjectType(Enum):
         return '-d' if self is ObjectType.DATA else '-C'
 
 
+# Result of info().
+PathInfo = namedtuple('PathInfo', 'space zone group subpath')
+
+
 def chop(path):
     """Split off the rightmost path component of a path.
 
@@ -72,6 +76,19 @@ def chopext(path):
     return path.rsplit('.', 1)
 
 
+# Group name prefixes of spaces, by the part of the prefix up to the first '-'.
+_SPACES = {'vault':        ('vault-',        Space.VAULT),
+           'research':     ('research-',     Space.RESEARCH),
+           'datamanager':  ('datamanager-',  Space.DATAMANAGER),
+           'grp':          ('grp-intake-',   Space.INTAKE),
+           'datarequests': ('datarequests-', Space.DATAREQUEST)}
+
+# Results of info() for recently seen paths. Policies classify the same
+# few paths over and over.
+_recent = {}
+_RECENT_SIZE = 1024
+
+
 def info(path):
     """Parse a path into a (Space, zone, group, subpath) tuple.
 
@@ -95,34 +112,42 @@ def info(path):
 
     :param path: Path to parse
 
-    :returns: Tuple with space, zone, group and subpath
+    :returns: PathInfo tuple with space, zone, group and subpath
     """
-    # Turn empty match groups into empty strings.
-    def f(x):
-        return '' if x is None else x
-
-    def g(m, i):
-        return '' if i > len(m.groups()) else f(m.group(i))
-
-    def result(s, m):
-        return (s, g(m, 1), g(m, 2), g(m, 3))
-
-    # Try a pattern and report success if it matches.
-    def test(r, space):
-        m = re.match(r, path)
-        return m and result(space, m)
-
-    from collections import namedtuple
-
-    return (namedtuple('PathInfo', 'space zone group subpath'.split())
-            (*test('^/([^/]+)/home/(vault-[^/]+)(?:/(.+))?$',        Space.VAULT)
-            or test('^/([^/]+)/home/(research-[^/]+)(?:/(.+))?$',    Space.RESEARCH)
-            or test('^/([^/]+)/home/(datamanager-[^/]+)(?:/(.+))?$', Space.DATAMANAGER)
-            or test('^/([^/]+)/home/(grp-intake-[^/]+)(?:/(.+))?$',  Space.INTAKE)
-            or test('^/([^/]+)/home/(datarequests-[^/]+)(?:/(.+))?$', Space.DATAREQUEST)
-            or test('^/([^/]+)/home/([^/]+)(?:/(.+))?$',             Space.OTHER)
-            or test('^/([^/]+)()(?:/(.+))?$',                        Space.OTHER)
-            or (Space.OTHER, '', '', '')))  # (matches '/' and empty paths)
+    x = _recent.get(path)
+    if x is None:
+        if len(_recent) >= _RECENT_SIZE:
+            _recent.clear()
+        x = _recent[path] = _info(path)
+    return x
+
+
+def _info(path):
+    # '', zone, 'home', group, subpath
+    parts = path.split('/', 4)
+
+    if len(parts) < 2 or parts[0] != '' or parts[1] == '':
+        # (matches '/' and empty paths)
+        return PathInfo(Space.OTHER, '', '', '')
+
+    zone = parts[1]
+    if len(parts) == 2:
+        return PathInfo(Space.OTHER, zone, '', '')
+
+    if len(parts) > 3 and parts[2] == 'home' and parts[3] != '' and (len(parts) == 4 or parts[4] != ''):
+        group = parts[3]
+        space = Space.OTHER
+        prefix = _SPACES.get(group.split('-', 1)[0])
+        if prefix is not None and group.startswith(prefix[0]) and len(group) > len(prefix[0]):
+            space = prefix[1]
+        return PathInfo(space, zone, group, parts[4] if len(parts) == 5 else '')
+
+    # Anything else in the zone, e.g. /tempZone/yoda/x.
+    subpath = path[len(zone) + 2:]
+    if subpath == '':
+        # (trailing slash after the zone)
+        return PathInfo(Space.OTHER, '', '', '')
+    return PathInfo(Space.OTHER, zone, '', subpath)
 
 
 def object_type(ctx, path):
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Profiling of API calls, for analyzing slow calls afterwards.
+
+When config.profile_dir names a directory on the server, API calls listed
+in config.profile_apis, and 1 in config.profile_sample calls of any API,
+are run under cProfile. The profile of each call that takes at least
+config.profile_min_ms is written to the directory as
+'<api name>-<YYYYmmddTHHMMSS.mmm>-<pid>.prof', which can be analyzed with e.g.:
+
+    python2 -m pstats api_browse_folder-20210301T120000.123-1234.prof
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import cProfile
+import os
+import random
+import time
+
+import log
+from config import config
+
+# The profile currently running, if any: profiles cannot be nested.
+_active = None
+
+
+def start(name):
+    """Start profiling a call of an API, if enabled in the config.
+
+    :param name: Name of the API
+
+    :returns: The running profile, or None if this call is not profiled
+    """
+    global _active
+
+    if not config.profile_dir or _active is not None:
+        return None
+    if name not in config.profile_apis \
+       and not (config.profile_sample > 0 and random.randrange(config.profile_sample) == 0):
+        return None
+
+    _active = cProfile.Profile()
+    _active.enable()
+    return _active
+
+
+def finish(ctx, profile, name, t):
+    """Stop profiling an API call, and write the profile if the call took long enough.
+
+    :param ctx:     Combined type of a callback and rei struct
+    :param profile: Profile returned by start()
+    :param name:    Name of the API
+    :param t:       Duration of the call in seconds
+    """
+    global _active
+
+    profile.disable()
+    _active = None
+
+    if t * 1000 < config.profile_min_ms:
+        return
+
+    now  = time.time()
+    path = os.path.join(config.profile_dir,
+                        '{}-{}.{:03d}-{}.prof'.format(name, time.strftime('%Y%m%dT%H%M%S', time.localtime(now)),
+                                                      int(now * 1000) % 1000, os.getpid()))
+    try:
+        profile.dump_stats(path)
+    except (IOError, OSError) as e:
+        log._write(ctx, 'Could not write profile of <{}>: {}', name, e)
+        return
+
+    log._write(ctx, 'API <{}> took {}ms, profile written to {}', name, int(t * 1000), path)
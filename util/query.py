@@ -4,13 +4,28 @@
 __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-from collections import OrderedDict
+import base64
+import json
+import re
+import string
+import time
+from collections import namedtuple, OrderedDict
 from enum import Enum
 
 import irods_types
 
+import error
+import rule
+
 MAX_SQL_ROWS = 256
 
+# Upper bounds for the value lists generated by batch().
+# iRODS stores each condition value in a fixed-size buffer and expands 'in'
+# lists into bind variables, so keep both the length and the item count of a
+# single 'COLUMN in (...)' condition well below the server limits.
+MAX_IN_CLAUSE_LEN   = 1000
+MAX_IN_CLAUSE_ITEMS = 100
+
 
 class Option(object):
     """iRODS QueryInp option flags - used internally.
@@ -34,19 +49,27 @@ class OutputType(Enum):
     AS_DICT:  result rows are dicts of (column_name => value)
     AS_LIST:  result rows are lists of cells (ordered by input column list)
     AS_TUPLE: result rows are tuples of cells, or a single string if only one column is selected
+    AS_COLUMNS: results are batches of rows (as fetched from iRODS, up to 256
+                rows each), as lists of cells per column (ordered by input column list)
+    AS_NAMEDTUPLE: result rows are namedtuples, with fields named after the columns
 
     Note that when using AS_DICT, operations on columns (MAX, COUNT, ORDER, etc.)
     become part of the column name in the result.
+    With AS_NAMEDTUPLE they do not: the field for 'ORDER(DATA_NAME)' is 'DATA_NAME'.
     """
 
-    AS_DICT  = 0
-    AS_LIST  = 1
-    AS_TUPLE = 2
+    AS_DICT       = 0
+    AS_LIST       = 1
+    AS_TUPLE      = 2
+    AS_COLUMNS    = 3
+    AS_NAMEDTUPLE = 4
 
 
-AS_DICT  = OutputType.AS_DICT
-AS_LIST  = OutputType.AS_LIST
-AS_TUPLE = OutputType.AS_TUPLE
+AS_DICT       = OutputType.AS_DICT
+AS_LIST       = OutputType.AS_LIST
+AS_TUPLE      = OutputType.AS_TUPLE
+AS_COLUMNS    = OutputType.AS_COLUMNS
+AS_NAMEDTUPLE = OutputType.AS_NAMEDTUPLE
 
 
 class Query(object):
@@ -54,24 +77,71 @@ class Query(object):
 
     :param callback:       iRODS callback
     :param columns:        a list of SELECT column names, or columns as a comma-separated string.
-    :param condition:      (optional) where clause, as a string
-    :param output:         (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE
+    :param condition:      (optional) where clause, as a string, or a template if params are given
+    :param output:         (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE/AS_COLUMNS/AS_NAMEDTUPLE
     :param offset:         (optional) starting row (0-based), can be used for pagination
     :param limit:          (optional) maximum amount of results, can be used for pagination
     :param case_sensitive: (optional) set this to False to make the entire where-clause case insensitive
     :param options:        (optional) other OR-ed options to pass to the query (see the Option type above)
+    :param cache:          (optional) reuse results of identical queries within the same rule invocation
+    :param after:          (optional) cursor returned by cursor() of a previous query, for keyset pagination
+    :param params:         (optional) dict of values for the named parameters in the condition template
 
     Getting the total row count:
 
       Use q.total_rows() to get the total number of results matching the query
       (without taking offset/limit into account).
 
+    Keyset pagination:
+
+      With a non-zero offset, iRODS has to skip over all preceding rows,
+      making deep pages increasingly expensive.
+      Instead, q.cursor() returns an opaque cursor pointing after the last
+      row that was retrieved. Passing it as 'after' to an otherwise identical
+      query continues from there, using a condition on the first ORDER or
+      ORDER_DESC column rather than an offset.
+      Rows with equal values in that column are skipped by count, so they
+      should have a deterministic order (e.g. by ordering on a second column).
+      The same goes for values containing a single quote, which cannot be
+      used in the condition. Cursors cannot be used in case insensitive
+      queries, since iRODS orders on the original values.
+      Note that total_rows() of such a query only counts the remaining rows.
+
     Output types:
 
       AS_LIST and AS_DICT behave the same as in row_iterator.
       AS_TUPLE produces a tuple, similar to AS_LIST, with the exception that
       for queries on single columns, each result is returned as a string
       instead of a 1-element tuple.
+      AS_COLUMNS produces one result per batch of rows fetched from iRODS,
+      as a list of lists of cells (one per column). This avoids creating an
+      object for every row, which is useful when aggregating over large
+      results (e.g. sum(int(x) for x in sizes) for every batch).
+      AS_NAMEDTUPLE produces namedtuples, which are as cheap as tuples, but
+      also allow accessing cells by column name (x.DATA_NAME). Function
+      wrappers are removed from the field names, and queries on the same
+      columns share a single row type.
+
+    Condition templates:
+
+      With params, the condition is a template with named parameters in
+      braces, e.g. "COLL_NAME = {coll} AND DATA_NAME like {name}". Values
+      are quoted when substituted (lists and tuples become a parenthesized
+      list for 'in' conditions), so templates must not quote parameters
+      themselves. Values containing a single quote cannot be expressed in a
+      genquery and raise UUQueryParameterError.
+      Templates are parsed once and reused, so hot loops can keep their
+      conditions in constants and only pass new values.
+
+    Caching:
+
+      With cache=True, and a rule.Context as callback, results are kept for
+      the rest of the rule invocation and shared by identical queries.
+      Cached results are dropped when the objects named in the conditions
+      are modified through util functions or msi wrappers, or when any
+      other rule is called through the Context.
+      Only use this for queries with small results that are repeated often
+      (e.g. existence checks, user types).
 
     Examples:
 
@@ -107,7 +177,10 @@ class Query(object):
                  offset=0,
                  limit=None,
                  case_sensitive=True,
-                 options=0):
+                 options=0,
+                 cache=False,
+                 after=None,
+                 params=None):
 
         self.callback = callback
 
@@ -124,8 +197,28 @@ class Query(object):
         self.offset     = offset
         self.limit      = limit
         self.options    = options
+        self.cache      = cache and isinstance(callback, rule.Context)
+
+        # Names of the objects the conditions refer to, for cache invalidation.
+        self._names = None
+
+        if params is not None:
+            self.conditions = render(conditions, params)
+            self._names     = [x.rstrip('%').rstrip('/') for x in _values(params.values())]
+
+        assert self.output in (AS_TUPLE, AS_LIST, AS_DICT, AS_COLUMNS, AS_NAMEDTUPLE)
+        assert self.output != AS_COLUMNS or after is None
+
+        if self.output == AS_NAMEDTUPLE:
+            self._row_type = row_type(columns)
 
-        assert self.output in (AS_TUPLE, AS_LIST, AS_DICT)
+        # Keyset pagination state: index of the key column, and the last key
+        # value seen together with the amount of rows that had that value.
+        self._key_i     = _order_column(columns)
+        self._key_value = None
+        self._key_count = 0
+        self._skip      = 0
+        self._skipped   = 0
 
         if not case_sensitive:
             # Uppercase the entire condition string. Should cause no problems,
@@ -133,10 +226,35 @@ class Query(object):
             self.options   |= Option.UPPER_CASE_WHERE
             self.conditions = self.conditions.upper()
 
+        if after is not None:
+            assert self.offset == 0
+            if not case_sensitive:
+                # The keyset condition would compare uppercased values,
+                # while rows are ordered on the original values.
+                raise ValueError('Query cursors cannot be used in case insensitive queries')
+
+            column, value, count = _decode_cursor(after)
+            if self._key_i is None or _strip_function(columns[self._key_i]) != column:
+                raise ValueError('Query cursor does not match the ordered column')
+
+            if value is not None:
+                op = '<=' if columns[self._key_i].upper().startswith('ORDER_DESC(') else '>='
+                keyset = '{} {} {}'.format(column, op, quote(value))
+                self.conditions = keyset + ' AND ' + self.conditions if self.conditions else keyset
+
+            # Skip the rows from the key value onwards that were already returned.
+            self._key_value = value
+            self._key_count = count
+            self._skip      = count
+            self._skipped   = count
+
         self.gqi = None  # genquery inp
         self.gqo = None  # genquery out
         self.cti = None  # continue index
 
+        # Set when only the first result is needed (see first()).
+        self._single = False
+
         # Filled when calling total_rows() on the Query.
         self._total = None
 
@@ -150,26 +268,30 @@ class Query(object):
                                                  irods_types.GenQueryInp())['arguments'][2]
         if self.offset > 0:
             self.gqi.rowOffset = self.offset
-        else:
+        elif not self._single:
             # If offset is 0, we can (relatively) cheaply let iRODS count rows.
             # - with non-zero offset, the query must be executed twice if the
             #   row count is needed (see total_rows()).
             self.options |= Option.RETURN_TOTAL_ROW_COUNT
 
-        if self.limit is not None and self.limit < MAX_SQL_ROWS - 1:
-            # We try to limit the amount of rows we pull in, however in order
-            # to close the query, 256 more rows will (if available) be fetched
-            # regardless.
-            self.gqi.maxRows = self.limit
+        if self.limit is not None and self.limit + self._skip < MAX_SQL_ROWS - 1:
+            # We try to limit the amount of rows we pull in.
+            self.gqi.maxRows = self.limit + self._skip
+            # All requested rows arrive in the first batch, so let iRODS
+            # close the statement right after it instead of fetching another
+            # batch in _close().
+            self.options |= Option.AUTO_CLOSE
 
         self.gqi.options |= self.options
 
         import log
         log._debug(self.callback, self)
 
+        t = time.time()
         self.gqo    = self.callback.msiExecGenQuery(self.gqi, irods_types.GenQueryOut())['arguments'][1]
         self.cti    = self.gqo.continueInx
         self._total = None
+        self._record(t, executed=True)
 
     def total_rows(self):
         """Return the total amount of rows matching the query.
@@ -182,7 +304,8 @@ class Query(object):
             if self.offset == 0 and self.options & Option.RETURN_TOTAL_ROW_COUNT:
                 # Easy mode: Extract row count from gqo.
                 self.exec_if_not_yet_execed()
-                self._total = self.gqo.totalRowCount
+                # (rows skipped due to a cursor were already returned on a previous page)
+                self._total = self.gqo.totalRowCount - self._skipped
             else:
                 # Hard mode: for some reason, using PostgreSQL, you cannot get
                 # the total row count when an offset is supplied.
@@ -194,11 +317,72 @@ class Query(object):
                 # perform only slightly worse.
                 # [1]: https://github.com/irods/irods/blob/4.2.6/plugins/database/src/general_query.cpp#L2393
                 self._total = Query(self.callback, self.columns, self.conditions, limit=0,
-                                    options=self.options | Option.RETURN_TOTAL_ROW_COUNT).total_rows()
+                                    options=self.options | Option.RETURN_TOTAL_ROW_COUNT).total_rows() \
+                    - self._skipped
 
         return self._total
 
+    def _cache_key(self):
+        return (tuple(self.columns), self.conditions, self.output, self.offset, self.limit, self.options)
+
     def __iter__(self):
+        if not self.cache:
+            return self._iter()
+
+        cache = self.callback.query_cache
+        key   = self._cache_key()
+        rows  = cache.get(key)
+
+        if rows is None:
+            rows = list(self._iter())
+            names = self._names
+            if names is None:
+                names = [x.rstrip('%').rstrip('/') for x in re.findall(r"'([^']*)'", self.conditions)]
+            cache.put(key, rows, names)
+
+        # Do not hand out the cached (mutable) rows themselves.
+        if self.output == AS_LIST:
+            return (list(x) for x in rows)
+        elif self.output == AS_DICT:
+            return (OrderedDict(x) for x in rows)
+        elif self.output == AS_COLUMNS:
+            return ([list(c) for c in x] for x in rows)
+        else:
+            return iter(rows)
+
+    def _iter(self):
+        if self.output == AS_COLUMNS:
+            return self._iter_columns()
+        return self._iter_rows()
+
+    def _iter_columns(self):
+        """Yield batches of rows as lists of cells per column."""
+        self.exec_if_not_yet_execed()
+
+        row_i = 0
+
+        while True:
+            try:
+                n = self.gqo.rowCnt
+                if self.limit is not None:
+                    n = max(0, min(n, self.limit - row_i))
+
+                if n > 0:
+                    row_i += n
+                    yield [[c.row(r) for r in range(n)]
+                           for c in (self.gqo.sqlResult[i] for i in range(len(self.columns)))]
+
+            except GeneratorExit:
+                self._close()
+                return
+
+            if self.cti <= 0 or self.limit is not None and row_i >= self.limit:
+                self._close()
+                return
+
+            self._fetch()
+
+    def _iter_rows(self):
         self.exec_if_not_yet_execed()
 
         row_i = 0
@@ -213,12 +397,31 @@ class Query(object):
                         return
 
                     row = [self.gqo.sqlResult[c].row(r) for c in range(len(self.columns))]
+
+                    if self._key_i is not None:
+                        if self._skip > 0:
+                            # Already returned on a previous page.
+                            self._skip -= 1
+                            continue
+
+                        key = row[self._key_i]
+                        if key == self._key_value or "'" in key:
+                            # Values containing a quote cannot be used in the
+                            # keyset condition (see quote()), so these rows
+                            # are skipped by count from the previous value.
+                            self._key_count += 1
+                        else:
+                            self._key_value = key
+                            self._key_count = 1
+
                     row_i += 1
 
                     if self.output == AS_TUPLE:
                         yield row[0] if len(self.columns) == 1 else tuple(row)
                     elif self.output == AS_LIST:
                         yield row
+                    elif self.output == AS_NAMEDTUPLE:
+                        yield self._row_type._make(row)
                     else:
                         yield OrderedDict(zip(self.columns, row))
 
@@ -234,9 +437,16 @@ class Query(object):
 
     def _fetch(self):
         """Fetch the next batch of results."""
+        t        = time.time()
         ret      = self.callback.msiGetMoreRows(self.gqi, self.gqo, 0)
         self.gqo = ret['arguments'][1]
         self.cti = ret['arguments'][2]
+        self._record(t)
+
+    def _record(self, t, executed=False):
+        """Add the page that was fetched since time t to the statistics of the Context."""
+        if isinstance(self.callback, rule.Context):
+            self.callback.query_stats.page(self, time.time() - t, self.gqo.rowCnt, executed)
 
     def _close(self):
         """Close the query (prevents filling the statement table)."""
@@ -246,8 +456,10 @@ class Query(object):
         # msiCloseGenQuery fails with internal errors.
         # Close the query using msiGetMoreRows instead.
         # This is less than ideal, because it may fetch 256 more rows
-        # (gqi.maxRows is overwritten) resulting in unnecessary processing
-        # work. However there appears to be no other way to close the query.
+        # (msiGetMoreRows overwrites gqi.maxRows, so a smaller batch cannot
+        # be requested) resulting in unnecessary processing work.
+        # Queries that know they need only one batch avoid this round trip
+        # altogether by setting AUTO_CLOSE when executing (see first()).
 
         while self.cti > 0:
             # Close query immediately after getting the next batch.
@@ -260,12 +472,60 @@ class Query(object):
         self.gqo = None
         self.cti = None
 
+    def cursor(self):
+        """Get an opaque cursor pointing after the last row retrieved so far.
+
+        Pass it to a new Query as 'after' to continue from that row (see
+        keyset pagination above).
+
+        :returns: Cursor string, or None if no rows have been retrieved
+        """
+        if self._key_i is None:
+            raise ValueError('Query cursors require an ORDER or ORDER_DESC column')
+        if self._key_count == 0:
+            return None
+        return _encode_cursor(_strip_function(self.columns[self._key_i]), self._key_value, self._key_count)
+
     def first(self):
-        """Get exactly one result (or None if no results are available)."""
+        """Get exactly one result (or None if no results are available).
+
+        If the query was not executed yet, only one row is requested, and
+        iRODS closes the statement right away, so no extra round trip is
+        needed to close it.
+        """
+        if self.gqi is None and self._skip == 0 and self.limit != 0:
+            self.limit    = 1
+            self._single  = True
+            self.options |= Option.AUTO_CLOSE
+
         for x in self:
             self._close()
             return x
 
+    def exists(self):
+        """Check whether the query has any results, using a single round trip.
+
+        :returns: Boolean indicating if any rows match the query
+        """
+        return self.first() is not None
+
+    def scalar(self):
+        """Get the first cell of the first result, using a single round trip.
+
+        :returns: Value of the first selected column of the first row (or None if there are no results)
+        """
+        x = self.first()
+        if x is None:
+            return None
+        elif self.output == AS_COLUMNS:
+            return x[0][0] if x[0] else None
+        elif self.output == AS_DICT:
+            return next(iter(x.values()))
+        elif self.output == AS_TUPLE and len(self.columns) == 1:
+            return x
+        else:
+            return x[0]
+
     def __str__(self):
         return 'Query(select {}{}{}{})'.format(', '.join(self.columns),
                                                ' where ' + self.conditions if self.conditions else '',
@@ -275,3 +535,216 @@ class Query(object):
     def __del__(self):
         """Auto-close query on when Query goes out of scope."""
         self._close()
+
+
+_row_types = {}
+
+
+def row_type(columns):
+    """Get the namedtuple type used for rows of AS_NAMEDTUPLE queries on the given columns.
+
+    :param columns: a list of SELECT column names
+
+    :returns: namedtuple type with fields named after the columns, without function wrappers
+    """
+    key = tuple(columns)
+    if key not in _row_types:
+        # Duplicate names (e.g. 'COLL_NAME, MAX(COLL_NAME)') are replaced by positional names.
+        _row_types[key] = namedtuple('Row', [_strip_function(x) for x in columns], rename=True)
+    return _row_types[key]
+
+
+def _strip_function(column):
+    """Remove ORDER/MIN/etc. wrappers from a column name."""
+    return re.sub(r'.*\((.*)\)', r'\1', column)
+
+
+def _order_column(columns):
+    """Find the index of the first ORDER/ORDER_DESC column, or None."""
+    for i, column in enumerate(columns):
+        if column.upper().startswith('ORDER'):
+            return i
+
+
+def _encode_cursor(column, value, count):
+    """Encode a (column, value, count) tuple into a cursor (see Query.cursor())."""
+    return base64.urlsafe_b64encode(json.dumps([column, value, count]))
+
+
+def _decode_cursor(cursor):
+    """Decode a cursor created by Query.cursor() into a (column, value, count) tuple."""
+    try:
+        column, value, count = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        return str(column), None if value is None else value.encode('utf-8'), int(count)
+    except (TypeError, ValueError, AttributeError, UnicodeError):
+        raise ValueError('Invalid query cursor')
+
+
+# Parsed condition templates: template -> list of (literal text, parameter name).
+_templates = {}
+
+
+def _compile(template):
+    """Parse a condition template (once) into literal text and parameter names."""
+    parts = _templates.get(template)
+    if parts is None:
+        parts = []
+        for literal, name, spec, conversion in string.Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError('Format specs are not supported in condition templates: ' + template)
+            parts.append((literal, name))
+        _templates[template] = parts
+
+    return parts
+
+
+def _values(values):
+    """Flatten parameter values (lists become their items) into strings."""
+    for v in values:
+        if isinstance(v, (list, tuple, set, frozenset)):
+            for x in _values(v):
+                yield x
+        elif isinstance(v, unicode):
+            yield v.encode('utf-8')
+        else:
+            yield str(v)
+
+
+def quote(value):
+    """Quote a value for use in a genquery condition.
+
+    Lists, tuples and sets are quoted as a parenthesized list of values,
+    for use with 'in'.
+
+    :param value: String, number or list of these
+
+    :returns: Quoted value
+
+    :raises UUQueryParameterError: If the value contains a single quote
+    """
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return '({})'.format(', '.join(quote(v) for v in value))
+
+    [value] = _values([value])
+    if "'" in value:
+        raise error.UUQueryParameterError('Value cannot be used in a query: {}'.format(value))
+
+    return "'{}'".format(value)
+
+
+def render(template, params):
+    """Substitute parameters into a condition template.
+
+    Example:
+
+        render("COLL_NAME = {coll} AND DATA_ID in {ids}", {'coll': '/a', 'ids': ['1', '2']})
+        # => "COLL_NAME = '/a' AND DATA_ID in ('1', '2')"
+
+    :param template: Condition with named parameters in braces
+    :param params:   Dict of parameter name => value
+
+    :returns: Condition string
+    """
+    try:
+        return ''.join(literal if name is None else literal + quote(params[name])
+                       for literal, name in _compile(template))
+    except KeyError as e:
+        raise ValueError('Missing query parameter {} for condition: {}'.format(e, template))
+
+
+def _chunks(values, max_len=MAX_IN_CLAUSE_LEN, max_items=MAX_IN_CLAUSE_ITEMS):
+    """Split values into lists that each fit in a single 'in' condition."""
+    chunk = []
+    size  = 0
+    for v in values:
+        # Each item takes the value plus quotes and a ", " separator.
+        item_len = len(v) + 4
+        if chunk and (size + item_len > max_len or len(chunk) >= max_items):
+            yield chunk
+            chunk = []
+            size  = 0
+        chunk.append(v)
+        size += item_len
+    if chunk:
+        yield chunk
+
+
+def batch(callback,
+          key,
+          values,
+          columns,
+          conditions='',
+          output=AS_TUPLE,
+          case_sensitive=True,
+          options=0,
+          params=None):
+    """Look up rows for many values of a key column, using as few queries as possible.
+
+    This replaces the pattern of running one query per row of a previous
+    query. The values are split into chunks that each fit into a single
+    'KEY in (...)' condition, which is combined with the given conditions.
+
+    :param callback:       iRODS callback
+    :param key:            Column to look up values of (e.g. 'DATA_ID')
+    :param values:         Iterable of key values to look up
+    :param columns:        a list of SELECT column names, or columns as a comma-separated string.
+    :param conditions:     (optional) additional where clause, as a string
+    :param output:         (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE
+    :param case_sensitive: (optional) set this to False to make the entire where-clause case insensitive
+    :param options:        (optional) other OR-ed options to pass to the query (see the Option type above)
+    :param params:         (optional) dict of values for the named parameters in conditions (see Query)
+
+    The key column is selected in addition to the given columns, but is not
+    part of the returned rows.
+
+    Example:
+
+        # Get the original modify time of a list of revisions.
+        times = batch(ctx, 'DATA_ID', data_ids, 'META_DATA_ATTR_VALUE',
+                      "META_DATA_ATTR_NAME = 'org_original_modify_time'")
+        for data_id in data_ids:
+            print('{}: {}'.format(data_id, times[data_id]))
+
+    :returns: OrderedDict of key value => list of rows, containing every given key value
+    """
+    if type(columns) is str:
+        columns = [x.strip() for x in columns.split(',')]
+
+    assert output in (AS_TUPLE, AS_LIST, AS_DICT)
+
+    if params is not None:
+        conditions = render(conditions, params)
+
+    # Deduplicate, keeping the order of the input.
+    result = OrderedDict((v, []) for v in values)
+
+    for chunk in _chunks(list(result)):
+        in_clause = "{} in {}".format(key, quote(chunk))
+        where     = in_clause + ' AND ' + conditions if conditions else in_clause
+
+        for row in Query(callback, [key] + columns, where, output=AS_LIST,
+                         case_sensitive=case_sensitive, options=options):
+            k, row = row[0], row[1:]
+
+            if output == AS_TUPLE:
+                row = row[0] if len(columns) == 1 else tuple(row)
+            elif output == AS_DICT:
+                row = OrderedDict(zip(columns, row))
+
+            # Case-insensitive queries may return keys in a different case.
+            result.setdefault(k, []).append(row)
+
+    return result
+
+
+def invalidate(ctx, name=None):
+    """Drop cached query results referring to a name (e.g. a path) from the request-scoped cache.
+
+    Functions that modify iRODS objects should call this, unless they use msi
+    wrappers, which invalidate cached results for the objects they modify.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param name: Path or name of the modified object (all cached results are dropped if None)
+    """
+    if isinstance(ctx, rule.Context):
+        ctx.query_cache.invalidate(name)
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Recording of the iRODS traffic of API calls, for replaying them offline.
+
+When config.query_record names a file, API calls are run with a Recorder
+in front of the rule engine callback. The Recorder passes every call
+through, and keeps the genqueries with their result pages and the other
+microservice and rule calls with their results. After the call, the
+recording is appended as one JSON line to the file:
+
+    {"api": "api_browse_folder", "module": "browse", "time": 1612345678, "ms": 153,
+     "user": {"user_name": "researcher", "irods_zone": "tempZone"},
+     "input": {"coll": "/tempZone/home/research-a"},
+     "calls": [{"msi": "msiExecGenQuery", "select": "...", "where": "...",
+                "options": 32, "max_rows": 256, "offset": 0,
+                "statement": 1, "total": 300, "rows": [[...], ...]},
+               {"msi": "msiGetMoreRows", "statement": 1, "next": 0, ...},
+               {"msi": "msiDataObjOpen", "args": [...], "status": true,
+                "code": 0, "out": [...]}]}
+
+Only calls slower than config.query_record_min_ms are written, so that the
+recording can stay enabled to catch slow requests.
+
+With config.query_record_anonymize, names of users, groups, collections
+and data objects are replaced by hashes in the input (including the key
+values in pagination cursors), query conditions, results and call
+arguments, and data object contents are not recorded.
+Name prefixes that the ruleset depends on (e.g. 'research-') and file
+extensions are kept, so that the code paths and the derived queries of a
+replay are the same. Other AVU values are kept as they are.
+
+Recordings can be replayed with tests/benchmark/replay.py.
+"""
+
+__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import hashlib
+import json
+import os
+import re
+import time
+
+import log
+import query
+import rule
+from config import config
+
+# Genquery columns that contain paths and names.
+PATH_COLUMNS = set(['COLL_NAME', 'COLL_PARENT_NAME', 'DATA_PATH'])
+NAME_COLUMNS = set(['DATA_NAME', 'USER_NAME', 'USER_GROUP_NAME', 'DATA_OWNER_NAME', 'COLL_OWNER_NAME',
+                    'DATA_ACCESS_USER_NAME', 'COLL_ACCESS_USER_NAME'])
+
+# API input fields that contain names (paths are recognized by their leading slash).
+NAME_INPUTS = set(['search_string', 'group_name', 'user_name', 'username'])
+
+# API input fields that contain pagination cursors (see browse.keyset_page).
+CURSOR_INPUTS = set(['cursor'])
+
+# Names and name prefixes with a meaning to the ruleset.
+KEEP_NAMES    = set(['home', 'yoda', 'revisions', 'schemas', 'public', 'rods', 'trash',
+                     'yoda-metadata.json', 'yoda-metadata.xml', 'metadata.json', 'uischema.json',
+                     'original', 'datarequests-research'])
+KEEP_PREFIXES = ['research-', 'vault-', 'datamanager-', 'grp-intake-', 'grp-datamanager-',
+                 'intake-', 'grp-', 'priv-', 'read-', 'deposit-']
+
+# Random per agent process: anonymized names cannot be traced back.
+_salt = os.urandom(16)
+
+# A column compared to literals, with any genquery operator. 'between' takes two literals.
+_condition = re.compile(r"(\w+)(\s+(?:not\s+)?(?:like|in|between)\s+|\s+(?:begin_of|parent_of)\s+"
+                        r"|\s*(?:<>|!=|<=|>=|=|<|>)\s*)(\([^)]*\)|'[^']*'(?:\s+'[^']*')?)", re.IGNORECASE)
+_literal   = re.compile(r"'([^']*)'")
+
+
+def _hash(s):
+    # Case-insensitive, so that uppercased conditions of case-insensitive
+    # queries match the uppercased anonymized names (see Recorder).
+    return 'x' + hashlib.sha1(_salt + s.lower()).hexdigest()[:10]
+
+
+def _name(s):
+    """Anonymize a single name, keeping meaningful prefixes, extensions and wildcards."""
+    if s == '' or s.lower() in KEEP_NAMES or s.isdigit():
+        return s
+    if '%' in s:
+        return '%'.join(_name(x) for x in s.split('%'))
+
+    prefix = next((s[:len(p)] for p in KEEP_PREFIXES if s.lower().startswith(p)), '')
+    rest, dot, ext = s[len(prefix):].rpartition('.')
+    if not dot or not rest:
+        rest, dot, ext = s[len(prefix):], '', ''
+    return prefix + _hash(rest) + dot + ext
+
+
+def _path(s):
+    """Anonymize the components of a path, except for the zone."""
+    return '/'.join(x if i < 2 else _name(x) for i, x in enumerate(s.split('/')))
+
+
+def anonymize(column, value):
+    """Anonymize a value of a genquery column, or a path or name in another value."""
+    if not isinstance(value, basestring):
+        return value
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    if column in PATH_COLUMNS or value.startswith('/'):
+        return _path(value)
+    if column in NAME_COLUMNS:
+        name, zone, rest = value.partition('#')
+        return _name(name) + zone + rest
+    return value
+
+
+def anonymize_conditions(conditions):
+    """Anonymize the literals compared to path and name columns in genquery conditions."""
+    def replace(m):
+        column = m.group(1).upper()
+        values = _literal.sub(lambda v: "'{}'".format(anonymize(column, v.group(1))), m.group(3))
+        return m.group(1) + m.group(2) + values
+    return _condition.sub(replace, conditions)
+
+
+def anonymize_cursor(cursor):
+    """Anonymize the key value in a pagination cursor ('<query index>:<query cursor>', see query.Query.cursor)."""
+    i, sep, after = cursor.partition(':') if isinstance(cursor, basestring) else ('', '', '')
+    try:
+        column, value, count = query._decode_cursor(after)
+    except ValueError:
+        return None
+    return i + sep + query._encode_cursor(column, anonymize(column, value), count)
+
+
+def _value(x, anonymized):
+    """Convert a call argument to JSON, if it is a simple type or buffer."""
+    if isinstance(x, (bool, int, long, float)) or x is None:
+        return x
+    if isinstance(x, basestring):
+        return anonymize(None, x) if anonymized else x
+    if hasattr(x, 'buf') and hasattr(x, 'len'):
+        return {'buf': None if anonymized else ''.join(x.buf[:x.len])}
+    return None
+
+
+def _rows(gqo):
+    return [[gqo.sqlResult[c].row(r) for c in range(gqo.attriCnt)] for r in range(gqo.rowCnt)]
+
+
+class Recorder(object):
+    """Rule engine callback that records all calls made through it (see module documentation)."""
+
+    def __init__(self, callback, anonymized=False):
+        self.callback   = callback
+        self.anonymized = anonymized
+        self.calls      = []
+        self._queries   = {}  # id(genquery inp) -> (select, where)
+
+    def __getattr__(self, name):
+        f = getattr(self.callback, name)
+        if name in ('writeLine', 'writeString'):
+            return f
+
+        def call(*args):
+            try:
+                ret = f(*args)
+            except RuntimeError as e:
+                self.calls.append({'msi': name, 'args': self._values(args), 'error': str(e)})
+                raise
+            self._record(name, args, ret)
+            return ret
+        return call
+
+    def _values(self, xs):
+        return [_value(x, self.anonymized) for x in xs]
+
+    def _rows(self, columns, gqo):
+        rows = _rows(gqo)
+        if self.anonymized:
+            rows = [[anonymize(c, x) for c, x in zip(columns, row)] for row in rows]
+        return rows
+
+    def _record(self, name, args, ret):
+        out = ret['arguments']
+
+        if name == 'msiMakeGenQuery':
+            select, where = args[0], args[1]
+            if self.anonymized:
+                where = anonymize_conditions(where)
+            self._queries[id(out[2])] = (select, where)
+            return
+
+        if name in ('msiExecGenQuery', 'msiGetMoreRows'):
+            gqi, gqo = out[0], out[1]
+            select, where = self._queries.get(id(args[0]), ('', ''))
+            columns = [x.strip() for x in select.split(',')]
+            # Strip column functions, e.g. ORDER(COLL_NAME).
+            columns = [re.sub(r'^\w+\((\w+)\)$', r'\1', x) for x in columns]
+
+            if gqi.options & query.Option.UPPER_CASE_WHERE:
+                where = where.upper()
+
+            event = {'msi':      name,
+                     'options':  gqi.options,
+                     'max_rows': gqi.maxRows,
+                     'rows':     self._rows(columns, gqo)}
+            if name == 'msiExecGenQuery':
+                event.update(select=select, where=where, offset=gqi.rowOffset,
+                             statement=gqo.continueInx, total=gqo.totalRowCount)
+            else:
+                event.update(statement=args[1].continueInx, next=gqo.continueInx)
+            self.calls.append(event)
+            return
+
+        self.calls.append({'msi':    name,
+                           'args':   self._values(args),
+                           'status': ret['status'],
+                           'code':   ret['code'],
+                           'out':    self._values(out)})
+
+    def recording(self, f, data, client, t):
+        """Get the recording of a call of API function f as a JSON-compatible dict."""
+        user = {'user_name': client['user_name'], 'irods_zone': client['irods_zone']}
+        if self.anonymized:
+            user['user_name'] = anonymize('USER_NAME', user['user_name'])
+            data = {k: anonymize_cursor(v) if k in CURSOR_INPUTS and v
+                    else anonymize('USER_NAME', v) if k in NAME_INPUTS
+                    else anonymize(None, v)
+                    for k, v in data.items()}
+        return {'api':    f.__name__,
+                'module': f.__module__.split('.', 1)[-1],
+                'time':   int(time.time()),
+                'ms':     int(t * 1000),
+                'user':   user,
+                'input':  data,
+                'calls':  self.calls}
+
+
+def start(ctx):
+    """Start recording the calls of an API call on a rule.Context, if enabled in the config.
+
+    :param ctx: Combined type of a callback and rei struct
+
+    :returns: The Recorder, or None if recording is disabled
+    """
+    if not config.query_record or not isinstance(ctx, rule.Context):
+        return None
+    if isinstance(ctx.callback, Recorder):
+        # Already recording, e.g. the API calls of an api_batch call.
+        return None
+
+    # Replays start without cached lookups (see cache.py), so the recording
+    # must include the queries for them. Only this call skips the caches,
+    # other calls in the agent keep using them.
+    ctx.cache_bypass = True
+
+    ctx.callback = Recorder(ctx.callback, config.query_record_anonymize)
+    return ctx.callback
+
+
+def finish(ctx, recorder, f, data, t):
+    """Stop recording an API call, and append its recording to the file if it took long enough.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param recorder: Recorder returned by start()
+    :param f:        The API function
+    :param data:     API input
+    :param t:        Duration of the call in seconds
+    """
+    ctx.callback     = recorder.callback
+    ctx.cache_bypass = False
+
+    if t * 1000 < config.query_record_min_ms:
+        return
+
+    client = ctx.session_map()['client_user']
+    line   = json.dumps(recorder.recording(f, data, client, t))
+
+    # Append in one write, so that lines of concurrent agents do not interleave.
+    try:
+        with open(config.query_record, 'a') as out:
+            out.write(line + '\n')
+    except IOError as e:
+        log._write(ctx, 'Could not write recording of <{}>: {}'.format(f.__name__, e))
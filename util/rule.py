@@ -4,30 +4,238 @@
 __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
+import heapq
 import json
+import time
 from enum import Enum
 
+import session_vars
+
+
+# Rule engine calls that do not modify iRODS state.
+# Calling any other rule or microservice through a Context drops its query cache.
+READ_ONLY_CALLS = frozenset(['msiMakeGenQuery',
+                             'msiExecGenQuery',
+                             'msiGetMoreRows',
+                             'msiCloseGenQuery',
+                             'msiString2KeyValPair',
+                             'msiAddKeyVal',
+                             'msiCheckAccess',
+                             'msiGetObjType',
+                             'msiGetIcatTime',
+                             'msiDataObjOpen',
+                             'msiDataObjRead',
+                             'msiDataObjClose',
+                             'uuGroupGetCategory',
+                             'writeLine',
+                             'writeString'])
+
+
+class QueryCache(object):
+    """Request-scoped cache of genquery results.
+
+    Entries are tagged with the string literals from the query conditions
+    (collection paths, data object names, group names, etc.), so that they
+    can be dropped when the object they refer to is modified.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Get cached rows for a query key, or None if not cached."""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def put(self, key, rows, names):
+        """Cache rows for a query key, tagged with the names the query refers to."""
+        self._entries[key] = (rows, frozenset(x.lower() for x in names))
+
+    def invalidate(self, name=None):
+        """Drop cached results referring to a name (e.g. a path), or all results if no name is given.
+
+        For paths, results referring to parents or children of the path are dropped as well.
+        """
+        if name is None:
+            self._entries.clear()
+            return
+
+        name = name.lower().rstrip('/')
+
+        def affected(x):
+            return x == name or (name.startswith('/') and x.startswith('/')
+                                 and (x.startswith(name + '/') or name.startswith(x + '/')))
+
+        for key, (_, names) in list(self._entries.items()):
+            if any(affected(x) for x in names):
+                del self._entries[key]
+
+
+class QueryStats(object):
+    """Request-scoped counters of genqueries and microservice calls.
+
+    Filled by query.Query (per executed query and fetched page of rows) and
+    by msi wrappers, to find out which queries a rule or API call issues and
+    how much time they take.
+    """
+
+    # Number of slowest query pages to keep.
+    SLOWEST = 5
+
+    def __init__(self):
+        self.queries  = 0    # executed queries
+        self.pages    = 0    # fetched pages (batches of up to 256 rows)
+        self.rows     = 0    # fetched rows
+        self.time     = 0.0  # seconds spent executing queries and fetching pages
+        self.msis     = 0    # msi wrapper calls
+        self.msi_time = 0.0  # seconds spent in msi wrapper calls
+        self._slowest = []   # min-heap of (seconds, query description)
+
+    def page(self, query, t, rows, executed=False):
+        """Record a page of query results.
+
+        :param query:    The query, described by str(query) if it is among the slowest
+        :param t:        Time spent fetching the page, in seconds
+        :param rows:     Number of rows in the page
+        :param executed: Whether this is the first page of a new query
+        """
+        self.queries += executed
+        self.pages   += 1
+        self.rows    += rows
+        self.time    += t
+
+        if len(self._slowest) < self.SLOWEST or t > self._slowest[0][0]:
+            self._slow(t, str(query))
+
+    def _slow(self, t, description):
+        if len(self._slowest) < self.SLOWEST:
+            heapq.heappush(self._slowest, (t, description))
+        elif t > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (t, description))
+
+    def msi(self, name, t):
+        """Record a microservice call that took t seconds."""
+        self.msis     += 1
+        self.msi_time += t
+
+    def add(self, other):
+        """Add the statistics of another QueryStats, e.g. of an API call within an api_batch call."""
+        self.queries  += other.queries
+        self.pages    += other.pages
+        self.rows     += other.rows
+        self.time     += other.time
+        self.msis     += other.msis
+        self.msi_time += other.msi_time
+        for t, description in other._slowest:
+            self._slow(t, description)
+
+    def slowest(self):
+        """Get the slowest query pages as (milliseconds, query description) pairs, slowest first."""
+        return [(int(t * 1000), q) for t, q in sorted(self._slowest, reverse=True)]
+
+    def as_dict(self):
+        return {'queries': self.queries,
+                'pages':   self.pages,
+                'rows':    self.rows,
+                'ms':      int(self.time * 1000),
+                'msis':    self.msis,
+                'msi_ms':  int(self.msi_time * 1000),
+                'slowest': self.slowest()}
+
+    def __str__(self):
+        return '{} queries, {} pages, {} rows in {}ms; {} msis in {}ms'.format(
+            self.queries, self.pages, self.rows, int(self.time * 1000), self.msis, int(self.msi_time * 1000))
+
 
 class Context(object):
     """Combined type of a callback and rei struct.
 
     `Context` can be treated as a rule engine callback for all intents and purposes.
     However @rule and @api functions that need access to the rei, can do so through this object.
+
+    A Context lives for the duration of one rule invocation, and carries
+    request-scoped state such as the query cache and statistics (see query.Query),
+    the buffered log lines of the invocation (see log.write), and the session
+    variables and client user, which are computed once (see util.user).
     """
+
+    # Log lines are buffered up to this amount of lines or seconds.
+    LOG_BUFFER_LINES   = 100
+    LOG_BUFFER_SECONDS = 5
+
     def __init__(self, callback, rei):
-        self.callback = callback
-        self.rei      = rei
+        self.callback     = callback
+        self.rei          = rei
+        self.query_cache  = QueryCache()
+        self.query_stats  = QueryStats()
+        self.log_prefix   = None   # '{user#zone} ', see log._write
+        self.log_buffer   = None   # list of lines while buffering, see make()
+        self.log_time     = 0      # time of the oldest buffered line
+        self.client       = None   # client user, see user.user_and_zone
+        self.client_type  = None   # client user type, see user.user_type
+        self.cache_bypass = False  # skip the process-wide caches, see cache.cached
+        self._session     = None
+
+    def session_map(self):
+        """Get the session variables of the invocation (see session_vars.get_map), computed on first use."""
+        if self._session is None:
+            self._session = session_vars.get_map(self.rei)
+        return self._session
+
+    def log(self, line):
+        """Write a line to the server log, buffered if enabled."""
+        if self.log_buffer is None:
+            self.callback.writeLine('serverLog', line)
+            return
+
+        if not self.log_buffer:
+            self.log_time = time.time()
+        self.log_buffer.append(line)
+
+        if len(self.log_buffer) >= self.LOG_BUFFER_LINES \
+           or time.time() - self.log_time >= self.LOG_BUFFER_SECONDS:
+            self.flush_log()
+
+    def flush_log(self):
+        """Write buffered log lines to the server log, with a single writeLine."""
+        if self.log_buffer:
+            lines, self.log_buffer = self.log_buffer, []
+            self.callback.writeLine('serverLog', '\n'.join(lines))
 
     def __getattr__(self, name):
         """Allow accessing the callback directly."""
+        if name not in READ_ONLY_CALLS:
+            # Rules and microservices may modify anything we have cached.
+            self.query_cache.invalidate()
         return getattr(self.callback, name)
 
 
 class Output(Enum):
     """Specifies rule output handlers."""
-    STORE      = 0  # store in output parameters
-    STDOUT     = 1  # write to stdout
-    STDOUT_BIN = 2  # write to stdout, without a trailing newline
+    STORE         = 0  # store in output parameters
+    STDOUT        = 1  # write to stdout
+    STDOUT_BIN    = 2  # write to stdout, without a trailing newline
+    STDOUT_STREAM = 3  # write chunks to stdout as they are produced, with a trailing newline
+
+
+# Streamed output is written to stdout in pieces of at least this size.
+STREAM_BUFFER_SIZE = 65536
+
+
+def _write_stream(callback, chunks):
+    """Write an iterable of strings to stdout, in as few writes as the buffer size allows."""
+    buf, size = [], 0
+    for x in chunks:
+        buf.append(x)
+        size += len(x)
+        if size >= STREAM_BUFFER_SIZE:
+            callback.writeString('stdout', ''.join(buf))
+            buf, size = [], 0
+    buf.append('\n')
+    callback.writeString('stdout', ''.join(buf))
 
 
 def make(inputs=None, outputs=None, transform=lambda x: x, handler=Output.STORE):
@@ -46,9 +254,12 @@ def make(inputs=None, outputs=None, transform=lambda x: x, handler=Output.STORE)
     e.g. by encoding them as JSON.
 
     handler specifies what to do with the (transformed) return value(s):
-    - Output.STORE:      stores return value(s) in output parameter(s) (this is the default)
-    - Output.STDOUT:     prints return value(s) to stdout
-    - Output.STDOUT_BIN: prints return value(s) to stdout, without a trailing newline
+    - Output.STORE:         stores return value(s) in output parameter(s) (this is the default)
+    - Output.STDOUT:        prints return value(s) to stdout
+    - Output.STDOUT_BIN:    prints return value(s) to stdout, without a trailing newline
+    - Output.STDOUT_STREAM: prints return value(s) to stdout, where transform turns
+                            each into an iterable of strings that is written while
+                            it is consumed (e.g. jsonutil.dump_stream)
 
     Examples:
 
@@ -88,11 +299,19 @@ def make(inputs=None, outputs=None, transform=lambda x: x, handler=Output.STORE)
     def deco(f):
         def r(rule_args, callback, rei):
             a = rule_args if inputs is None else [rule_args[i] for i in inputs]
-            result = f(Context(callback, rei), *a)
 
-            if result is None:
-                return
+            # Buffer log lines, and write them in one go at the end of the rule.
+            # Streamed output may still log, so output is handled before that.
+            ctx = Context(callback, rei)
+            ctx.log_buffer = []
+            try:
+                result = f(ctx, *a)
+                if result is not None:
+                    output(callback, rule_args, result)
+            finally:
+                ctx.flush_log()
 
+        def output(callback, rule_args, result):
             result = map(transform, list(result) if type(result) is tuple else [result])
 
             if handler is Output.STORE:
@@ -111,5 +330,8 @@ def make(inputs=None, outputs=None, transform=lambda x: x, handler=Output.STORE)
             elif handler is Output.STDOUT_BIN:
                 for x in result:
                     callback.writeString('stdout', encode_val(x))
+            elif handler is Output.STDOUT_STREAM:
+                for x in result:
+                    _write_stream(callback, x)
         return r
     return deco
@@ -9,6 +9,7 @@ from collections import namedtuple
 import genquery
 import session_vars
 
+import rule
 from query import Query
 
 # User is a tuple consisting of a name and a zone, which stringifies into 'user#zone'.
@@ -16,10 +17,23 @@ User = namedtuple('User', ['name', 'zone'])
 User.__str__ = lambda self: '{}#{}'.format(*self)
 
 
+def session_map(ctx):
+    """Get the session variables, computed once per rule invocation (see rule.Context.session_map)."""
+    if isinstance(ctx, rule.Context):
+        return ctx.session_map()
+    return session_vars.get_map(ctx.rei)
+
+
 def user_and_zone(ctx):
     """Obtain client name and zone."""
-    client = session_vars.get_map(ctx.rei)['client_user']
-    return User(client['user_name'], client['irods_zone'])
+    if isinstance(ctx, rule.Context) and ctx.client is not None:
+        return ctx.client
+
+    client = session_map(ctx)['client_user']
+    client = User(client['user_name'], client['irods_zone'])
+    if isinstance(ctx, rule.Context):
+        ctx.client = client
+    return client
 
 
 def full_name(ctx):
@@ -29,12 +43,12 @@ def full_name(ctx):
 
 def name(ctx):
     """Get the name of the client user."""
-    return session_vars.get_map(ctx.rei)['client_user']['user_name']
+    return user_and_zone(ctx).name
 
 
 def zone(ctx):
     """Get the zone of the client user."""
-    return session_vars.get_map(ctx.rei)['client_user']['irods_zone']
+    return user_and_zone(ctx).zone
 
 
 def from_str(ctx, s):
@@ -60,7 +74,7 @@ def exists(ctx, user):
     if type(user) is str:
         user = from_str(ctx, user)
 
-    return Query(ctx, "USER_TYPE", "USER_NAME = '{}' AND USER_ZONE = '{}'".format(*user)).first() is not None
+    return Query(ctx, "USER_TYPE", "USER_NAME = '{}' AND USER_ZONE = '{}'".format(*user)).exists()
 
 
 def user_type(ctx, user=None):
@@ -78,8 +92,16 @@ def user_type(ctx, user=None):
     elif type(user) is str:
         user = from_str(ctx, user)
 
-    return Query(ctx, "USER_TYPE",
-                      "USER_NAME = '{}' AND USER_ZONE = '{}'".format(*user)).first()
+    # The type of the client user is looked up once per rule invocation.
+    client = isinstance(ctx, rule.Context) and tuple(user) == user_and_zone(ctx)
+    if client and ctx.client_type is not None:
+        return ctx.client_type
+
+    typ = Query(ctx, "USER_TYPE",
+                     "USER_NAME = '{}' AND USER_ZONE = '{}'".format(*user), cache=True).first()
+    if client:
+        ctx.client_type = typ
+    return typ
 
 
 def is_admin(ctx, user=None):
@@ -96,7 +118,7 @@ def is_member_of(ctx, group, user=None):
 
     return Query(ctx, 'USER_GROUP_NAME',
                       "USER_NAME = '{}' AND USER_ZONE = '{}' AND USER_GROUP_NAME = '{}'"
-                      .format(*list(user) + [group])).first() is not None
+                      .format(*list(user) + [group]), cache=True).exists()
 
 
 # TODO: Remove. {{{
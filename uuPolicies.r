@@ -36,6 +36,12 @@ acPreProcForModifyAVUMetadata(*Option,*SourceItemType,*TargetItemType,*SourceIte
 acPostProcForPut  { cut; py_acPostProcForPut }
 acPostProcForCopy { cut; py_acPostProcForCopy }
 
+# Invalidate cached lookups on ACL and group membership changes.
+acPostProcForModifyAccessControl(*RecursiveFlag,*AccessLevel,*UserName,*Zone,*Path)
+{ py_acPostProcForModifyAccessControl(*RecursiveFlag,*AccessLevel,*UserName,*Zone,*Path) }
+acPostProcForModifyUserGroup(*GroupName,*Option,*UserName,*ZoneName)
+{ py_acPostProcForModifyUserGroup(*GroupName,*Option,*UserName,*ZoneName) }
+
 # }}}
 
 
@@ -41,6 +41,7 @@ uuReplicateAsynchronously(*object, *sourceResource, *targetResource) {
 #
 uuReplicateBatch() {
     writeLine("serverLog", "Batch replication job started");
+    msiGetIcatTime(*start, "unix");
     *count   = 0;
     *countOk = 0;
 
@@ -111,4 +112,5 @@ uuReplicateBatch() {
     }
 
     writeLine("serverLog", "Batch replication job finished. *countOk/*count objects succesfully replicated.");
+    rule_batch_metrics("replicate_batch", *start, str(*count), str(*count - *countOk));
 }
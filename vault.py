@@ -208,8 +208,11 @@ def api_vault_preservable_formats_lists(ctx):
 
     :returns: dict -- Lists of preservable file formats {name => [ext...]}
     """
-    zone = user.zone(ctx)
+    return _preservable_formats_lists(ctx, user.zone(ctx))
+
 
+@cache.cached('file_formats', size=10, tags=lambda zone: ['/{}/yoda/file_formats'.format(zone)])
+def _preservable_formats_lists(ctx, zone):
     # Retrieve all preservable file formats lists on the system.
 
     files = [x for x in collection.data_objects(ctx, '/{}/yoda/file_formats'.format(zone))
@@ -220,6 +223,12 @@ def api_vault_preservable_formats_lists(ctx):
             jsonutil.read(ctx, x) for x in files}
 
 
+@cache.cached('file_format_list', size=10, tags=lambda zone, list_name: ['/{}/yoda/file_formats/{}.json'.format(zone, list_name)])
+def _preservable_formats(ctx, zone, list_name):
+    # Retrieve a single preservable file formats list.
+    return jsonutil.read(ctx, '/{}/yoda/file_formats/{}.json'.format(zone, list_name))
+
+
 @api.make()
 def api_vault_unpreservable_files(ctx, coll, list_name):
     """Retrieve the set of unpreservable file formats in a collection.
@@ -233,7 +242,7 @@ def api_vault_unpreservable_files(ctx, coll, list_name):
     zone = pathutil.info(coll)[1]
 
     # Retrieve JSON list of preservable file formats.
-    list_data = jsonutil.read(ctx, '/{}/yoda/file_formats/{}.json'.format(zone, list_name))
+    list_data = _preservable_formats(ctx, zone, list_name)
     preservable_formats = set(list_data['formats'])
 
     # Get basenames of all data objects within this collection.
@@ -510,19 +519,11 @@ def api_vault_collection_details(ctx, path):
         genquery.AS_LIST, ctx
     )
 
-    for row in iter:
-        user_id = row[0]
-
-        # Retrieve all group names with this ID.
-        iter2 = genquery.row_iterator(
-            "USER_NAME",
-            "USER_ID = '{}'".format(user_id),
-            genquery.AS_LIST, ctx
-        )
-
-        for row2 in iter2:
-            user_name = row2[0]
+    # Retrieve all group names with these IDs.
+    user_names = query.batch(ctx, "USER_ID", [row[0] for row in iter], "USER_NAME")
 
+    for names in user_names.values():
+        for user_name in names:
             # Check if group is a research or intake group.
             if user_name.startswith("research-"):
                 research_group_access = True